@@ -16,5 +16,6 @@ from amaptor.classes.project import Project
 from amaptor.classes.map import Map
 from amaptor.classes.layer import Layer
 
-
-
+from amaptor.project_cache import open_project, ProjectCache
+from . import series
+from . import metrics
@@ -0,0 +1,356 @@
+"""
+	Caching building blocks shared by amaptor's caches. Kept free of arcpy and amaptor class imports so that any module
+	can use it without creating circular imports.
+"""
+
+import collections
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import logging
+log = logging.getLogger("amaptor")
+
+
+class LRUCache(object):
+	"""
+		A size bounded, thread safe, least recently used cache with hit, miss, and eviction counters. When an item is
+		evicted (or the cache is cleared), on_evict is called with the key and value so that subclasses or owners can
+		release whatever the value holds onto.
+	"""
+
+	def __init__(self, max_size=128, on_evict=None):
+		"""
+		:param max_size: the number of items to keep before evicting the least recently used one
+		:param on_evict: optional function called as on_evict(key, value) for each item that's evicted
+		"""
+		self.max_size = max_size
+		self.on_evict = on_evict
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._items = collections.OrderedDict()
+		self._lock = threading.RLock()
+
+	def __len__(self):
+		return len(self._items)
+
+	def __contains__(self, key):
+		return key in self._items
+
+	def get(self, key, default=None):
+		"""
+			Returns the value for key and marks it as most recently used, or returns default (and counts a miss)
+		"""
+		with self._lock:
+			try:
+				value = self._items.pop(key)
+			except KeyError:
+				self.misses += 1
+				return default
+
+			self._items[key] = value
+			self.hits += 1
+			return value
+
+	def take(self, key, default=None):
+		"""
+			Like get, but removes the item from the cache - for values that can only be used by one caller at a time
+		"""
+		with self._lock:
+			try:
+				value = self._items.pop(key)
+			except KeyError:
+				self.misses += 1
+				return default
+
+			self.hits += 1
+			return value
+
+	def put(self, key, value):
+		"""
+			Stores value under key as the most recently used item, evicting the least recently used items if the cache
+			is over its size
+		"""
+		with self._lock:
+			self._items.pop(key, None)
+			self._items[key] = value
+			self._trim()
+
+	def pop(self, key, default=None):
+		"""
+			Removes the item for key without calling on_evict or counting a hit or miss
+		"""
+		with self._lock:
+			return self._items.pop(key, default)
+
+	def resize(self, max_size):
+		with self._lock:
+			self.max_size = max_size
+			self._trim()
+
+	def clear(self):
+		"""
+			Evicts every item in the cache
+		"""
+		with self._lock:
+			while self._items:
+				self._evict_oldest()
+
+	def stats(self):
+		"""
+			Returns the cache counters as a dictionary with keys hits, misses, evictions, size, and max_size
+		"""
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"size": len(self._items),
+			"max_size": self.max_size,
+		}
+
+	def _trim(self):
+		while len(self._items) > self.max_size:
+			self._evict_oldest()
+
+	def _evict_oldest(self):
+		key, value = self._items.popitem(last=False)
+		self.evictions += 1
+		if self.on_evict is not None:
+			try:
+				self.on_evict(key, value)
+			except Exception:
+				log.exception("Failed to release evicted cache item {}".format(key))
+
+
+_file_hashes = LRUCache(max_size=256)  # (path, mtime, size) -> sha1, so unchanged files are only hashed once per process
+
+
+def file_hash(path):
+	"""
+		Returns the SHA1 hex digest of a file's contents. Results are remembered for as long as the file's modification
+		time and size don't change.
+	:param path: path to the file to hash
+	:return: hex digest string
+	"""
+	stats = os.stat(path)
+	key = (os.path.abspath(path), stats.st_mtime, stats.st_size)
+	digest = _file_hashes.get(key)
+	if digest is None:
+		sha = hashlib.sha1()
+		with open(path, "rb") as file_handle:
+			for block in iter(lambda: file_handle.read(1024 * 1024), b""):
+				sha.update(block)
+		digest = sha.hexdigest()
+		_file_hashes.put(key, digest)
+	return digest
+
+
+class FileCache(object):
+	"""
+		An on-disk cache of files, keyed on strings. Lookups copy the cached file to a destination, so callers never
+		modify the cached copy. When the cache grows past max_bytes, the least recently used entries are deleted. Safe to
+		share between processes. Subclasses define how keys are built.
+	"""
+
+	extensions = None  # the file extensions of entries in the cache folder. None for any file
+
+	def __init__(self, directory, max_bytes=500 * 1024 * 1024):
+		"""
+		:param directory: folder to keep cached files in
+		:param max_bytes: the total size of cached files to keep before the least recently used are removed
+		"""
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+
+	def _entry_path(self, key, extension):
+		return os.path.join(self.directory, key + extension)
+
+	def _fetch(self, entry, destination):
+		shutil.copyfile(entry, destination)
+
+	def get(self, key, destination):
+		"""
+			If key is cached, copies the cached file to destination and returns True. Otherwise returns False.
+		"""
+		entry = self._entry_path(key, os.path.splitext(destination)[1])
+		try:
+			self._fetch(entry, destination)
+		except (IOError, OSError):
+			self.misses += 1
+			return False
+
+		try:
+			os.utime(entry, None)  # mark it as recently used for cleanup
+		except OSError:
+			pass
+		self.hits += 1
+		return True
+
+	def put(self, key, source):
+		"""
+			Copies the file at source into the cache under key, then removes old entries if the cache is too large.
+			Safe to call from multiple processes - the entry is written to a temporary name and then moved into place.
+		"""
+		if not os.path.isdir(self.directory):
+			try:
+				os.makedirs(self.directory)
+			except OSError:
+				if not os.path.isdir(self.directory):
+					raise
+
+		extension = os.path.splitext(source)[1]
+		entry = self._entry_path(key, extension)
+		partial = tempfile.mktemp(extension, "partial_", dir=self.directory)
+		shutil.copyfile(source, partial)
+		try:
+			os.rename(partial, entry)
+		except OSError:  # another process got there first (Windows won't rename over an existing file)
+			os.remove(partial)
+
+		self.cleanup()
+
+	def entries(self):
+		"""
+			Returns a list of (path, size, last_used) for each cached file, least recently used first
+		"""
+		if not os.path.isdir(self.directory):
+			return []
+
+		entries = []
+		for file_name in os.listdir(self.directory):
+			if file_name.startswith("partial_"):
+				continue
+			if self.extensions is not None and os.path.splitext(file_name)[1].lower() not in self.extensions:
+				continue
+			path = os.path.join(self.directory, file_name)
+			try:
+				stats = os.stat(path)
+			except OSError:
+				continue
+			entries.append((path, stats.st_size, stats.st_mtime))
+		entries.sort(key=lambda entry: entry[2])
+		return entries
+
+	def cleanup(self, max_bytes=None):
+		"""
+			Deletes the least recently used cached files until the cache is no larger than max_bytes
+		:param max_bytes: defaults to the cache's max_bytes. Pass 0 to empty the cache
+		:return: the number of entries removed
+		"""
+		if max_bytes is None:
+			max_bytes = self.max_bytes
+
+		entries = self.entries()
+		total = sum(entry[1] for entry in entries)
+		removed = 0
+		for path, size, last_used in entries:
+			if total <= max_bytes:
+				break
+			try:
+				os.remove(path)
+			except OSError:  # in use, or already removed by another process
+				continue
+			total -= size
+			removed += 1
+		return removed
+
+	def stats(self):
+		entries = self.entries()
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"entries": len(entries),
+			"bytes": sum(entry[1] for entry in entries),
+			"max_bytes": self.max_bytes,
+		}
+
+
+class ConversionCache(FileCache):
+	"""
+		An on-disk cache of ArcGIS Pro Projects converted from ArcMap Documents, so that opening the same MXD in Pro
+		repeatedly only runs the conversion once. Entries are keyed on the content of the MXD, the version of the blank
+		template project it was imported into, and the default geodatabase mode used.
+	"""
+
+	extensions = (".aprx",)
+
+	def __init__(self, directory=None, max_bytes=500 * 1024 * 1024):
+		"""
+		:param directory: folder to keep cached projects in. Defaults to amaptor_conversion_cache in the temp folder
+		:param max_bytes: the total size of cached projects to keep before the least recently used are removed
+		"""
+		directory = directory or os.path.join(tempfile.gettempdir(), "amaptor_conversion_cache")
+		super(ConversionCache, self).__init__(directory, max_bytes)
+
+	def key(self, source_path, template_path, mode):
+		"""
+			Builds the cache key for converting source_path using template_path with the given mode
+		:return: hex string
+		"""
+		parts = (file_hash(source_path), file_hash(template_path), str(mode))
+		return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class ExportCache(FileCache):
+	"""
+		An on-disk cache of exported PDFs and images, keyed on a fingerprint of everything that went into the export -
+		see Layout.export_to_pdf and Map.export_pdf. A hit copies the cached file to the output path instead of rendering
+		it again.
+	"""
+
+	def __init__(self, directory=None, max_bytes=2 * 1024 * 1024 * 1024, link=False):
+		"""
+		:param directory: folder to keep cached exports in. Defaults to amaptor_export_cache in the temp folder
+		:param max_bytes: the total size of cached exports to keep before the least recently used are removed
+		:param link: whether to hard link cached files to the output path rather than copying them, which saves the
+			copy but shares the file with the cache - amaptor removes the link before exporting over an output, but
+			an output that's changed in place (by appending pages or stamping it, for example) changes the cached
+			export too, and every later hit gets the changed file. Only turn this on when outputs are left as written.
+		"""
+		directory = directory or os.path.join(tempfile.gettempdir(), "amaptor_export_cache")
+		super(ExportCache, self).__init__(directory, max_bytes)
+		self.link = link
+
+	@staticmethod
+	def key(fingerprint):
+		"""
+			Builds the cache key for a fingerprint - a list of values whose repr describes the export. Returns None for
+			a fingerprint of None, which marks an export that can't be cached.
+		"""
+		if fingerprint is None:
+			return None
+		return hashlib.sha1(repr(fingerprint).encode("utf-8")).hexdigest()
+
+	def _fetch(self, entry, destination):
+		if not os.path.isfile(entry):
+			raise IOError("No cached export at {}".format(entry))
+
+		if self.link and hasattr(os, "link"):
+			if os.path.exists(destination):
+				os.remove(destination)
+			try:
+				os.link(entry, destination)
+				return
+			except OSError:  # different drive, or a file system without hard links
+				pass
+		shutil.copyfile(entry, destination)
+
+
+def release_output(path):
+	"""
+		Removes an output file that is hard linked to a cached export before it's written again, so that writing it
+		can't change the cached copy
+	"""
+	try:
+		if os.stat(path).st_nlink > 1:
+			os.remove(path)
+	except OSError:
+		pass
+
+
+conversion_cache = ConversionCache()  # used when opening MXDs in Pro. Set to None to always convert from scratch
+export_cache = ExportCache()  # used by exports called with cache=True
@@ -6,9 +6,61 @@ import arcpy
 
 from amaptor.version_check import PRO, ARCMAP, mapping, mp
 from amaptor.errors import NotSupportedError, EmptyFieldError, LayerNotFoundError
-from amaptor.functions import get_workspace_type, get_workspace_factory_of_dataset
+from amaptor.functions import get_workspace_type, get_workspace_factory_of_dataset, describe, layer_file_cache, open_layer_file
 from amaptor.constants import _BLANK_FEATURE_LAYER, _BLANK_RASTER_LAYER
 
+# arcpy layer properties that are kept in a Layer's property cache when cache_properties is on. Each is read from arcpy
+# the first time it's needed and then reused until the layer is changed through amaptor or refresh is called.
+_CACHED_PROPERTIES = frozenset(("name", "longName", "dataSource", "visible", "definitionQuery", "isGroupLayer",
+								"isFeatureLayer", "isRasterLayer", "isBasemapLayer", "isBroken", "isNetworkAnalystLayer",
+								"isWebLayer", "isServiceLayer", "datasetName", "workspacePath", "serviceType"))
+
+def _resolve_symbology(symbology):
+	"""
+		Turns anything Layer.symbology can be set from into what's actually applied - an arcpy.mp Symbology object in
+		Pro, or an arcpy.mapping Layer to copy from in ArcMap. See the Layer.symbology setter for what's accepted.
+	"""
+	if PRO:
+		if isinstance(symbology, arcpy._mp.Symbology):
+			return symbology
+		elif isinstance(symbology, arcpy._mp.Layer) or isinstance(symbology, Layer):  # if it's an amaptor layer, and we're Pro, copy it from there
+			return symbology.symbology
+		elif type(symbology) == str:
+			if not os.path.exists(symbology):
+				raise RuntimeError("Provided symbology was a string, but is not a valid file path. Please provide a valid file path, layer object, or symbology object")
+			return layer_file_cache.templates(symbology)[0].symbology
+		else:
+			raise NotSupportedError("Cannot retrieve symbology from the object provided. Accepted types are amaptor.Layer, arcpy.mp.Symbology, and arcpy.mp.Layer. You provided {}".format(type(symbology)))
+	else:
+		if isinstance(symbology, Layer):
+			return symbology.layer_object
+		elif isinstance(symbology, arcpy.mapping.Layer):
+			return symbology
+		elif type(symbology) in (str, unicode):
+			if not os.path.exists(symbology):
+				raise RuntimeError("Provided symbology was a string, but is not a valid file path. Please provide a valid file path or layer object")
+			return layer_file_cache.templates(symbology)[0]
+		else:
+			raise NotSupportedError("Cannot retrieve symbology from the object provided. Accepted types are amaptor.Layer and arcpy.mapping.Layer. You provided {}".format(type(symbology)))
+
+
+def _template_layer_file(desc, template_layer=None):
+	"""
+		The layer file a new Pro layer for the described data starts from - template_layer if one's given, otherwise
+		amaptor's blank template for the type of data
+	:param desc: arcpy Describe object for the data source
+	:param template_layer: path to a layer file, or None
+	:return: path to a layer file
+	"""
+	if template_layer:
+		return template_layer
+	if desc.dataType in ("FeatureClass", "ShapeFile"):
+		return _BLANK_FEATURE_LAYER
+	elif desc.dataType in ("RasterDataset", "RasterBand"):
+		return _BLANK_RASTER_LAYER
+	raise NotSupportedError("This type of dataset isn't supported for initialization in amaptor via ArcGIS Pro")
+
+
 class Layer(object):
 	"""
 		This object corresponds to arcpy Layers - it theoretically supports the full range of API calls for Layer objects
@@ -22,7 +74,9 @@ class Layer(object):
 		but the ability to work with either amaptor layers or ArcGIS native layers is preserved in many cases throughout
 		code, both for backwards compatibility and for future convenience, where you might want to
 	"""
-	def __init__(self, layer_object_or_file, name=None, map_object=None, template_layer=None):
+	_OWN_ATTRIBUTES = frozenset(("init", "layer_object", "map", "_properties"))  # set on the wrapper, never passed through
+
+	def __init__(self, layer_object_or_file, name=None, map_object=None, template_layer=None, cache_properties=False):
 		"""
 			Create a Layer object by providing an ArcGIS layer instance, an ArcGIS layer file, or a data source.
 
@@ -33,9 +87,15 @@ class Layer(object):
 					with this layer's properties, symbology, etc. In future versions, we hope to have it autodetect the most appropriate
 					template layer that comes with amaptor, but for now, this is an option so that you can get the right properties
 					immediately.
+		:param cache_properties: When True, reads of properties that rarely change (name, dataSource, supports, visible,
+					isGroupLayer, and so on) are kept after the first read instead of going to arcpy each time. Changes
+					made through this object clear the cache, but changes made directly to layer_object or in the
+					ArcGIS interface aren't seen until refresh is called. See the cache_properties attribute.
 		"""
+		self._properties = {} if cache_properties else None  # property name -> value read from arcpy, when caching
 		self.init = False  # we'll set to True when done with init - provides a flag when creating a new layer from scratch in Pro, that we're loading a blank layer
 		self.layer_object = None
+		self.map = map_object
 
 		if PRO and isinstance(layer_object_or_file, arcpy._mp.Layer):
 			self.layer_object = layer_object_or_file
@@ -43,57 +103,103 @@ class Layer(object):
 			self.layer_object = layer_object_or_file
 		elif PRO:  # otherwise, assume it's a path and run the import for each.
 			if layer_object_or_file.endswith(".lyr") or layer_object_or_file.endswith(".lyrx"):
-				layer_file = mp.LayerFile(layer_object_or_file)
-				for layer in layer_file.listLayers():  # gets the specified layer from the layer file OR the last one
+				for layer in open_layer_file(layer_object_or_file):  # gets the specified layer from the layer file OR the last one
 					self.layer_object = layer
 					if name and layer.name == name:
 						break
 			else:  # handle the case of providing a data source of some sort - TODO: Needs to do more checking and raise appropriate exceptions (instead of raising ArcGIS' exceptions)
 				# In Pro this is complicated - we can't initialize Layers directly, so we'll use a template for the appropriate data type, then modify it with our information
-				desc = arcpy.Describe(layer_object_or_file)
-				if not template_layer:
-					if desc.dataType in ("FeatureClass", "ShapeFile"):
-						layer_file = _BLANK_FEATURE_LAYER
-					elif desc.dataType in ("RasterDataset", "RasterBand"):
-						layer_file = _BLANK_RASTER_LAYER
-					else:
-						raise NotSupportedError(
-							"This type of dataset isn't supported for initialization in amaptor via ArcGIS Pro")
-				else:
-					layer_file = template_layer
-
-					avail_layer = arcpy.mp.LayerFile(layer_file)
-					arcgis_template_layer = avail_layer.listLayers()[0]
-
-					if arcgis_template_layer is None:
-						raise LayerNotFoundError("No layer available for copying from layer file")
-					elif not arcgis_template_layer.supports("DATASOURCE"):
-						raise NotSupportedError("Provided layer file doesn't support accessing or setting the data source")
+				desc = describe(layer_object_or_file)
+				template_layers = open_layer_file(_template_layer_file(desc, template_layer))  # a fresh copy, since it gets changed - see Map.add_layers_from_sources
+				if not template_layers:
+					raise LayerNotFoundError("No layer available for copying from layer file")
+				arcgis_template_layer = template_layers[0]
+				if not arcgis_template_layer.supports("DATASOURCE"):
+					raise NotSupportedError("Provided layer file doesn't support accessing or setting the data source")
 
 				self.layer_object = arcgis_template_layer  # set the layer object to the template
 				self._set_data_source(layer_object_or_file)  # now set the data source to be the actual source data - self.data_source does the annoying magic behind this in Pro
 				self.name = desc.name  # set the name to the dataset name, as would be typical - just a simple default
-				del desc
+		elif layer_object_or_file.endswith(".lyr"):
+			self.layer_object = open_layer_file(layer_object_or_file)[0]
 		else:
 			self.layer_object = mapping.Layer(layer_object_or_file)
 
-		self.map = map_object
+	@property
+	def cache_properties(self):
+		"""
+			Whether reads of the layer's properties are cached - see the cache_properties parameter of __init__. Can be
+			switched on for a batch of lookups over many layers and off again afterward.
+		"""
+		return self._properties is not None
+
+	@cache_properties.setter
+	def cache_properties(self, value):
+		self._properties = {} if value else None
+
+	def refresh(self):
+		"""
+			Discards cached property values, so the next reads go to arcpy. Only needed when cache_properties is on and
+			the layer was changed outside of amaptor.
+		:return: None
+		"""
+		if self._properties is not None:
+			self._properties = {}
+
+	def _read(self, key, read):
+		"""
+			Returns the cached value for key, calling read to get it from arcpy if it isn't cached or caching is off
+		"""
+		properties = self._properties
+		if properties is None:
+			return read()
+		try:
+			return properties[key]
+		except KeyError:
+			value = properties[key] = read()
+			return value
 
 	@property
 	def name(self):
-		return self.layer_object.name
+		return self._read("name", lambda: self.layer_object.name)
 
 	@name.setter
 	def name(self, value):
 		self.layer_object.name = value
+		self._changed()
+
+	def supports(self, layer_property):
+		"""
+			Same as supports on arcpy layers - whether the layer supports a property such as "DATASOURCE"
+		:param layer_property: the property name, as used by arcpy
+		:return: bool
+		"""
+		return self._read(("supports", layer_property), lambda: self.layer_object.supports(layer_property))
+
+	def _changed(self):
+		"""
+			Called after this layer is changed through amaptor - clears cached properties, updates the map's query
+			index, and marks the project as modified
+		"""
+		self.refresh()
+		if self.map is not None and hasattr(self.map, "_reindex_layer"):
+			self.map._reindex_layer(self)
+		self._mark_modified()
+
+	def _mark_modified(self):
+		"""
+			Tells the project this layer's map belongs to (if any) that the document has been changed
+		"""
+		if self.map is not None and hasattr(self.map, "project"):
+			self.map.project.mark_modified()
 
 	@property
 	def data_source(self):
 
-		if not self.layer_object.supports("DATASOURCE"):
+		if not self.supports("DATASOURCE"):
 			raise NotSupportedError("Provided layer doesn't support accessing or setting the data source")
 
-		return self.layer_object.dataSource
+		return self.dataSource
 
 	@data_source.setter
 	def data_source(self, new_source):
@@ -103,7 +209,7 @@ class Layer(object):
 		if not self.layer_object.supports("DATASOURCE"):
 			raise NotSupportedError("Provided layer file doesn't support accessing or setting the data source")
 
-		desc = arcpy.Describe(new_source)
+		desc = describe(new_source)
 		if desc.extension and desc.extension != "":  # get the name with extension for replacing the data source
 			name = "{}.{}".format(desc.baseName, desc.extension)
 		else:
@@ -124,6 +230,16 @@ class Layer(object):
 		else:
 			self.layer_object.replaceDataSource(desc.path, get_workspace_type(new_source), name)
 
+		self._sources_changed()
+		self._changed()
+
+	def _sources_changed(self):
+		"""
+			Lets the project know its data source index is out of date after this layer's data source changed
+		"""
+		if self.map is not None and hasattr(self.map, "project"):
+			self.map.project._invalidate_source_index()
+
 	@property
 	def symbology(self):
 		"""
@@ -169,18 +285,18 @@ class Layer(object):
 		:param symbology: Symbology can be a symbology object or a layer to copy it from, or a path to a layer file on disk
 		:return:
 		"""
+		self._apply_symbology(_resolve_symbology(symbology))
+		if self.map is not None and hasattr(self.map, "_forget_symbology_source"):  # see Map.apply_symbology
+			self.map._forget_symbology_source(self)
+
+	def _apply_symbology(self, resolved):
+		"""
+			Applies symbology that's already been resolved by _resolve_symbology
+		:param resolved: an arcpy.mp Symbology object in Pro, or an arcpy.mapping Layer to copy from in ArcMap
+		:return: None
+		"""
 		if PRO:
-			if isinstance(symbology, arcpy._mp.Symbology):
-				new_symbology = symbology
-			elif isinstance(symbology, arcpy._mp.Layer) or isinstance(symbology, Layer):  # if it's an amaptor layer, and we're Pro, copy it from there
-				new_symbology = symbology.symbology
-			elif type(symbology) == str:
-				if not os.path.exists(symbology):
-					raise RuntimeError("Provided symbology was a string, but is not a valid file path. Please provide a valid file path, layer object, or symbology object")
-				new_symbology = arcpy.mp.LayerFile(symbology).symbology
-			else:
-				raise NotSupportedError("Cannot retrieve symbology from the object provided. Accepted types are amaptor.Layer, arcpy.mp.Symbology, and arcpy.mp.Layer. You provided {}".format(type(symbology)))
-			self.layer_object.symbology = new_symbology
+			self.layer_object.symbology = resolved
 			#self.layer_object.symbology.updateRenderer(new_symbology.renderer.type)  # only used in 2.0+
 			#self.layer_object.symbology.updateColorizer(new_symbology.colorizer.type)
 		else:  # if ArcMap, we need to do some workaround
@@ -188,38 +304,52 @@ class Layer(object):
 			if self.map is None or not isinstance(self.map, Map):
 				raise EmptyFieldError("map", "Layer is not attached to an amaptor.Map instance - cannot change symbology. See documentation.")
 
-			if isinstance(symbology, Layer):
-				source_data = symbology.layer_object
-			elif isinstance(symbology, arcpy.mapping.Layer):
-				source_data = symbology
-			elif type(symbology) in (str, unicode):
-				if not os.path.exists(symbology):
-					raise RuntimeError("Provided symbology was a string, but is not a valid file path. Please provide a valid file path or layer object")
-				source_data = arcpy.mapping.Layer(symbology)
-			else:
-				raise NotSupportedError("Cannot retrieve symbology from the object provided. Accepted types are amaptor.Layer and arcpy.mapping.Layer. You provided {}".format(type(symbology)))
-
-			if self.layer_object.symbologyType != source_data.symbologyType:
+			if self.layer_object.symbologyType != resolved.symbologyType:
 				log.warning("Trying to apply symbology with a renderer of type {} to a layer with renderer of type {} - this"
-							"may fail in ArcMap".format(source_data.symbologyType, self.layer_object.symbologyType))
+							"may fail in ArcMap".format(resolved.symbologyType, self.layer_object.symbologyType))
 
 			arcpy.mapping.UpdateLayer(data_frame=self.map.map_object,
 									  update_layer=self.layer_object,
-									  source_layer=source_data,
+									  source_layer=resolved,
 									  symbology_only=True)
+			self.map.project._symbology_changed = True  # so the export cache stops trusting this document - see Map._export_fingerprint_arcmap
 
-	def __getter__(self, key):
+		self._changed()
+
+	def __getattr__(self, key):
 		"""
 			Helps this to be a standin where layers were used before because it will behave as expected for attributes
-			of arcpy layers.
+			of arcpy layers - anything not defined on amaptor.Layer is read from layer_object. Only called by Python
+			when normal attribute lookup fails.
 		:return:
 		"""
-		return getattr(self.layer_object, key)
+		if key.startswith("__") or key in self._OWN_ATTRIBUTES:  # not set yet (while copying or unpickling) - don't recurse into layer_object
+			raise AttributeError(key)
+
+		layer_object = self.layer_object
+		if key in _CACHED_PROPERTIES:
+			return self._read(key, lambda: getattr(layer_object, key))
+		return getattr(layer_object, key)
 
-	def __setter__(self, key, value):
+	def __setattr__(self, key, value):
 		"""
 			Helps this to be a standin where layers were used before because it will behave as expected for attributes
-			of arcpy layers.
+			of arcpy layers - setting an attribute that amaptor.Layer doesn't define, but the arcpy layer has, sets it
+			on layer_object. Raises AttributeError for any other public name, so a misspelled property (such as
+			definition_query for definitionQuery) fails instead of being stored on the wrapper where arcpy never sees it.
 		:return:
 		"""
-		return setattr(self.layer_object, key, value)
\ No newline at end of file
+		if key in self._OWN_ATTRIBUTES or hasattr(type(self), key) or self.__dict__.get("layer_object") is None:
+			object.__setattr__(self, key, value)
+			return
+
+		if not hasattr(self.layer_object, key):
+			if not key.startswith("_"):
+				raise AttributeError("Neither amaptor.Layer nor the arcpy layer has an attribute named {}".format(key))
+			object.__setattr__(self, key, value)
+			return
+
+		setattr(self.layer_object, key, value)
+		if key in ("dataSource", "connectionProperties"):
+			self._sources_changed()
+		self._changed()
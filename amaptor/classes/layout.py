@@ -1,3 +1,5 @@
+import os
+import fnmatch
 import logging
 log = logging.getLogger("amaptor")
 
@@ -6,6 +8,36 @@ import arcpy
 from amaptor.classes.map_frame import MapFrame
 from amaptor.version_check import PRO
 from amaptor.errors import MapFrameNotFoundError, ElementNotFoundError, NotSupportedError
+from amaptor import metrics
+from amaptor.cache import file_hash
+from amaptor.functions import _string_types, _text_renderer, _render_text_elements, _export_with_cache, _element_fingerprint, _layer_fingerprint, _extent_fingerprint
+
+def _element_type(element_type):
+	"""
+		Normalizes an element type so that "text", "TEXT", and "TEXT_ELEMENT" are all "TEXT_ELEMENT"
+	"""
+	element_type = element_type.upper()
+	if not element_type.endswith("_ELEMENT"):
+		element_type += "_ELEMENT"
+	return element_type
+
+
+class _ElementIndex(object):
+	"""
+		The elements of a layout by name and by type, along with each element's name as of when it was indexed, so
+		lookups don't read every element's name from arcpy. by_type holds positions in elements, in layout order.
+	"""
+	def __init__(self, elements):
+		self.elements = elements
+		self.names = []
+		self.by_name = {}
+		self.by_type = {}
+		for position, element in enumerate(elements):
+			name = element.name
+			self.names.append(name)
+			self.by_name.setdefault(name, []).append(element)
+			self.by_type.setdefault(element.type, []).append(position)
+
 
 class Layout(object):
 	"""
@@ -18,8 +50,63 @@ class Layout(object):
 	def __init__(self, layout_object, project):
 		self._layout_object = layout_object
 		self.project = project
-		self.frames = [MapFrame(frame, self) for frame in self._layout_object.listElements("MAPFRAME_ELEMENT")]  # frames connect back to maps, this connects to a project
-		self.elements = self.list_elements()
+		self._frames = None  # both are built on first access when the project is lazy
+		self._elements = None
+		self._frame_index = None  # name -> amaptor.MapFrame, built on first lookup
+		self._element_index = None  # _ElementIndex, built on first lookup and rebuilt by list_elements
+
+		if not project.lazy:
+			self._list_frames()
+			self.list_elements()
+
+	@property
+	def frames(self):
+		"""
+			The amaptor.MapFrame objects on this layout
+		:return: list of amaptor.MapFrame instances
+		"""
+		if self._frames is None:
+			self._list_frames()
+		return self._frames
+
+	@property
+	def elements(self):
+		"""
+			The arcpy elements on this layout, as returned by list_elements
+		:return: list of arcpy.mp elements
+		"""
+		if self._elements is None:
+			self.list_elements()
+		return self._elements
+
+	def _list_frames(self):
+		with metrics.timer("listElements"):
+			frame_objects = self._layout_object.listElements("MAPFRAME_ELEMENT")
+		self._frames = [MapFrame(frame, self) for frame in frame_objects]  # frames connect back to maps, this connects to a project
+		self._frame_index = None
+
+	def _get_frame_index(self):
+		"""
+			Returns the dictionary of map frame names to amaptor.MapFrame objects, building it on first use
+		:return: dict
+		"""
+		if self._frame_index is None:
+			frames = self.frames
+			self._frame_index = {}
+			for frame in frames:
+				self._frame_index.setdefault(frame.name, frame)
+		return self._frame_index
+
+	def _rename_frame(self, frame, old_name, new_name):
+		"""
+			Called by MapFrame.name when a frame is renamed so that the name indexes stay correct
+		"""
+		self._element_index = None  # frames are elements too
+		if self._frame_index is None:
+			return
+		if self._frame_index.get(old_name) is frame:
+			del self._frame_index[old_name]
+		self._frame_index.setdefault(new_name, frame)
 
 	@property
 	def name(self):
@@ -35,23 +122,87 @@ class Layout(object):
 	@name.setter
 	def name(self, value):
 		if PRO:
+			old_name = self._layout_object.name
 			self._layout_object.name = value
+			self.project._rename_layout(self, old_name, value)
 		else:
 			self.project.primary_document.title = value
+		self.project.mark_modified()
 
 	def list_elements(self):
-		self.elements = self._layout_object.listElements()
-		return self.elements
+		"""
+			Lists the layout's elements again, picking up elements added, removed, or renamed since they were last
+			listed, and rebuilds the element index used by find_element and find_elements
+		:return: list of arcpy.mp elements
+		"""
+		with metrics.timer("listElements"):
+			self._elements = self._layout_object.listElements()
+		self._element_index = None
+		return self._elements
 
-	def export_to_png(self, out_path, resolution=300):
+	def _get_element_index(self):
+		if self._element_index is None:
+			self._element_index = _ElementIndex(self.elements)
+		return self._element_index
+
+	def export_to_png(self, out_path, resolution=300, cache=None):
 		"""
 			Currently Pro only - needs refactoring to support ArcMap and Pro (should export map document in ArcMap).
 			Also needs refactoring to combine Map and Layout export code.
 		:param out_path:
 		:param resolution:
+		:param cache: True to reuse unchanged exports from amaptor.cache.export_cache, or an amaptor.cache.ExportCache
+			to use instead. See _export_fingerprint for what counts as a change
 		:return:
 		"""
-		self._layout_object.exportToPNG(out_path, resolution)
+		self._export("exportToPNG", out_path, cache, {"resolution": resolution})
+
+	def _export(self, export_function, out_path, cache, kwargs):
+		"""
+			Runs an arcpy.mp Layout export method, unless the export cache has an identical export
+		:param export_function: name of the arcpy.mp Layout method - exportToPDF or exportToPNG
+		:param out_path: path to export to
+		:param cache: see export_to_png
+		:param kwargs: passed through to the export method
+		:return: True if the output was copied from the export cache, False if it was exported
+		"""
+		def export():
+			with metrics.timer(export_function):
+				getattr(self._layout_object, export_function)(out_path, **kwargs)
+
+		return _export_with_cache(cache, lambda: self._export_fingerprint(export_function, kwargs), out_path, export)
+
+	def _export_fingerprint(self, export_function, kwargs):
+		"""
+			Describes everything that goes into exporting this layout, for the export cache - the saved project file,
+			the export settings, each element's name, position, visibility, and text, each map frame's extent, and the
+			name, visibility, transparency, data source (with the time its files last changed), definition query, and
+			CIM definition (symbology, labels, and the rest of how it draws) of each layer in the frames' maps.
+			Changes made in memory to anything else aren't noticed until the project is saved.
+		:return: list of values, or None if the layout can't be cached (its data is in an enterprise geodatabase or
+			a service, so changes can't be detected)
+		"""
+		if not os.path.isfile(self.project.path):
+			return None
+
+		parts = [export_function, sorted(kwargs.items()), file_hash(self.project.path), self.name]
+		parts.extend(_element_fingerprint(element) for element in self._layout_object.listElements())
+
+		source_times = {}
+		fingerprinted_maps = set()
+		for frame in self.frames:
+			parts.append((frame.name, _extent_fingerprint(frame.get_extent())))
+			l_map = frame.map
+			if l_map is None or id(l_map) in fingerprinted_maps:
+				continue
+			fingerprinted_maps.add(id(l_map))
+			parts.append(l_map.name)
+			for layer in l_map.layers:
+				layer_fingerprint = _layer_fingerprint(layer.layer_object, source_times)
+				if layer_fingerprint is None:
+					return None
+				parts.append(layer_fingerprint)
+		return parts
 
 	def find_map_frame(self, name):
 		"""
@@ -61,29 +212,67 @@ class Layout(object):
 		"""
 
 		if PRO:
-			for frame in self.frames:
-				if name == frame.name:
-					return frame
-
-			raise MapFrameNotFoundError(name=name)
+			try:
+				return self._get_frame_index()[name]
+			except KeyError:
+				raise MapFrameNotFoundError(name=name)
 		else:
 			raise NotSupportedError("Map Frames are not supported in ArcMap")
 
 	def find_element(self, name):
 		"""
-			Finds the first element matching the provided name
+			Finds the first element matching the provided name. Elements are looked up in an index of the layout's
+			elements by name. If the element found was renamed since, or no element has the name, the elements are
+			listed again and the index rebuilt before giving up, so elements added or renamed directly through arcpy are
+			still found.
 		:param name:
 		:return:
 		"""
 		if PRO:
-			for element in self.elements:
-				if element.name == name:
-					return element
+			for attempt in range(2):
+				elements = self._get_element_index().by_name.get(name)
+				if elements and elements[0].name == name:
+					return elements[0]
+				if attempt == 0:
+					self.list_elements()
 
 			raise ElementNotFoundError(name)
 		else:
 			raise NotSupportedError("Element actions are not supported in ArcMap")
 
+	def find_elements(self, type=None, name_glob=None):
+		"""
+			Finds every element of a type and/or with a name matching a wildcard, using the layout's element index.
+			Elements that were renamed since they were indexed cause the index to be rebuilt and the search to run
+			again. Elements added or renamed directly through arcpy (rather than through amaptor) are only picked up
+			after list_elements is called, or after find_element misses.
+
+			```
+				for element in layout.find_elements(type="TEXT", name_glob="footnote_*"):
+					element.visible = False
+			```
+		:param type: element type - TEXT, PICTURE, LEGEND, MAPFRAME, GRAPHIC, or any other arcpy.mp element type,
+			with or without the _ELEMENT suffix. None for all types
+		:param name_glob: Unix shell style wildcard (fnmatch) the element's name has to match, case sensitive. None for
+			any name
+		:return: list of arcpy.mp elements, in layout order
+		"""
+		if not PRO:
+			raise NotSupportedError("Element actions are not supported in ArcMap")
+
+		for attempt in range(2):
+			index = self._get_element_index()
+			if type is None:
+				positions = range(len(index.elements))
+			else:
+				positions = index.by_type.get(_element_type(type), [])
+			if name_glob is not None:
+				positions = [position for position in positions if fnmatch.fnmatchcase(index.names[position], name_glob)]
+				if attempt == 0 and any(index.elements[position].name != index.names[position] for position in positions):
+					self.list_elements()  # something was renamed since the index was built
+					continue
+			return [index.elements[position] for position in positions]
+
 	def toggle_element(self, name_or_element, visibility="TOGGLE"):
 		"""
 			Given an element name, toggles, makes visible, or makes invisible that element.
@@ -93,7 +282,7 @@ class Layout(object):
 		:return:
 		"""
 		if PRO:
-			if not isinstance(name_or_element, arcpy._mp.GraphicElement):
+			if isinstance(name_or_element, _string_types):
 				element = self.find_element(name_or_element)
 			else:
 				element = name_or_element
@@ -101,15 +290,20 @@ class Layout(object):
 			if visibility is True or visibility is False:
 				element.visible = visibility
 			elif visibility == "TOGGLE":
-				if element.visible is True:
-					element.visible = False
-				else:
-					element.visible = True
+				element.visible = not element.visible
 			else:
 				raise ValueError("parameter visibility must be either a boolean value, (True, False) or the keyword \"TOGGLE\".")
 
-	def export_to_pdf(self, out_path, **kwargs):
-		self._layout_object.exportToPDF(out_path, **kwargs)
+			self.project.mark_modified()
+
+	def export_to_pdf(self, out_path, cache=None, **kwargs):
+		"""
+			Exports the layout to a PDF. kwargs are passed through to arcpy.mp's Layout.exportToPDF
+		:param out_path:
+		:param cache: see export_to_png
+		:return:
+		"""
+		self._export("exportToPDF", out_path, cache, kwargs)
 
 	def replace_text(self, text, replacement):
 		"""
@@ -121,5 +315,29 @@ class Layout(object):
 		:return:
 		"""
 
-		for elm in self._layout_object.listElements("TEXT_ELEMENT"):
-			elm.text = elm.text.replace(text, replacement)
+		self.render_text({text: replacement})
+
+	def render_text(self, replacements):
+		"""
+			Replaces many placeholders at once in all text elements in the layout. Text elements are listed once and
+			all placeholders are substituted in a single pass over each element's text, and only the elements whose
+			text changes are written back.
+
+			```
+				layout.render_text({"{species}": "Chinook Salmon", "{date}": "2017-06-01"})
+			```
+		:param replacements: dictionary of {text_to_find: replacement}
+		:return: the number of text elements that were changed
+		"""
+		return self._render_text(_text_renderer(replacements))
+
+	def _render_text(self, render):
+		if render is None:
+			return 0
+
+		with metrics.timer("listElements"):
+			elements = self._layout_object.listElements("TEXT_ELEMENT")
+		changed = _render_text_elements(elements, render)
+		if changed:
+			self.project.mark_modified()
+		return changed
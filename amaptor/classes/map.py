@@ -1,4 +1,9 @@
+import collections
+import difflib
+import fnmatch
 import os
+import re
+import time
 import logging
 log = logging.getLogger("amaptor")
 
@@ -6,10 +11,259 @@ import arcpy
 
 from amaptor.version_check import PRO, mapping, mp
 from amaptor.errors import *
-from amaptor.functions import make_layer_with_file_symbology, reproject_extent
+from amaptor import scratch, metrics, extents
+from amaptor.cache import file_hash, release_output
+from amaptor.functions import make_layer_with_file_symbology, describe, layer_file_cache, normalize_data_source, _copy_extent, _describe_key, _string_types, _data_source_keys, _text_renderer, _render_text_elements, _resolve_export_cache, _export_with_cache, _element_fingerprint, _layer_fingerprint, _extent_fingerprint
 from amaptor.classes.map_frame import MapFrame
 from amaptor.classes.layout import Layout
-from amaptor.classes.layer import Layer
+from amaptor.classes.layer import Layer, _resolve_symbology, _template_layer_file
+
+class ExportResult(collections.namedtuple("ExportResult", ["path", "layout", "seconds", "bytes", "cached"])):
+	"""
+		Describes one exported file - its path, the name of the layout exported (None in ArcMap, where the whole map
+		document is exported), how long the export took, the size of the file, and whether it came from the export cache
+	"""
+	__slots__ = ()
+
+
+_EXPORT_FUNCTIONS = {"pdf": ("ExportToPDF", "exportToPDF"), "png": ("ExportToPNG", "exportToPNG")}  # format -> (arcpy.mapping function, arcpy.mp Layout method)
+_PDF_KWARGS = ("resolution", "image_quality", "image_compression", "embed_fonts", "layers_attributes", "georef_info", "jpeg_compression_quality")
+
+
+def _export_kwargs(export_format, kwargs):
+	"""
+		Checks the export format and keeps only the kwargs that work for it in both ArcMap and ArcGIS Pro
+	"""
+	if export_format not in _EXPORT_FUNCTIONS:
+		raise ValueError("Export format must be one of {}".format(", ".join(sorted(_EXPORT_FUNCTIONS))))
+
+	if export_format == "png":
+		return {"resolution": kwargs.get("resolution", 300)}
+	return dict((kwarg, kwargs[kwarg]) for kwarg in _PDF_KWARGS if kwarg in kwargs)  # tosses out kwargs that aren't valid
+
+
+def _export_result(path, layout_name, start, cached):
+	return ExportResult(path, layout_name, time.time() - start, os.path.getsize(path), cached)
+
+
+def _export_layout(project, task):
+	"""
+		Exports one layout of a project snapshot in a worker process - see _iter_layout_exports
+	"""
+	layout_position, output_path, export_function, kwargs = task
+	project.layouts[layout_position]._export(export_function, output_path, None, kwargs)
+	return output_path
+
+
+def _iter_layout_exports(project, exports, export_function, kwargs, parallel=None, cache=None):
+	"""
+		Exports layouts, yielding (position, ExportResult) as soon as each file is written, where position is the
+		export's index in exports. Exports run in order unless parallel is more than 1, in which case the project is
+		saved to a temporary snapshot (so unsaved changes are included) and that many worker processes each open the
+		snapshot once and export the layouts they're given, yielding in the order they finish. Layouts found in the
+		export cache are copied from it here rather than being sent to the workers. Raises ExportError after the
+		successful exports if any parallel exports failed.
+	:param project: the amaptor.Project the layouts belong to
+	:param exports: list of (amaptor.Layout, output_path)
+	:param export_function: name of the arcpy.mp Layout export method - exportToPDF or exportToPNG
+	:param kwargs: passed through to the export method
+	:param parallel: number of worker processes to use
+	:param cache: see Map._export
+	"""
+	if parallel is None or parallel <= 1 or len(exports) <= 1:
+		for position, (layout, output_path) in enumerate(exports):
+			start = time.time()
+			cached = layout._export(export_function, output_path, cache, kwargs)
+			yield position, _export_result(output_path, layout.name, start, cached)
+		return
+
+	from amaptor import series  # series imports Project, which imports this module
+
+	export_cache = _resolve_export_cache(cache)
+	project_layouts = project.layouts
+	tasks = []
+	positions = []
+	keys = []
+	for position, (layout, output_path) in enumerate(exports):
+		start = time.time()
+		key = None
+		if export_cache is not None:
+			key = export_cache.key(layout._export_fingerprint(export_function, kwargs))
+			if key is not None and export_cache.get(key, output_path):
+				yield position, _export_result(output_path, layout.name, start, True)
+				continue
+			release_output(output_path)
+		tasks.append((project_layouts.index(layout), output_path, export_function, kwargs))
+		positions.append(position)
+		keys.append(key)
+
+	if not tasks:
+		return
+
+	snapshot = scratch.pool.acquire_path(".aprx", "amaptor_export_snapshot", owner=project)
+	project.save_a_copy(snapshot)
+	failures = {}
+	results = series.iter_render(snapshot, tasks, _export_layout, workers=parallel, chunk_size=1, restore_text=False)
+	try:
+		for result in results:
+			output_path = tasks[result.index][1]
+			if not result.ok:
+				failures[output_path] = result.error
+				continue
+			if keys[result.index] is not None:
+				export_cache.put(keys[result.index], output_path)
+			layout = exports[positions[result.index]][0]
+			yield positions[result.index], ExportResult(output_path, layout.name, result.seconds, os.path.getsize(output_path), False)
+	finally:
+		results.close()  # stops the workers if the caller stopped early
+		scratch.pool.release(snapshot)
+
+	if failures:
+		raise ExportError(failures)
+
+
+class SymbologyResult(collections.namedtuple("SymbologyResult", ["layer", "source", "status", "error"])):
+	"""
+		The outcome of applying symbology to one layer with Map.apply_symbology. status is "applied", "skipped" (the
+		layer already had this symbology), or "failed", in which case error is the exception raised. layer is the
+		amaptor.Layer, or the target as given when no layers could be found for it.
+	"""
+	__slots__ = ()
+
+
+def _symbology_source_key(source):
+	"""
+		Identifies a symbology source so each distinct source is only resolved once. Layer files are identified by their
+		normalized path and modification time, which is also what's remembered on layers to skip restyling them.
+	"""
+	if isinstance(source, _string_types) and os.path.exists(source):
+		return "file", _describe_key(source), os.path.getmtime(source)
+	return "object", id(source)
+
+
+def _layer_identities(layers):
+	"""
+		Identifies each of a map's layers in a way that stays the same between listings. arcpy creates new Layer objects
+		every time a map's layers are listed, so object identity can't be used. Instead, a layer is identified by its
+		long name, its data source, and how many layers before it in the map share both. Layers that share all three
+		can't be told apart, which is harmless - whatever amaptor keeps for one of them was read from an identical layer.
+	:param layers: arcpy or amaptor.Layer objects, in table of contents order
+	:return: list of (longName, dataSource, occurrence) tuples
+	"""
+	counts = {}
+	identities = []
+	for layer in layers:
+		key = (layer.longName, layer.dataSource if layer.supports("DATASOURCE") else None)
+		occurrence = counts[key] = counts.get(key, -1) + 1
+		identities.append(key + (occurrence,))
+	return identities
+
+
+_LayerRecord = collections.namedtuple("_LayerRecord", ["name", "sources", "workspace", "dataset_type", "visible"])
+_DATASET_TYPE_FLAGS = (("GROUP", "isGroupLayer"), ("FEATURE", "isFeatureLayer"), ("RASTER", "isRasterLayer"),
+						("BASEMAP", "isBasemapLayer"), ("WEB", "isWebLayer"), ("SERVICE", "isServiceLayer"))
+
+
+def _layer_dataset_type(layer):
+	"""
+		Classifies a layer by its is*Layer flags as "GROUP", "FEATURE", "RASTER", "BASEMAP", "WEB", "SERVICE", or "OTHER".
+		Flags that the version of arcpy doesn't have count as False.
+	"""
+	for dataset_type, flag in _DATASET_TYPE_FLAGS:
+		if getattr(layer, flag, False):
+			return dataset_type
+	return "OTHER"
+
+
+def _layer_record(layer):
+	"""
+		Reads the properties of an amaptor.Layer that query_layers filters on from arcpy
+	"""
+	sources = ()
+	workspace = None
+	if layer.supports("DATASOURCE"):
+		sources = tuple(_data_source_keys(layer.dataSource))
+		workspace = sources[0].rpartition("/")[0]  # normalized paths have no feature dataset between workspace and dataset
+	return _LayerRecord(layer.name, sources, workspace, _layer_dataset_type(layer), layer.visible)
+
+
+class _LayerIndex(object):
+	"""
+		A map's layers indexed by name, data source, workspace, and dataset type, for Map.query_layers. Each layer's
+		properties are read from arcpy once into a record. Records are updated one at a time when a layer is changed
+		through amaptor, and are carried over for layers that stay in the map when the layer list changes.
+	"""
+
+	def __init__(self, layers, records=None):
+		"""
+		:param layers: the map's amaptor.Layer objects, in table of contents order
+		:param records: records from a previous index, by id of the layer, to reuse instead of reading from arcpy
+		"""
+		records = records or {}
+		self.layers = layers
+		self.positions = {}  # id(layer) -> position in the map
+		self.records = {}  # id(layer) -> _LayerRecord
+		self.keys = {"name": {}, "source": {}, "workspace": {}, "dataset_type": {}}  # key -> value -> list of layers
+		for position, layer in enumerate(layers):
+			self.positions[id(layer)] = position
+			self._add(layer, records.get(id(layer)) or _layer_record(layer))
+
+	def _key_values(self, record):
+		return (("name", (record.name,)), ("source", record.sources), ("workspace", (record.workspace,)), ("dataset_type", (record.dataset_type,)))
+
+	def _add(self, layer, record):
+		self.records[id(layer)] = record
+		for key, values in self._key_values(record):
+			for value in values:
+				if value is not None:
+					self.keys[key].setdefault(value, []).append(layer)
+
+	def update(self, layer):
+		"""
+			Rereads a layer's record after it's been changed
+		"""
+		record = self.records.get(id(layer))
+		if record is None:
+			return
+		for key, values in self._key_values(record):
+			for value in values:
+				if value is not None:
+					self.keys[key][value].remove(layer)
+		self._add(layer, _layer_record(layer))
+
+	def query(self, name, name_glob, name_regex, source, workspace, dataset_type, visible):
+		exact = (("name", name), ("source", source), ("workspace", workspace), ("dataset_type", dataset_type))
+		candidates = None
+		for key, value in exact:  # start from the smallest set of layers that match one of the exact keys
+			if value is not None:
+				matches = self.keys[key].get(value, [])
+				if candidates is None or len(matches) < len(candidates):
+					candidates = matches
+		if candidates is None:
+			candidates = self.layers
+
+		results = []
+		for layer in candidates:
+			record = self.records[id(layer)]
+			if name is not None and record.name != name:
+				continue
+			if source is not None and source not in record.sources:
+				continue
+			if workspace is not None and record.workspace != workspace:
+				continue
+			if dataset_type is not None and record.dataset_type != dataset_type:
+				continue
+			if visible is not None and bool(record.visible) != bool(visible):
+				continue
+			if name_glob is not None and not fnmatch.fnmatchcase(record.name, name_glob):
+				continue
+			if name_regex is not None and not name_regex.search(record.name):
+				continue
+			results.append(layer)
+
+		results.sort(key=lambda layer: self.positions[id(layer)])
+		return results
+
 
 class Map(object):
 	"""
@@ -19,14 +273,13 @@ class Map(object):
 
 		self.map_object = map_object
 		self.project = project
-		self.layers = []
-
-		self.list_layers()
+		self._layers = None  # built on first access when the project is lazy
+		self._layer_index = None  # _LayerIndex for query_layers, built on first query
+		self._layer_identities = None  # _layer_identities of self.layers, worked out when first needed
+		self._symbology_sources = {}  # layer identity -> source key, for layers apply_symbology styled from a layer file
 
-		self.frames = []
-		self.layouts = []
-
-		self._index_frames()
+		if not project.lazy:
+			self.list_layers()
 
 	@property
 	def name(self):
@@ -34,43 +287,148 @@ class Map(object):
 
 	@name.setter
 	def name(self, value):
+		old_name = self.map_object.name
 		self.map_object.name = value
+		self.project._rename_map(self, old_name, value)
+		self.project.mark_modified()
+
+	@property
+	def layers(self):
+		"""
+			The list of amaptor.Layer objects in this map. Listed from ArcGIS on first access when the project is lazy.
+		:return: list of amaptor.Layer instances
+		"""
+		if self._layers is None:
+			self.list_layers()
+		return self._layers
 
-	def _index_frames(self):
-		self.frames = []
-		self.layouts = []
-		for layout in self.project.layouts:
-			for frame in layout.frames:
-				if frame.map and frame.map.name == self.name:  # if the frame has a map and it has the same name
-					self.frames.append(frame)
-					if layout not in self.layouts:
-						self.layouts.append(layout)
-
-
-	def _get_layers_pro(self):
-		self._arcgis_layers = self.map_object.listLayers()
-		self.layers = [Layer(layer) for layer in self._arcgis_layers]
-		for layer in self.layers:  # set the map on the layer as a backreference
-			layer.map = self
-
-	def _get_layers_arcmap(self):
-		self._arcgis_layers = mapping.ListLayers(self.project.map_document)
-		self.layers = [Layer(layer) for layer in self._arcgis_layers]
-		for layer in self.layers:  # set the map on the layer as a backreference
-			layer.map = self
+	@layers.setter
+	def layers(self, value):
+		self._layers = value
 
-	def list_layers(self):
+	@property
+	def frames(self):
 		"""
-			Returns the list of layers in the map or data frame. Also available as map.layers
-		:return:
+			PRO ONLY. The amaptor.MapFrame objects, across all layouts, that display this map. Comes from the project's
+			index of frames by map, so it doesn't scan the layouts.
+		:return: list of amaptor.MapFrame instances
+		"""
+		return self.project._get_frame_graph().frames_for(self)
+
+	@property
+	def layouts(self):
+		"""
+			PRO ONLY. The amaptor.Layout objects that have at least one map frame displaying this map.
+		:return: list of amaptor.Layout instances
 		"""
+		return self.project._get_frame_graph().layouts_for(self)
+
+	def _list_arcgis_layers(self):
 		if PRO:
-			self._get_layers_pro()
+			with metrics.timer("listLayers"):
+				return self.map_object.listLayers()
 		else:
-			self._get_layers_arcmap()
+			with metrics.timer("ListLayers"):
+				return mapping.ListLayers(self.project.map_document)
+
+	def _wrap_layer(self, arcgis_layer):
+		return Layer(arcgis_layer, map_object=self, cache_properties=self.project.cache_layer_properties)  # map_object sets the backreference
+
+	def list_layers(self):
+		"""
+			Returns the list of layers in the map or data frame. Also available as map.layers. Every layer gets a new
+			amaptor.Layer object.
+		:return:
+		"""
+		self._arcgis_layers = self._list_arcgis_layers()
+		self.layers = [self._wrap_layer(layer) for layer in self._arcgis_layers]
 
+		self._layer_identities = None
+		self._layer_index = None
+		self.project._invalidate_source_index()  # the project's data source index holds the old Layer objects
 		return self.layers
 
+	def _update_layers(self):
+		"""
+			Brings the layer list up to date after amaptor adds layers. The layers are listed from ArcGIS once, and the
+			existing amaptor.Layer objects are kept for layers that were already in the list - matched up by
+			_layer_identities, since arcpy lists new objects each time - so only added layers get new objects.
+		:return: None
+		"""
+		if self._layers is None:  # never listed (lazy project) - it'll be listed in full on first access
+			return
+
+		old_layers = self._layers
+		old_identities = self._get_layer_identities()
+		self._arcgis_layers = self._list_arcgis_layers()
+		identities = _layer_identities(self._arcgis_layers)
+
+		old_keys = [identity[:2] for identity in old_identities]  # without the occurrence, which shifts when a duplicate is added above
+		keys = [identity[:2] for identity in identities]
+		layers = [None] * len(identities)
+		matcher = difflib.SequenceMatcher(None, old_keys, keys, autojunk=False)
+		for old_start, start, size in matcher.get_matching_blocks():
+			for offset in range(size):
+				layer = old_layers[old_start + offset]
+				layer.layer_object = self._arcgis_layers[start + offset]  # the same layer, through arcpy's new object
+				layers[start + offset] = layer
+		self.layers = [layer or self._wrap_layer(arcgis_layer) for layer, arcgis_layer in zip(layers, self._arcgis_layers)]
+		self._layer_identities = identities
+
+		if self._layer_index is not None:  # only the added layers need to be read for the query index
+			self._layer_index = _LayerIndex(self.layers, self._layer_index.records)
+		self.project._invalidate_source_index()
+
+	def _position(self, layer):
+		"""
+			The position of an amaptor.Layer object in self.layers, or None if it isn't one of them
+		"""
+		for position, existing in enumerate(self.layers):
+			if existing is layer:
+				return position
+		return None
+
+	def _get_layer_identities(self):
+		"""
+			Returns _layer_identities for self.layers, working them out if they aren't known. Reading them through the
+			amaptor.Layer objects uses their cached properties when the project caches layer properties.
+		"""
+		if self._layer_identities is None:
+			self._layer_identities = _layer_identities(self.layers)
+		return self._layer_identities
+
+	def _forget_symbology_source(self, layer):
+		"""
+			Called by amaptor.Layer when its symbology is set directly, so apply_symbology won't skip it
+		"""
+		if not self._symbology_sources:
+			return
+		position = self._position(layer)
+		if position is not None:
+			self._symbology_sources.pop(self._get_layer_identities()[position], None)
+		else:  # an object from an older listing - forget every layer it could be
+			key = _layer_identities([layer])[0][:2]
+			for identity in [identity for identity in self._symbology_sources if identity[:2] == key]:
+				del self._symbology_sources[identity]
+
+	def _reindex_layer(self, layer):
+		"""
+			Called by amaptor.Layer when one of this map's layers is changed through amaptor, so query_layers stays correct
+		"""
+		self._layer_identities = None  # its name or data source may have changed
+		if self._layer_index is not None:
+			self._layer_index.update(layer)
+
+	def _add_layer(self, add_layer, add_position):
+		if isinstance(add_layer, Layer):  # if it's an amaptor layer
+			add_layer.map = self  # this helps some future operations that require knowing what map the layer is a part of
+			add_layer = add_layer.layer_object
+
+		if PRO:
+			self.map_object.addLayer(add_layer, add_position)
+		else:
+			arcpy.mapping.AddLayer(self.map_object, add_layer, add_position)
+
 	def add_layer(self, add_layer, add_position="AUTO_ARRANGE"):
 		"""
 			Straight replication of addLayer API in arcpy.mp and arcpy.mapping. Adds a layer to a specified position
@@ -80,33 +438,66 @@ class Map(object):
 			as those available on addLayer.
 		:return: None
 		"""
-		if isinstance(add_layer, Layer):  # if it's an amaptor layer
-			new_layer = add_layer.layer_object
-			new_layer.map = self  # this helps some future operations that require knowing what map the layer is a part of
-		else:
-			new_layer = add_layer
-
-		if PRO:
-			self.map_object.addLayer(new_layer, add_position)
-		else:
-			arcpy.mapping.AddLayer(self.map_object, new_layer, add_position)
-
-		self.list_layers()  # make sure the internal layer list is up to date
+		self.add_layers([add_layer], add_position)
 
+	def add_layers(self, layers, add_position="AUTO_ARRANGE"):
+		"""
+			Adds many layers, with the same result as calling add_layer for each one in order, but the map's layer
+			list is only updated once at the end, which makes building up maps with many layers much faster.
+		:param layers: iterable of amaptor.Layer or arcpy Layer objects (or, in Pro, LayerFile objects)
+		:param add_position: see add_layer. Each layer is added at this position in turn
+		:return: None
+		"""
+		added = False
+		try:
+			for layer in layers:
+				self._add_layer(layer, add_position)
+				added = True
+		finally:  # keep the layer list accurate even if ArcGIS refuses one of the layers partway through
+			if added:
+				self.project.mark_modified()
+				self._update_layers()  # make sure the internal layer list is up to date
 
-	def insert_layer(self, reference_layer, insert_layer_or_layerfile, insert_position="BEFORE"):
+	def add_layers_from_sources(self, data_sources, template_layer=None, add_position="AUTO_ARRANGE"):
 		"""
-			Inserts a layer to a specific position in the table of contents, based on a reference layer.
-		:param reference_layer: The arcpy Layer instance to use as the reference layer
-		:param insert_layer_or_layerfile: The arcpy Layer instance to insert
-		:param insert_position: the position relative to the reference layer to insert the new layer. Default is "BEFORE" (above).
-		 	options correspond to those available on insertLayer in arcpy.mapping and arcpy.mp
+			Adds a layer for each data source, named after its dataset, with the same result as making each one with
+			amaptor.Layer(data_source, template_layer=template_layer) and passing them to add_layers. In Pro, the layer
+			file is read once from amaptor.functions.layer_file_cache and added to the map for every data source - arcpy
+			adds a copy - and the copy is pointed at the data, instead of parsing the layer file again for every layer.
+			In ArcMap, each layer is still made on its own with make_layer_with_file_symbology.
+		:param data_sources: iterable of paths to feature classes, shapefiles, or rasters
+		:param template_layer: path to a layer file to take symbology and other properties from. Defaults to amaptor's
+			blank template for each data source's type of data
+		:param add_position: see add_layer. Each layer is added at this position in turn
 		:return: None
 		"""
+		if not PRO:
+			self.add_layers((make_layer_with_file_symbology(data_source, template_layer) if template_layer else Layer(data_source) for data_source in data_sources), add_position)
+			return
+
+		added = False
+		try:
+			for data_source in data_sources:
+				desc = describe(data_source)
+				templates = layer_file_cache.templates(_template_layer_file(desc, template_layer))  # shared - only ever copied into the map
+				if not templates:
+					raise LayerNotFoundError("No layer available for copying from layer file")
+				if not templates[0].supports("DATASOURCE"):
+					raise NotSupportedError("Provided layer file doesn't support accessing or setting the data source")
+
+				layer = Layer(self.map_object.addLayer(templates[0], add_position)[0])  # the copy in the map - it gets wrapped for the map when the layers are listed
+				added = True
+				layer._set_data_source(data_source)
+				layer.name = desc.name
+		finally:  # as in add_layers, keep the layer list accurate if a data source fails partway through
+			if added:
+				self.project.mark_modified()
+				self._update_layers()
 
+	def _insert_layer(self, reference_layer, insert_layer_or_layerfile, insert_position):
 		if isinstance(insert_layer_or_layerfile, Layer):
-			insert_layer_or_layerfile = insert_layer_or_layerfile.layer_object
 			insert_layer_or_layerfile.map = self  # this helps some future operations where layers need to know what maps they're a part of
+			insert_layer_or_layerfile = insert_layer_or_layerfile.layer_object
 		else:
 			if PRO:
 				layer_type = arcpy._mp.Layer
@@ -114,18 +505,47 @@ class Map(object):
 				layer_type = arcpy._mapping.Layer
 
 			if not isinstance(insert_layer_or_layerfile, layer_type):
-				raise(RuntimeError, "provided object is not an Layer instance and can't be added to a map")
-
-		if isinstance(reference_layer, Layer):
-			reference_layer = reference_layer.layer_object
+				raise RuntimeError("provided object is not an Layer instance and can't be added to a map")
 
 		if PRO:
 			self.map_object.insertLayer(reference_layer, insert_layer_or_layerfile=insert_layer_or_layerfile, insert_position=insert_position)
 		else:
 			mapping.InsertLayer(self.map_object, reference_layer, insert_layer_or_layerfile, insert_position)
 
-		# update the internal layers list at the end
-		self.list_layers()
+	def insert_layer(self, reference_layer, insert_layer_or_layerfile, insert_position="BEFORE"):
+		"""
+			Inserts a layer to a specific position in the table of contents, based on a reference layer.
+		:param reference_layer: The arcpy Layer instance to use as the reference layer
+		:param insert_layer_or_layerfile: The arcpy Layer instance to insert
+		:param insert_position: the position relative to the reference layer to insert the new layer. Default is "BEFORE" (above).
+		 	options correspond to those available on insertLayer in arcpy.mapping and arcpy.mp
+		:return: None
+		"""
+		self.insert_layers(reference_layer, [insert_layer_or_layerfile], insert_position)
+
+	def insert_layers(self, reference_layer, layers, insert_position="BEFORE"):
+		"""
+			Inserts many layers relative to one reference layer, with the same result as calling insert_layer for each
+			one in order, but the map's layer list is only updated once at the end.
+		:param reference_layer: The amaptor or arcpy Layer to insert the layers next to
+		:param layers: iterable of amaptor.Layer or arcpy Layer objects
+		:param insert_position: "BEFORE" (above) or "AFTER" (below) the reference layer. Inserting "BEFORE" keeps the
+			layers in the order given, while "AFTER" puts each one directly below the reference layer, so they end up in
+			reverse order, as with repeated calls to insert_layer.
+		:return: None
+		"""
+		if isinstance(reference_layer, Layer):
+			reference_layer = reference_layer.layer_object
+
+		inserted = False
+		try:
+			for layer in layers:
+				self._insert_layer(reference_layer, layer, insert_position)
+				inserted = True
+		finally:
+			if inserted:
+				self.project.mark_modified()
+				self._update_layers()  # update the internal layers list at the end
 
 	def set_extent(self, extent_object, set_frame="ALL", add_buffer=True, buffer_factor=.05):
 		"""
@@ -133,6 +553,9 @@ class Map(object):
 			potential behaviors. If set_frame == "ALL" it sets all map frames linked to this map to this extent (default
 			behavior) and sets the default camera for this map so that future map frames will use the same extent.
 			If set_frame is an arcpy.mp MapFrame object instance, then it only sets the extent on that map frame.
+
+			The extent is projected once for each distinct spatial reference among the frames rather than once per
+			frame, using amaptor.extents.project. extent_object itself is not changed.
 		:param extent_object: an arcpy.Extent object. It will be reprojected to the spatial reference of the map frame or data frame automatically.
 		:param set_frame: ignored in arcmap, behavior described in main method description.
 		:param add_buffer: adds an empty space of 5% of the distance across the feature class around the provided extent
@@ -140,32 +563,38 @@ class Map(object):
 		:return: None
 		"""
 
+		self.project.mark_modified()
+
+		values = extents.extent_array(extent_object)
 		if add_buffer:
-			x_buf = (extent_object.XMax - extent_object.XMin) * buffer_factor
-			y_buf = (extent_object.YMax - extent_object.YMin) * buffer_factor
+			values = extents.buffer(values, buffer_factor)
+		source_spatial_reference = extent_object.spatialReference
 
-			extent_object.XMax += x_buf
-			extent_object.XMin -= x_buf
-			extent_object.YMax += y_buf
-			extent_object.YMin -= y_buf
+		def projected_extent(spatial_reference):
+			return extents.make_extent(extents.project(values, source_spatial_reference, spatial_reference), spatial_reference)
 
 		if PRO:
 			if set_frame == "ALL":
-				for frame in self.frames:
-					extent = reproject_extent(extent_object, frame.get_extent())
-					frame.set_extent(extent)
-					self.map_object.defaultCamera.setExtent(extent)
+				projected = {}  # spatial reference key -> extent, shared by every frame in that spatial reference
+				frames = self.frames
+				for frame in frames:
+					spatial_reference = frame.get_extent().spatialReference
+					key = extents.spatial_reference_key(spatial_reference)
+					if key not in projected:
+						projected[key] = projected_extent(spatial_reference)
+					frame.set_extent(projected[key])
+				if frames:  # as before, a map that isn't in any layout keeps its default camera
+					self.map_object.defaultCamera.setExtent(projected_extent(self.map_object.spatialReference))
 			else:
 				if isinstance(set_frame, MapFrame):
 					set_frame = set_frame._map_frame_object
 
 				if isinstance(set_frame, arcpy._mp.MapFrame):
-					extent = reproject_extent(extent_object, set_frame.camera.getExtent())
-					set_frame.camera.setExtent(extent)
+					set_frame.camera.setExtent(projected_extent(set_frame.camera.getExtent().spatialReference))
 				else:
 					raise ValueError("Invalid parameter set_frame. It can either be \"ALL\" or an instance of an arcpy.mp MapFrame object")
 		else:
-			self.map_object.extent = reproject_extent(extent_object, self.map_object.extent)
+			self.map_object.extent = projected_extent(self.map_object.extent.spatialReference)
 
 	def zoom_to_layer(self, layer, set_frame="ALL", add_buffer=True, buffer_factor=.05):
 		"""
@@ -174,24 +603,41 @@ class Map(object):
 			of how this option behaves. Since maps don't correspond 1:1 to layouts, in some cases multiple layouts will
 			be changed.
 		:param layer: can be a string name of a layer, or a layer object
-		:param set_layout: PRO ONLY, but ignored in ArcMap, so can be safe to use. This parameter controls which map frames
+		:param set_frame: PRO ONLY, but ignored in ArcMap, so can be safe to use. This parameter controls which map frames
 			are changed by the Zoom to Layer. By default, all linked map frames are updated. If an arcpy.mp.MapFrame instance
 			or an amaptor.MapFrame instance is provided, it zooms only that map frame to the layer.
 		:param add_buffer: adds an empty space of 5% of the distance across the feature class around the provided extent
 		:param buffer_factor: if add_buffer is True, then this factor controls how much space to add around the layer (default=.05)
 		:return: None
 		"""
-		if isinstance(layer, Layer):
-			layer = layer.layer_object  # get the actual layer object for the rest of this if an amaptor Layer is passed in.
+		self.zoom_to_layers([layer], set_frame=set_frame, add_buffer=add_buffer, buffer_factor=buffer_factor)
 
-		if PRO:
-			if not isinstance(layer, arcpy._mp.Layer):
-				layer = self.find_layer(name=layer).layer_object
-			self.set_extent(arcpy.Describe(layer.dataSource).extent, set_frame=set_frame, add_buffer=add_buffer, buffer_factor=buffer_factor)
-		else:
-			if not isinstance(layer, arcpy._mapping.Layer):
+	def zoom_to_layers(self, layers, set_frame="ALL", add_buffer=True, buffer_factor=.05):
+		"""
+			Zooms the map to the combined extent of several layers. Each layer's extent is read once and kept in
+			amaptor.extents.layer_extent_cache, already projected into the map's spatial reference, until its data
+			changes - so zooming to the same layers on every page of a map series doesn't describe them again.
+		:param layers: list of layer names, amaptor.Layer objects, or arcpy Layer objects
+		:param set_frame: see set_extent
+		:param add_buffer: adds an empty space of 5% of the distance across the combined extent around it
+		:param buffer_factor: if add_buffer is True, then this factor controls how much space to add around the layers (default=.05)
+		:return: None
+		"""
+		layer_objects = []
+		for layer in layers:
+			if isinstance(layer, Layer):
+				layer = layer.layer_object  # get the actual layer object for the rest of this if an amaptor Layer is passed in.
+			elif isinstance(layer, _string_types):
 				layer = self.find_layer(name=layer).layer_object
-			self.set_extent(layer.getExtent(), add_buffer=add_buffer, buffer_factor=buffer_factor)
+			layer_objects.append(layer)
+
+		spatial_reference = self.map_object.spatialReference
+		values = extents.union([extents.layer_extent_cache.extent(layer, spatial_reference) for layer in layer_objects])
+		if add_buffer:
+			values = extents.buffer(values, buffer_factor)
+
+		self.set_extent(extents.make_extent(values, spatial_reference), set_frame=set_frame, add_buffer=False)
+		if not PRO:
 			arcpy.RefreshActiveView()
 
 	def insert_layer_by_name_or_path(self, insert_layer_or_layer_file, near_name=None, near_path=None, insert_position="BEFORE"):
@@ -252,7 +698,135 @@ class Map(object):
 
 		return layers
 
-	def _export(self, out_path, layout, mapping_function, mp_function, layout_function, extension, **kwargs):
+	def query_layers(self, name=None, name_glob=None, name_regex=None, source=None, workspace=None, dataset_type=None, visible=None):
+		"""
+			Finds the layers in this map that match every provided condition. Conditions left as None are ignored, and
+			with no conditions, all layers are returned.
+
+			The layers' properties are read from arcpy once, on the first query, and indexed, so many queries against
+			a map are cheap. amaptor keeps the index current when layers are added, inserted, renamed, or changed
+			through amaptor.Layer. Changes made directly to arcpy layers or in the ArcGIS interface aren't seen until
+			map.list_layers() is called.
+
+			```
+				roads = my_map.query_layers(workspace=r"C:\data\transportation.gdb", dataset_type="FEATURE", visible=True)
+			```
+		:param name: exact layer name
+		:param name_glob: shell style pattern for the layer name, such as "Streams*" - case sensitive
+		:param name_regex: regular expression (string or compiled) searched for in the layer name
+		:param source: data source path, compared after normalization (see amaptor.functions.normalize_data_source)
+		:param workspace: path of the geodatabase or folder holding the layer's data, compared after normalization
+		:param dataset_type: one of "FEATURE", "RASTER", "GROUP", "BASEMAP", "WEB", "SERVICE", or "OTHER", from the
+			layer's is*Layer flags
+		:param visible: True or False to match the layer's visibility
+		:return: list of amaptor.Layer, in table of contents order
+		"""
+		if self._layer_index is None:
+			self._layer_index = _LayerIndex(self.layers)
+
+		if name_regex is not None and not hasattr(name_regex, "search"):
+			name_regex = re.compile(name_regex)
+		if source is not None:
+			source = normalize_data_source(source)
+		if workspace is not None:
+			workspace = normalize_data_source(workspace)
+		if dataset_type is not None:
+			dataset_type = dataset_type.upper()
+
+		return self._layer_index.query(name, name_glob, name_regex, source, workspace, dataset_type, visible)
+
+	def _symbology_targets(self, target):
+		"""
+			Finds the amaptor.Layer objects in this map that an apply_symbology target refers to
+		"""
+		if isinstance(target, Layer):
+			return [target]
+		if isinstance(target, _string_types):
+			layers = self.query_layers(name=target)
+		elif isinstance(target, dict):
+			layers = self.query_layers(**target)
+		else:  # an arcpy layer - use this map's amaptor.Layer for it when there is one
+			layers = [layer for layer in self.layers if layer.layer_object is target]
+			if not layers:  # arcpy lists new objects each time, so look for the one layer with the same name and source
+				key = _layer_identities([target])[0][:2]
+				layers = [layer for layer, identity in zip(self.layers, self._get_layer_identities()) if identity[:2] == key]
+				if len(layers) != 1:
+					layers = [Layer(target, map_object=self)]
+
+		if not layers:
+			raise LayerNotFoundError("No layers in map {} match {}".format(self.name, target))
+		return layers
+
+	def apply_symbology(self, assignments):
+		"""
+			Styles many layers at once. Each distinct symbology source is resolved once (a layer file is read once, and a
+			layer's symbology is read from arcpy once) and then applied to every layer it's assigned to. Layers that
+			were already styled from the same, unchanged layer file by a previous apply_symbology call are skipped.
+			Errors are recorded for each layer instead of stopping the whole run.
+
+			```
+				results = my_map.apply_symbology({
+					"Streams": r"C:\styles\streams.lyrx",
+					"Lakes": r"C:\styles\water.lyrx",
+				})
+				results += my_map.apply_symbology([({"workspace": r"C:\data\roads.gdb"}, r"C:\styles\roads.lyrx")])
+				failed = [result for result in results if result.status == "failed"]
+			```
+		:param assignments: a dictionary of {target: source}, or a list of (target, source) pairs. A target is an
+			amaptor.Layer, an arcpy Layer, a layer name (every layer with that name), or a dictionary of query_layers
+			keyword arguments (pairs only, since dictionaries can't be dictionary keys). A source is anything the
+			Layer.symbology setter accepts.
+		:return: list of SymbologyResult, one per layer (or per target that matched no layers)
+		"""
+		if hasattr(assignments, "items"):
+			assignments = assignments.items()
+
+		identities = dict((id(layer), identity) for layer, identity in zip(self.layers, self._get_layer_identities()))
+		current = set(identities.values())
+		for identity in [identity for identity in self._symbology_sources if identity not in current]:
+			del self._symbology_sources[identity]  # the layer was removed, renamed, or repointed
+
+		resolved = {}  # source key -> (resolved symbology, exception)
+		results = []
+		for target, source in assignments:
+			try:
+				layers = self._symbology_targets(target)
+			except LayerNotFoundError as e:
+				results.append(SymbologyResult(target, source, "failed", e))
+				continue
+
+			source_key = _symbology_source_key(source)
+			if source_key not in resolved:
+				try:
+					resolved[source_key] = (_resolve_symbology(source), None)
+				except Exception as e:
+					log.error("Couldn't read symbology from {}: {}".format(source, e))
+					resolved[source_key] = (None, e)
+			symbology, error = resolved[source_key]
+
+			for layer in layers:
+				identity = identities.get(id(layer))  # None for layers that aren't in this map's layer list
+				if error is not None:
+					results.append(SymbologyResult(layer, source, "failed", error))
+				elif identity is not None and self._symbology_sources.get(identity) == source_key:
+					results.append(SymbologyResult(layer, source, "skipped", None))
+				else:
+					try:
+						layer.map = self
+						layer._apply_symbology(symbology)
+					except Exception as e:
+						log.error("Couldn't apply symbology from {} to layer {}: {}".format(source, layer.name, e))
+						results.append(SymbologyResult(layer, source, "failed", e))
+						continue
+					if identity is not None and source_key[0] == "file":  # objects can change, so only files are remembered
+						self._symbology_sources[identity] = source_key
+					elif identity is not None:
+						self._symbology_sources.pop(identity, None)
+					results.append(SymbologyResult(layer, source, "applied", None))
+
+		return results
+
+	def _export(self, out_path, layout, export_format, parallel=None, cache=None, **kwargs):
 		"""
 			Defines general export behavior for most map export types. Designed to be called only by other methods
 			on this class, which will define the functions needed for this.
@@ -262,44 +836,101 @@ class Map(object):
 			In Pro, we have a few options. If layout is an ArcGIS Pro Layout instance or an amaptor Layout instance, then
 			only that layout is exported to the output path. If layout is the keyword "ALL" then all layouts associated
 			with this map are exported to the output path, with the layout name appended to the path before the extension.
+			With layout="ALL" and parallel set to more than 1, the layouts are exported by that many worker processes
+			instead - see _iter_layout_exports.
+
+			With cache set, exports whose inputs haven't changed since they were last exported are copied (or hard
+			linked) from the export cache instead of being rendered - see Layout._export_fingerprint.
 
 		:param out_path: The path to export the document to
 		:param layout: PRO only, safely ignored in ArcMap. The mp.Layout or amaptor.Layout object to export, or the keyword "ALL"
-		:param mapping_function: the function to use for export in arcpy.mapping
-		:param mp_function: the function to use for export for an arcpy.mp.Layout instance
-		:param layout_function: the function to use for export for an amaptor.Layout instance
-		:param extension: the file extension to assign the export, without a "." included
+		:param export_format: "pdf" or "png"
+		:param parallel: PRO only. The number of worker processes to export layouts with when layout is "ALL"
+		:param cache: True to use amaptor.cache.export_cache, or an amaptor.cache.ExportCache to use instead. Not
+			used when layout is an arcpy.mp Layout
 		:param kwargs: kwargs that get passed straight through to the exporting functions.
 		:return: list of file paths. In most cases, the list will have only one item, but in the case of layout="ALL",
 			the list will have many paths generated by the export.
 		"""
-		file_paths = []
+		results = sorted(self._iter_export(out_path, layout, export_format, parallel, cache, kwargs), key=lambda item: item[0])
+		return [result.path for position, result in results]
+
+	def _iter_export(self, out_path, layout, export_format, parallel, cache, kwargs):
+		"""
+			Does the work for _export and iter_export, yielding (position, ExportResult) as each file is written
+		"""
+		mapping_function, mp_function = _EXPORT_FUNCTIONS[export_format]
 		if ARCMAP:
-			function = getattr(mapping, mapping_function)
-			function(self.project.map_document, out_path, **kwargs)
-			file_paths.append(out_path)
+			def export():
+				with metrics.timer(mapping_function):
+					getattr(mapping, mapping_function)(self.project.map_document, out_path, **kwargs)
+
+			start = time.time()
+			cached = _export_with_cache(cache, lambda: self._export_fingerprint_arcmap(mapping_function, kwargs), out_path, export)
+			yield 0, _export_result(out_path, None, start, cached)
 		else:
-			if isinstance(layout, arcpy._mp.Layout) or isinstance(layout, Layout):
-				if isinstance(layout, Layout):
-					layout_function = getattr(layout, layout_function)
-					layout_function(layout, out_path, **kwargs)
-				else:
-					mp_function = getattr(layout, mp_function)
-					mp_function(layout, out_path, **kwargs)
-				file_paths.append(out_path)
+			if isinstance(layout, Layout):
+				start = time.time()
+				cached = layout._export(mp_function, out_path, cache, kwargs)
+				yield 0, _export_result(out_path, layout.name, start, cached)
+			elif isinstance(layout, arcpy._mp.Layout):
+				start = time.time()
+				with metrics.timer(mp_function):
+					getattr(layout, mp_function)(out_path, **kwargs)
+				yield 0, _export_result(out_path, layout.name, start, False)
 			elif layout == "ALL":
 				base_path, file_name = os.path.split(out_path)
 				file_base = os.path.splitext(file_name)[0]
 
-				layout_function = getattr(Layout, layout_function)
-				for layout in self.layouts:
-					output_path = os.path.join(base_path, "{}_{}.{}".format(file_base, layout.name, extension))
-					layout_function(layout, output_path, **kwargs)
-					file_paths.append(output_path)
+				exports = [(layout, os.path.join(base_path, "{}_{}.{}".format(file_base, layout.name, export_format))) for layout in self.layouts]
+				for item in _iter_layout_exports(self.project, exports, mp_function, kwargs, parallel=parallel, cache=cache):
+					yield item
 
-		return file_paths
+	def iter_export(self, out_path, export_format="pdf", layout="ALL", parallel=None, cache=None, **kwargs):
+		"""
+			Generator version of export_pdf and export_png that yields an ExportResult (path, layout name, seconds,
+			bytes, and whether it came from the cache) as soon as each file is written, so that the files can be used
+			while the rest are still exporting, and files written before a failure aren't lost. Takes the same options
+			as export_pdf and export_png. With parallel, results come in the order the exports finish.
+
+			```
+				for result in l_map.iter_export(output_path, "png", parallel=4):
+					upload(result.path)
+			```
+		:param out_path: The full path to export to - see _export for how it's modified for each layout
+		:param export_format: "pdf" or "png"
+		:param layout: PRO only, safely ignored in ArcMap. The mp.Layout or amaptor.Layout object to export, or the keyword "ALL"
+		:param parallel: PRO only. With layout="ALL", the number of worker processes to export the layouts with
+		:param cache: see export_pdf
+		:param kwargs: export settings, as for export_pdf (or resolution, for export_png)
+		:return: generator of amaptor.classes.map.ExportResult
+		"""
+		for position, result in self._iter_export(out_path, layout, export_format, parallel, cache, _export_kwargs(export_format, kwargs)):
+			yield result
 
-	def export_png(self, out_path, resolution=300, layout="ALL", ):
+	def _export_fingerprint_arcmap(self, mapping_function, kwargs):
+		"""
+			ArcMap version of Layout._export_fingerprint, covering the whole map document - its layout elements, each
+			data frame's extent, and every layer. Documents whose layer symbology amaptor has changed aren't cached,
+			since ArcMap can't read symbology back in full.
+		"""
+		document = self.project.map_document
+		if not os.path.isfile(self.project.path) or self.project._symbology_changed:
+			return None
+
+		parts = [mapping_function, sorted(kwargs.items()), file_hash(self.project.path)]
+		parts.extend(_element_fingerprint(element) for element in mapping.ListLayoutElements(document))
+		parts.extend((data_frame.name, _extent_fingerprint(data_frame.extent)) for data_frame in mapping.ListDataFrames(document))
+
+		source_times = {}
+		for layer in mapping.ListLayers(document):
+			layer_fingerprint = _layer_fingerprint(layer, source_times)
+			if layer_fingerprint is None:
+				return None
+			parts.append(layer_fingerprint)
+		return parts
+
+	def export_png(self, out_path, resolution=300, layout="ALL", parallel=None, cache=None):
 		"""
 			See documentation for _export for description of behavior in each version. The specific option here is only
 			the resolution to export at.
@@ -307,29 +938,31 @@ class Map(object):
 			paths will be returned by the function as a list.
 		:param resolution: the resolution to export the map at
 		:param layout:  PRO only, safely ignored in ArcMap. The mp.Layout or amaptor.Layout object to export, or the keyword "ALL"
+		:param parallel: PRO only. With layout="ALL", the number of worker processes to export the layouts with. Raises
+			amaptor.ExportError if any of them fail
+		:param cache: True to reuse unchanged exports from amaptor.cache.export_cache, or an amaptor.cache.ExportCache
+			to use instead
 		:return:
 		"""
-		return self._export(out_path, layout=layout, mapping_function="ExportToPNG", mp_function="exportToPNG", layout_function="export_to_png", extension="png", resolution=resolution,)
+		return self._export(out_path, layout=layout, export_format="png", parallel=parallel, cache=cache, resolution=resolution,)
 
-	def export_pdf(self, out_path, layout="ALL", **kwargs):
+	def export_pdf(self, out_path, layout="ALL", parallel=None, cache=None, **kwargs):
 		"""
 			See documentation for _export for description of behavior in each version. kwargs that apply to exporting to PDF
 			in ArcMap and ArcGIS Pro apply here.
 		:param out_path: The full path to export the document to. Will be modified in the case of layout="ALL". New generated
 			paths will be returned by the function as a list.
 		:param layout:  PRO only, safely ignored in ArcMap. The mp.Layout or amaptor.Layout object to export, or the keyword "ALL"
+		:param parallel: PRO only. With layout="ALL", the number of worker processes to export the layouts with. Raises
+			amaptor.ExportError if any of them fail
+		:param cache: True to reuse unchanged exports from amaptor.cache.export_cache, or an amaptor.cache.ExportCache
+			to use instead
 		:param **kwargs: accepts the set of parameters that works for both arcmap and arcgis pro. resolution, image_quality,
 			image_compression, embed_fonts, layers_attributes, georef_info, jpeg_compression_quality. In the future,
 			this may be reengineered to translate parameters with common goals but different names
 		:return:
 		"""
-		new_kwargs = {}
-		allowed_kwargs = ["resolution", "image_quality", "image_compression", "embed_fonts", "layers_attributes", "georef_info", "jpeg_compression_quality"]
-		for kwarg in allowed_kwargs:
-			if kwarg in kwargs.keys():
-				new_kwargs[kwarg] = kwargs[kwarg]  # assign any keys in the kwargs that are valid to a new kwarg dict, tossing out others.
-
-		return self._export(out_path, layout=layout, mapping_function="ExportToPDF", mp_function="exportToPDF", layout_function="export_to_pdf", extension="pdf", **new_kwargs)
+		return self._export(out_path, layout=layout, export_format="pdf", parallel=parallel, cache=cache, **_export_kwargs("pdf", kwargs))
 
 	def to_package(self, output_file, **kwargs):
 		"""
@@ -347,10 +980,11 @@ class Map(object):
 		log.warning("Warning: Saving map to export package")
 		self.project.save()
 
-		if PRO:
-			arcpy.PackageMap_management(self.map_object, output_file, **kwargs)
-		else:
-			arcpy.PackageMap_management(self.project.path, output_file, **kwargs)
+		with metrics.timer("PackageMap"):
+			if PRO:
+				arcpy.PackageMap_management(self.map_object, output_file, **kwargs)
+			else:
+				arcpy.PackageMap_management(self.project.path, output_file, **kwargs)
 
 
 	def replace_text(self, text, replacement):
@@ -367,9 +1001,25 @@ class Map(object):
 		:return:
 		"""
 
+		self.render_text({text: replacement})
+
+	def render_text(self, replacements):
+		"""
+			Replaces many placeholders at once - see Layout.render_text. Covers the same elements as replace_text:
+			the whole map document in ArcMap, and all layouts linked to this map in Pro.
+		:param replacements: dictionary of {text_to_find: replacement}
+		:return: the number of text elements that were changed
+		"""
+		render = _text_renderer(replacements)
+		if render is None:
+			return 0
+
 		if ARCMAP:
-			for elm in arcpy.mapping.ListLayoutElements(self.project.primary_document, "TEXT_ELEMENT"):
-				elm.text = elm.text.replace(text, replacement)
+			with metrics.timer("ListLayoutElements"):
+				elements = arcpy.mapping.ListLayoutElements(self.project.primary_document, "TEXT_ELEMENT")
+			changed = _render_text_elements(elements, render)
+			if changed:
+				self.project.mark_modified()
+			return changed
 		else:
-			for layout in self.layouts:  # in pro, iterate through Layout objects instead and replace in all
-				layout.replace_text(text, replacement)
+			return sum(layout._render_text(render) for layout in self.layouts)
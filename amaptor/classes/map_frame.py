@@ -9,9 +9,16 @@ class MapFrame(object):
 	def __init__(self, map_frame_object, layout):
 		self._map_frame_object = map_frame_object
 		self.layout = layout
+		self._map = None
+		self._map_resolved = False  # when the project is lazy, we look up the map the first time it's requested
 
+		if not layout.project.lazy:
+			self._resolve_map()
+
+	def _resolve_map(self):
+		self._map_resolved = True
 		try:
-			self._map = layout.project.find_map(map_frame_object.map.name)  # find the map that this relates to
+			self._map = self.layout.project.find_map(self._map_frame_object.map.name)  # find the map that this relates to
 		except MapNotFoundError:
 			self._map = None  # this is ok, because if we just created the frame, it may not be findable (as when we import a layout), but it should be set later
 
@@ -20,12 +27,16 @@ class MapFrame(object):
 		#if not isinstance(amaptor_map, map.Map):  # probably getting a circular import here, why it's commented out
 		#	raise MapNotFoundError("Provided map is either None or not an instance of amaptor.classes.Map")
 
-		self._map = amaptor_map
-		self._map._index_frames()  # have it reindex all of the frames and maps it has
+		old_map = self._map  # when it isn't resolved yet, the project's frame graph hasn't seen this frame either
 		self._map_frame_object.map = amaptor_map.map_object
+		self._map = amaptor_map
+		self._map_resolved = True
+		self.layout.project._move_frame(self, old_map, amaptor_map)
+		self.layout.project.mark_modified()
 
 	def set_extent(self, extent_object):
 		self._map_frame_object.camera.setExtent(extent_object)
+		self.layout.project.mark_modified()
 
 	def get_extent(self):
 		return self._map_frame_object.camera.getExtent()
@@ -36,10 +47,15 @@ class MapFrame(object):
 
 	@name.setter
 	def name(self, value):
+		old_name = self._map_frame_object.name
 		self._map_frame_object.name = value
+		self.layout._rename_frame(self, old_name, value)
+		self.layout.project.mark_modified()
 
 	@property
 	def map(self):
+		if not self._map_resolved:
+			self._resolve_map()
 		return self._map
 
 	@map.setter
@@ -1,30 +1,136 @@
+import collections
 import os
+import re
 import logging
 log = logging.getLogger("amaptor")
 
 import arcpy
 
 from amaptor.version_check import PRO, ARCMAP, mapping, mp
-from amaptor.classes.map import Map
+from amaptor.classes.map import Map, _EXPORT_FUNCTIONS, _export_kwargs, _iter_layout_exports
 from amaptor.classes.layout import Layout
 from amaptor.classes.map_frame import MapFrame
 
+from amaptor import scratch, metrics
 from amaptor.constants import _TEMPLATES, _PRO_BLANK_LAYOUT
-from amaptor.functions import _import_mxd_to_new_pro_project
+from amaptor.functions import _import_mxd_to_new_pro_project, _data_source_keys, normalize_data_source, _text_renderer, _render_text_elements, _string_types
 
 from amaptor.errors import *
 
 
+class RepointReport(collections.namedtuple("RepointReport", ["changed", "unchanged", "missing_workspaces"])):
+	"""
+		What Project.repoint did. changed is a list of (layer, old_source, new_source) tuples for layers whose data
+		source changed, and unchanged lists the amaptor.Layer objects that were in the old workspace but still point
+		there afterward. missing_workspaces lists the target workspaces that didn't exist when validate was True -
+		layers that would have moved into them were left alone.
+	"""
+	__slots__ = ()
+
+
+def _workspace_key(data_source):
+	"""
+		The normalized workspace (geodatabase or folder) of a data source
+	"""
+	return normalize_data_source(data_source).rpartition("/")[0]
+
+
+def _in_workspace(workspace, old_workspace):
+	return workspace == old_workspace or workspace.startswith(old_workspace + "/")
+
+
+def _workspace_suffix(data_source, workspace, old_workspace):
+	"""
+		The part of a data source's workspace below old_workspace, as it's written in the data source (keeping its case
+		and separators). workspace and old_workspace are normalized, and the normalized and original paths have the
+		same folders up to the workspace, so the folder counts from the normalized paths locate the suffix.
+	:param data_source: the layer's data source, as arcpy reports it
+	:param workspace: _workspace_key(data_source)
+	:param old_workspace: the normalized workspace being replaced, which workspace is inside
+	:return: string starting with a separator, or an empty string when workspace is old_workspace
+	"""
+	folders = [match for match in re.finditer(r"[^\\/]+", data_source) if match.group(0) != "."]
+	start = len([part for part in old_workspace.split("/") if part])
+	end = len([part for part in workspace.split("/") if part])
+	if start >= end:
+		return ""
+	begin = folders[start - 1].end() if start else 0
+	return data_source[begin:folders[end - 1].end()]
+
+
+class _FrameGraph(object):
+	"""
+		Which map frames, and so which layouts, display each map - the project's side of the links between maps, frames,
+		and layouts (each amaptor.MapFrame holds its own map). Built in one pass over every layout's frames, reading each
+		frame's map from arcpy once, and then kept current as frames are pointed at other maps and layouts are added,
+		rather than every map scanning every frame. Keyed on the amaptor objects themselves, so renames don't affect it.
+	"""
+
+	def __init__(self, layouts):
+		self._frames = {}  # amaptor.Map -> list of amaptor.MapFrame, in layout order
+		self._order = {}  # amaptor.MapFrame -> position across all layouts, to keep each map's frames in layout order
+		for layout in layouts:
+			self.add_layout(layout)
+
+	def add_layout(self, layout):
+		for frame in layout.frames:
+			self._order[frame] = len(self._order)
+			self._add(frame, frame.map)
+
+	def _add(self, frame, l_map):
+		if l_map is not None:
+			self._frames.setdefault(l_map, []).append(frame)
+
+	def move_frame(self, frame, old_map, new_map):
+		"""
+			Records that frame now displays new_map instead of old_map (either can be None)
+		"""
+		frames = self._frames.get(old_map, [])
+		if frame in frames:
+			frames.remove(frame)
+		self._add(frame, new_map)
+		if new_map is not None:
+			self._frames[new_map].sort(key=lambda item: self._order.get(item, len(self._order)))
+
+	def frames_for(self, l_map):
+		return list(self._frames.get(l_map, []))
+
+	def layouts_for(self, l_map):
+		layouts = []
+		for frame in self._frames.get(l_map, []):
+			if frame.layout not in layouts:
+				layouts.append(frame.layout)
+		return layouts
+
+
 class Project(object):
 	"""
 		An ArcGIS Pro Project or an ArcMap map document - maps in ArcGIS Pro and data frames in ArcMap are Map class attached to this project
 		Access to the underlying object is provided using name ArcGISProProject and ArcMapDocument
 	"""
 
-	def __init__(self, path):
-
-		self.maps = []  # stores list of included maps/dataframes
-		self.layouts = []
+	def __init__(self, path, lazy=False, cache_layer_properties=False):
+		"""
+		:param path: path to an ArcGIS Pro Project or ArcMap Document, or the keyword "CURRENT"
+		:param lazy: When True, maps, layouts, layers, frames, and elements are only wrapped the first time they are
+			accessed instead of all being built when the project is opened. Useful for large projects where only a
+			small part of the document will be touched.
+		:param cache_layer_properties: When True, the project's amaptor.Layer objects are created with
+			cache_properties=True, so finding and filtering layers reads each layer's name, data source, and so on from
+			arcpy only once. Can also be changed later through the attribute of the same name, which applies to layers
+			listed after the change.
+		"""
+
+		self._maps = None  # stores list of included maps/dataframes - built on first access of self.maps when lazy
+		self._layouts = None
+		self._map_index = None  # name -> amaptor.Map, built on first lookup and kept up to date by amaptor's renames
+		self._layout_index = None  # name -> amaptor.Layout
+		self._source_index = None  # normalized data source -> list of amaptor.Layer, rebuilt after layers change
+		self._frame_graph = None  # _FrameGraph of which frames and layouts show each map, built on first use
+		self.lazy = lazy
+		self.cache_layer_properties = cache_layer_properties
+		self.modified = False  # set by mark_modified when amaptor changes the document
+		self._symbology_changed = False  # ArcMap only - set when amaptor updates a layer's symbology, which export fingerprints can't read there
 		self.path = None  # will be set after any conversion to current version of ArcGIS is done (aprx->mxd or vice versa)
 		self.map_document = None
 		self.arcgis_pro_project = None
@@ -38,7 +144,7 @@ class Project(object):
 			elif path.endswith("aprx"):
 				self.path = path
 			elif path.endswith("mxd"):
-				self.path = _import_mxd_to_new_pro_project(path)
+				self.path = _import_mxd_to_new_pro_project(path, owner=self)
 			else:
 				raise ValueError("Project or MXD path not recognized as an ArcGIS compatible file (.aprx or .mxd)")
 
@@ -68,16 +174,11 @@ class Project(object):
 			conversion from Map Document to Pro Project is done.
 		:return: None
 		"""
-		self.arcgis_pro_project = mp.ArcGISProject(self.path)
+		self.arcgis_pro_project = self._open_document()
 		self.primary_document = self.arcgis_pro_project
-		for l_map in self.arcgis_pro_project.listMaps():
-			self.maps.append(Map(self, l_map))
-
-		for layout in self.primary_document.listLayouts():
-			self.layouts.append(Layout(layout, self))
 
-		for map in self.maps:
-			map._index_frames()
+		if not self.lazy:  # otherwise, maps and layouts will be built by their properties when they're first accessed
+			self._build_graph()
 
 	def _arcmap_setup(self):
 		"""
@@ -85,10 +186,179 @@ class Project(object):
 			needed conversion from Pro Project to map docusment is done (can we go that way?)
 		:return: None
 		"""
-		self.map_document = mapping.MapDocument(self.path)
+		self.map_document = self._open_document()
 		self.primary_document = self.map_document
-		for l_map in mapping.ListDataFrames(self.map_document):
-			self.maps.append(Map(self, l_map))
+
+		if not self.lazy:
+			self._build_graph()
+
+	def _build_graph(self):
+		"""
+			Wraps every map and layout in the document up front (the behavior when the project isn't lazy)
+		:return: None
+		"""
+		self._layouts = []  # keeps maps from loading layouts while they're built - frames are indexed once both exist
+		self._load_maps()
+		self._load_layouts()
+		self._get_frame_graph()
+
+	def _open_document(self):
+		"""
+			Opens the ArcGIS Pro Project or Map Document at self.path
+		:return: arcpy.mp.ArcGISProject or arcpy.mapping.MapDocument
+		"""
+		if PRO:
+			return mp.ArcGISProject(self.path)
+		else:
+			return mapping.MapDocument(self.path)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def close(self):
+		"""
+			Releases the underlying ArcGIS Pro Project or Map Document, along with amaptor's maps and layouts, which hold
+			references into it. The project can't be used after it's closed. Projects can also be used as context
+			managers, which close them on exit.
+		:return: None
+		"""
+		self._maps = None
+		self._layouts = None
+		self._map_index = None
+		self._layout_index = None
+		self._source_index = None
+		self._frame_graph = None
+		self.arcgis_pro_project = None
+		self.map_document = None
+		self.primary_document = None
+		scratch.pool.release_owner(self)  # deletes the converted project and temporary geodatabase when opened from an MXD in Pro
+
+	def mark_modified(self):
+		"""
+			Flags that the document has been changed since it was opened. amaptor's own methods call this when they
+			change the document. If you change the underlying arcpy objects directly on a project that came from
+			amaptor.open_project(..., cache=True), call this so that the changed document isn't reused by the cache.
+		:return: None
+		"""
+		self.modified = True
+
+	def _load_maps(self):
+		"""
+			Wraps each map (or data frame) in the document in an amaptor.Map. Maps are appended one at a time so that
+			anything looking up maps while they're being built sees the ones that already exist.
+		:return: None
+		"""
+		self._maps = []
+		self._map_index = None
+		self._source_index = None
+		self._frame_graph = None
+		if PRO:
+			map_objects = self.arcgis_pro_project.listMaps()
+		else:
+			map_objects = mapping.ListDataFrames(self.map_document)
+
+		for l_map in map_objects:
+			self._maps.append(Map(self, l_map))
+
+	def _load_layouts(self):
+		"""
+			Wraps each layout in the project in an amaptor.Layout. ArcMap documents don't have layouts, so it's always
+			empty there.
+		:return: None
+		"""
+		self._layouts = []
+		self._layout_index = None
+		self._frame_graph = None
+		if PRO:
+			for layout in self.arcgis_pro_project.listLayouts():
+				self._layouts.append(Layout(layout, self))
+
+	@property
+	def maps(self):
+		"""
+			The list of amaptor.Map objects in this project. Built when the project is opened, or on first access when
+			the project was opened with lazy=True.
+		:return: list of amaptor.Map instances
+		"""
+		if self._maps is None:
+			self._load_maps()
+		return self._maps
+
+	@property
+	def layouts(self):
+		"""
+			PRO ONLY (always empty in ArcMap). The list of amaptor.Layout objects in this project. Built when the
+			project is opened, or on first access when the project was opened with lazy=True.
+		:return: list of amaptor.Layout instances
+		"""
+		if self._layouts is None:
+			self._load_layouts()
+		return self._layouts
+
+	def _get_map_index(self):
+		"""
+			Returns the dictionary of map names to amaptor.Map objects, building it if it doesn't exist yet. Reading a
+			name from arcpy is slow, so each name is read once here and then kept current by new_map and Map.name
+		:return: dict
+		"""
+		if self._map_index is None:
+			maps = self.maps  # load first when lazy - loading resets the index
+			self._map_index = {}
+			for l_map in maps:
+				self._map_index.setdefault(l_map.name, l_map)  # keep the first map with a name, like a linear scan would
+		return self._map_index
+
+	def _get_layout_index(self):
+		"""
+			Returns the dictionary of layout names to amaptor.Layout objects, building it if it doesn't exist yet.
+		:return: dict
+		"""
+		if self._layout_index is None:
+			layouts = self.layouts
+			self._layout_index = {}
+			for layout in layouts:
+				self._layout_index.setdefault(layout.name, layout)
+		return self._layout_index
+
+	def _get_frame_graph(self):
+		"""
+			Returns the _FrameGraph of which frames and layouts display each map, building it if it doesn't exist yet
+		:return: _FrameGraph
+		"""
+		if self._frame_graph is None:
+			maps = self.maps  # frames look their maps up by name, so load maps first when lazy - loading resets the graph
+			self._frame_graph = _FrameGraph(self.layouts)
+		return self._frame_graph
+
+	def _move_frame(self, frame, old_map, new_map):
+		"""
+			Called by MapFrame.map when a frame is pointed at a different map so that the frame graph stays correct
+		"""
+		if self._frame_graph is not None:
+			self._frame_graph.move_frame(frame, old_map, new_map)
+
+	def _rename_map(self, l_map, old_name, new_name):
+		"""
+			Called by Map.name when a map is renamed so that the name index stays correct
+		"""
+		if self._map_index is None:
+			return
+		if self._map_index.get(old_name) is l_map:
+			del self._map_index[old_name]
+		self._map_index.setdefault(new_name, l_map)
+
+	def _rename_layout(self, layout, old_name, new_name):
+		"""
+			Called by Layout.name when a layout is renamed so that the name index stays correct
+		"""
+		if self._layout_index is None:
+			return
+		if self._layout_index.get(old_name) is layout:
+			del self._layout_index[old_name]
+		self._layout_index.setdefault(new_name, layout)
 
 	def list_maps(self):
 		"""
@@ -97,29 +367,145 @@ class Project(object):
 		"""
 		return self.maps
 
+	def _get_source_index(self):
+		"""
+			Returns the dictionary of normalized data sources to the layers (across all maps) that use them, building it
+			if needed. Each layer's data source is read from arcpy once per build. Maps discard the index whenever their
+			layer list is refreshed, and layers discard it when their data source is changed through amaptor.
+		:return: dict
+		"""
+		if self._source_index is None:
+			maps = self.maps
+			source_index = {}
+			for l_map in maps:
+				for layer in l_map.layers:
+					if not layer.supports("DATASOURCE"):
+						continue
+					for key in _data_source_keys(layer.dataSource):
+						source_index.setdefault(key, []).append(layer)
+			self._source_index = source_index
+		return self._source_index
+
+	def _invalidate_source_index(self):
+		self._source_index = None
+
+	def find_layers_by_sources(self, paths):
+		"""
+			Looks up many data sources at once. Paths are normalized (see amaptor.functions.normalize_data_source), so
+			differences in case, slashes, and feature datasets inside geodatabases don't prevent a match.
+		:param paths: an iterable of data source paths
+		:return: dict keyed by each provided path, with a list of the amaptor.Layer instances (in map order) using that
+			data source as the value. Paths with no matching layers get an empty list.
+		"""
+		source_index = self._get_source_index()
+		return dict((path, list(source_index.get(normalize_data_source(path), []))) for path in paths)
+
 	def find_layer(self, path, find_all=True):
 		"""
 			Finds a layer in all maps by searching for the path. By default finds all, but can find just the first one too
-		:param path: the full path of the data source for the layer
+		:param path: the full path of the data source for the layer. Compared after normalization, like find_layers_by_sources.
 		:param find_all: When True, reutrns a list of amaptor.Map instances that match. When false, returns only the first match
 		:return: list of amaptor.map instances or a single amaptor.map instance.
 		"""
-		layers = []
-		for map in self.maps:
-			try:
-				new_layers = map.find_layer(path=path, find_all=find_all)
-			except LayerNotFoundError:
-				continue
-
-			if find_all:  # if it didn't find any, we would have raised an exception, so we have something
-				layers += new_layers
-			else:  # if we were only supposed to get one, return it
-				return new_layers
+		layers = self.find_layers_by_sources([path])[path]
 
 		if len(layers) == 0:
-			raise LayerNotFoundError()
+			raise LayerNotFoundError("No layers with data source {} found in project".format(path))
+
+		if find_all:
+			return layers
+		else:
+			return layers[0]
+
+	def repoint(self, old_workspace, new_workspace, maps=None, validate=True):
+		"""
+			Moves every layer that reads data from old_workspace (a geodatabase, folder, or .sde connection file) over
+			to the data with the same names in new_workspace. Layers in workspaces inside old_workspace (geodatabases in
+			a folder, for example) move to the matching workspace inside new_workspace.
+
+			Layers are grouped by the workspace they'll move to, and each of those is checked once, instead of arcpy
+			validating again for every layer. The data sources are then updated with a single arcpy call for the whole
+			project (updateConnectionProperties in Pro, findAndReplaceWorkspacePaths in ArcMap), or for each map when
+			maps is given, falling back to one call per layer only when some layers have to be left alone.
+
+			```
+				report = project.repoint("C:/data/2017_snapshot.gdb", "C:/data/2018_snapshot.gdb")
+				print("{} layers repointed".format(len(report.changed)))
+			```
+		:param old_workspace: the workspace path the layers use now, as it appears at the start of their data sources
+		:param new_workspace: the workspace path to use instead
+		:param maps: optional list of amaptor.Map objects (or map names) to limit the change to. Defaults to all maps
+		:param validate: When True, target workspaces that don't exist are skipped and listed in the report's
+			missing_workspaces. When False, every layer is repointed without checking
+		:return: RepointReport
+		"""
+		if maps is None:
+			target_maps = self.maps
+		else:
+			target_maps = [self.find_map(l_map) if isinstance(l_map, _string_types) else l_map for l_map in maps]
+
+		old_key = normalize_data_source(old_workspace).rstrip("/")
+		groups = collections.OrderedDict()  # target workspace -> list of (layer, old data source)
+		for l_map in target_maps:
+			for layer in l_map.layers:
+				if not layer.supports("DATASOURCE"):
+					continue
+				data_source = layer.dataSource
+				workspace = _workspace_key(data_source)
+				if _in_workspace(workspace, old_key):
+					suffix = _workspace_suffix(data_source, workspace, old_key)
+					target = new_workspace.rstrip("\\/") + suffix if suffix else new_workspace
+					groups.setdefault(target, []).append((layer, data_source))
+
+		missing_workspaces = []
+		if validate:
+			for target in groups:
+				if not arcpy.Exists(target):
+					log.warning("Not repointing layers to {} because it doesn't exist".format(target))
+					missing_workspaces.append(target)
+
+		moving = [item for target, items in groups.items() if target not in missing_workspaces for item in items]
+		if not moving:
+			return RepointReport([], [], missing_workspaces)
+
+		with metrics.timer("updateConnectionProperties" if PRO else "findAndReplaceWorkspacePaths"):
+			if missing_workspaces:  # some layers have to stay put, so each of the others is repointed on its own
+				for layer, data_source in moving:
+					self._repoint_layer(layer, old_workspace, new_workspace)
+			elif maps is None:
+				if PRO:
+					self.arcgis_pro_project.updateConnectionProperties(old_workspace, new_workspace, validate=False)
+				else:
+					self.map_document.findAndReplaceWorkspacePaths(old_workspace, new_workspace, False)
+			elif PRO:
+				for l_map in target_maps:
+					l_map.map_object.updateConnectionProperties(old_workspace, new_workspace, validate=False)
+			else:  # data frames don't have their own find and replace in ArcMap
+				for layer, data_source in moving:
+					self._repoint_layer(layer, old_workspace, new_workspace)
+
+		changed = []
+		unchanged = []
+		for layer, data_source in moving:
+			layer.refresh()
+			new_source = layer.dataSource
+			if new_source == data_source:
+				unchanged.append(layer)
+			else:
+				changed.append((layer, data_source, new_source))
+				layer._changed()
 
-		return layers
+		self._invalidate_source_index()
+		if changed:
+			self.mark_modified()
+		return RepointReport(changed, unchanged, missing_workspaces)
+
+	@staticmethod
+	def _repoint_layer(layer, old_workspace, new_workspace):
+		if PRO:
+			layer.layer_object.updateConnectionProperties(old_workspace, new_workspace, validate=False)
+		else:
+			layer.layer_object.findAndReplaceWorkspacePath(old_workspace, new_workspace, False)
 
 	@property
 	def active_map(self):
@@ -141,9 +527,9 @@ class Project(object):
 	def default_geodatabase(self):
 		"""
 			Returns the Project's default geodatabase in Pro, and the current workspace (arcpy.env.workspace) in ArcMap.
-			If arcpy.env.workspace is None, creates a GDB in same folder as map document and returns that value, to ensure
-			that this function always returns a usable workspace. If a GDB is created, this function does NOT set arcpy.env.workspace
-			to that, so as not to interfere with other operations. Do that explicitly if that behavior is desired.
+			If arcpy.env.workspace is None, returns amaptor_default_gdb.gdb in the same folder as the map document, creating it
+			the first time, to ensure that this function always returns a usable workspace. This function does NOT set
+			arcpy.env.workspace to that GDB, so as not to interfere with other operations. Do that explicitly if that behavior is desired.
 		:return:
 		"""
 		if PRO:
@@ -153,9 +539,11 @@ class Project(object):
 				return arcpy.env.workspace
 			else:
 				folder_path = os.path.split(self.path)[0]
-				name = "amaptor_default_gdb"
-				arcpy.CreateFileGDB_management(folder_path, name)
-				return os.path.join(folder_path, name)
+				name = "amaptor_default_gdb.gdb"
+				default_gdb = os.path.join(folder_path, name)
+				if not os.path.exists(default_gdb):  # only created once - later accesses reuse it
+					arcpy.CreateFileGDB_management(folder_path, name)
+				return default_gdb
 
 	@default_geodatabase.setter
 	def default_geodatabase(self, value):
@@ -166,6 +554,7 @@ class Project(object):
 		"""
 		if PRO:
 			self.arcgis_pro_project.defaultGeodatabase = value
+			self.mark_modified()
 		else:
 			arcpy.env.workspace = value
 
@@ -175,10 +564,9 @@ class Project(object):
 		:param name: name of map to find.
 		:return: amaptor.Map instance
 		"""
-		for l_map in self.maps:
-			if l_map.name == name:
-				return l_map
-		else:
+		try:
+			return self._get_map_index()[name]
+		except KeyError:
 			raise MapNotFoundError(name)
 
 	def check_map_name(self, name):
@@ -215,14 +603,18 @@ class Project(object):
 		self.check_map_name(name)
 
 		# step 1: import
-		self.primary_document.importDocument(template_map, include_layout=False)
+		with metrics.timer("importDocument"):
+			self.primary_document.importDocument(template_map, include_layout=False)
+		self.mark_modified()
 
 		# step 2: set up for amaptor and rename to match passed value
-		for l_map in self.primary_document.listMaps():
+		for l_map in self.primary_document.listMaps(template_df_name):
 			if l_map.name == template_df_name:
 				l_map.name = name
 				new_map = Map(self, l_map)
 				self.maps.append(new_map)
+				self._get_map_index().setdefault(name, new_map)
+				self._invalidate_source_index()  # a template map can bring layers with it
 				return new_map
 		else:  # if it's not found
 			raise MapNotFoundError(template_df_name, "Map was inserted, but could not be found after insertion. If you provided a custom" \
@@ -247,12 +639,23 @@ class Project(object):
 		:param name: the name of the layout to find.
 		:return: amaptor.Layout instance with given name.
 		"""
-		for layout in self.layouts:
-			if layout.name == name:
-				return layout
-		else:
+		try:
+			return self._get_layout_index()[name]
+		except KeyError:
 			raise LayoutNotFoundError(name)
 
+	def find_elements(self, type=None, name_glob=None):
+		"""
+			PRO ONLY. Layout.find_elements for every layout in the project, using each layout's element index.
+		:param type: see Layout.find_elements
+		:param name_glob: see Layout.find_elements
+		:return: list of arcpy.mp elements, in layout order
+		"""
+		if ARCMAP:
+			raise NotSupportedError("Element actions are not supported in ArcMap")
+
+		return [element for layout in self.layouts for element in layout.find_elements(type=type, name_glob=name_glob)]
+
 	def new_layout(self, name, template_layout=_PRO_BLANK_LAYOUT, template_name="_pro_blank_layout_template"):
 		"""
 			PRO ONLY. Adds a new layout to an ArcGIS Pro Project by importing a saved blank layout. Alternatively,
@@ -271,15 +674,22 @@ class Project(object):
 		if ARCMAP:
 			raise MapNotImplementedError("ArcMap doesn't suppport adding data frames to map documents from Python")
 
+		layout_index = self._get_layout_index()  # loads existing layouts first when lazy so the new one isn't wrapped twice
+
 		# step 1: import
-		self.primary_document.importDocument(template_layout)
+		with metrics.timer("importDocument"):
+			self.primary_document.importDocument(template_layout)
+		self.mark_modified()
 
 		# step 2: set up for amaptor and rename to match passed value
-		for layout in self.primary_document.listLayouts():
+		for layout in self.primary_document.listLayouts(template_name):
 			if layout.name == template_name:
 				layout.name = name
 				new_layout = Layout(layout, self)
 				self.layouts.append(new_layout)
+				layout_index.setdefault(name, new_layout)
+				if self._frame_graph is not None:
+					self._frame_graph.add_layout(new_layout)
 				return new_layout
 		else:
 			raise LayoutNotFoundError("Layout was inserted, but could not be found after insertion. If you provided a custom" \
@@ -312,7 +722,8 @@ class Project(object):
 			Saves the project or map document in place.
 		:return: None
 		"""
-		self.primary_document.save()
+		with metrics.timer("save"):
+			self.primary_document.save()
 
 	def save_a_copy(self, path):
 		"""
@@ -320,7 +731,33 @@ class Project(object):
 		:param path: the new path to save the copy of the document to.
 		:return: None
 		"""
-		self.primary_document.saveACopy(path)
+		with metrics.timer("saveACopy"):
+			self.primary_document.saveACopy(path)
+
+	def iter_export(self, out_path, export_format="pdf", parallel=None, cache=None, **kwargs):
+		"""
+			Exports every layout in the project (the map document, in ArcMap), yielding an ExportResult (path, layout
+			name, seconds, bytes, and whether it came from the cache) as soon as each file is written. Layout names
+			are appended to out_path before the extension, as in Map.export_pdf with layout="ALL". See Map.iter_export
+			for the other options.
+		:param out_path: The full path to export to
+		:param export_format: "pdf" or "png"
+		:param parallel: PRO only. The number of worker processes to export the layouts with
+		:param cache: see Map.export_pdf
+		:param kwargs: export settings, as for Map.export_pdf (or resolution, for Map.export_png)
+		:return: generator of amaptor.classes.map.ExportResult
+		"""
+		kwargs = _export_kwargs(export_format, kwargs)
+		if ARCMAP:
+			for result in self.maps[0].iter_export(out_path, export_format, cache=cache, **kwargs):
+				yield result
+			return
+
+		base_path, file_name = os.path.split(out_path)
+		file_base = os.path.splitext(file_name)[0]
+		exports = [(layout, os.path.join(base_path, "{}_{}.{}".format(file_base, layout.name, export_format))) for layout in self.layouts]
+		for position, result in _iter_layout_exports(self, exports, _EXPORT_FUNCTIONS[export_format][1], kwargs, parallel=parallel, cache=cache):
+			yield result
 
 	def to_package(self, output_file, summary, tags, **kwargs):
 		"""
@@ -338,9 +775,11 @@ class Project(object):
 		self.save()
 
 		if PRO:
-			arcpy.PackageProject_management(self.path, output_file, summary=summary, tags=tags, **kwargs)
+			with metrics.timer("PackageProject"):
+				arcpy.PackageProject_management(self.path, output_file, summary=summary, tags=tags, **kwargs)
 		else:
-			arcpy.PackageMap_management(self.path, output_file, summary=summary, tags=tags)
+			with metrics.timer("PackageMap"):
+				arcpy.PackageMap_management(self.path, output_file, summary=summary, tags=tags)
 
 	def replace_text(self, text, replacement):
 		"""
@@ -354,9 +793,30 @@ class Project(object):
 		:return:
 		"""
 
+		self.render_text({text: replacement})
+
+	def render_text(self, replacements):
+		"""
+			Replaces many placeholders at once in every text element of the map document or project (all layouts in
+			Pro). Each text element is read once, all placeholders are substituted in a single pass, and only elements
+			whose text changed are written back. Much faster than calling replace_text once per placeholder.
+
+			```
+				project.render_text({"{species}": "Chinook Salmon", "{date}": "2017-06-01"})
+			```
+		:param replacements: dictionary of {text_to_find: replacement}
+		:return: the number of text elements that were changed
+		"""
+		render = _text_renderer(replacements)
+		if render is None:
+			return 0
+
 		if ARCMAP:
-			for elm in arcpy.mapping.ListLayoutElements(self.primary_document, "TEXT_ELEMENT"):
-				elm.text = elm.text.replace(text, replacement)
+			with metrics.timer("ListLayoutElements"):
+				elements = arcpy.mapping.ListLayoutElements(self.primary_document, "TEXT_ELEMENT")
+			changed = _render_text_elements(elements, render)
+			if changed:
+				self.mark_modified()
+			return changed
 		else:
-			for layout in self.layouts:  # in pro, iterate through Layout objects instead and replace in all
-				layout.replace_text(text, replacement)
+			return sum(layout._render_text(render) for layout in self.layouts)
@@ -92,6 +92,17 @@ class LayerNotFoundError(ValueError):
 	pass  # for use when looking up layers
 
 
+class ExportError(RuntimeError):
+	"""
+		Raised when exports running in worker processes fail. failures is a dictionary of {output_path: traceback}
+		for each export that failed.
+	"""
+	def __init__(self, failures, **kwargs):
+		self.failures = failures
+		log.error("{} export(s) failed: {}".format(len(failures), ", ".join(failures)))
+		super(ExportError, self).__init__(**kwargs)
+
+
 class EmptyFieldError(ValueError):
 	def __init__(self, field, description, **kwargs):
 		self.description = description
@@ -0,0 +1,313 @@
+"""
+	Extent calculations used when zooming and setting map extents. Extents are handled as NumPy arrays of
+	[XMin, YMin, XMax, YMax] (NumPy comes with arcpy in both ArcMap and ArcGIS Pro), so unions and buffers of many
+	extents are a few array operations instead of a loop over arcpy Extent objects.
+
+	Projecting an extent into another spatial reference (project) is cached, and done directly in NumPy for the common
+	pairs of WGS 1984 geographic coordinates, Web Mercator, and WGS 1984 UTM zones. Other pairs use arcpy's projectAs.
+
+	Layer extents are kept in layer_extent_cache, keyed on the layer's data source, the modification time of the data
+	(using the same rules as the Describe cache), and the spatial reference they were projected to, so zooming to the
+	same layers page after page only reads and projects each layer's extent once.
+"""
+
+import numpy
+import logging
+log = logging.getLogger("amaptor")
+
+import arcpy
+
+from amaptor.version_check import PRO
+from amaptor.errors import NotSupportedError
+from amaptor import cache, metrics
+from amaptor.functions import describe, _describe_key, _data_source_mtime
+
+
+def spatial_reference_key(spatial_reference):
+	"""
+		A hashable value identifying a spatial reference - its factory (WKID) code, or its definition for custom
+		spatial references without one
+	"""
+	if spatial_reference is None:
+		return None
+	code = getattr(spatial_reference, "factoryCode", None)
+	if code:
+		return code
+	try:
+		return spatial_reference.exportToString()
+	except AttributeError:
+		return spatial_reference.name
+
+
+def extent_array(extent):
+	"""
+		Returns the bounds of an arcpy Extent as a NumPy array of [XMin, YMin, XMax, YMax]
+	"""
+	return numpy.array([extent.XMin, extent.YMin, extent.XMax, extent.YMax], dtype=float)
+
+
+def make_extent(values, spatial_reference=None):
+	"""
+		Creates an arcpy Extent from [XMin, YMin, XMax, YMax]
+	"""
+	return arcpy.Extent(float(values[0]), float(values[1]), float(values[2]), float(values[3]), spatial_reference=spatial_reference)
+
+
+def union(extents):
+	"""
+		Returns the extent covering all of the provided extents. Empty extents (all NaN, as Describe reports for empty
+		feature classes) are ignored.
+	:param extents: an array (or list of arrays) of [XMin, YMin, XMax, YMax] rows
+	:return: NumPy array of [XMin, YMin, XMax, YMax]
+	"""
+	extents = numpy.atleast_2d(numpy.asarray(extents, dtype=float))
+	extents = extents[~numpy.isnan(extents).all(axis=1)]
+	if len(extents) == 0:
+		raise ValueError("None of the provided extents have any area to zoom to")
+	return numpy.concatenate((numpy.nanmin(extents[:, :2], axis=0), numpy.nanmax(extents[:, 2:], axis=0)))
+
+
+def buffer(extents, buffer_factor):
+	"""
+		Returns new extents grown on every side by buffer_factor times their width (horizontally) and height
+		(vertically), like Map.set_extent's add_buffer
+	:param extents: array of [XMin, YMin, XMax, YMax], or an array of them as rows
+	:param buffer_factor: fraction of the width and height to add to each side
+	:return: NumPy array of the same shape
+	"""
+	extents = numpy.asarray(extents, dtype=float)
+	sizes = extents[..., 2:] - extents[..., :2]
+	return numpy.concatenate((extents[..., :2] - sizes * buffer_factor, extents[..., 2:] + sizes * buffer_factor), axis=-1)
+
+
+def grow(extents, min_width, min_height=None):
+	"""
+		Returns new extents grown around their centers (never shrunk) to at least min_width wide and min_height tall,
+		so points and other extents with no width or height get a usable size
+	:param extents: array of [XMin, YMin, XMax, YMax], or an array of them as rows
+	:param min_width: the smallest width to return
+	:param min_height: the smallest height to return. Defaults to min_width
+	:return: NumPy array of the same shape
+	"""
+	if min_height is None:
+		min_height = min_width
+	extents = numpy.asarray(extents, dtype=float)
+	centers = (extents[..., :2] + extents[..., 2:]) / 2
+	half_sizes = numpy.maximum(extents[..., 2:] - extents[..., :2], (min_width, min_height)) / 2
+	return numpy.concatenate((centers - half_sizes, centers + half_sizes), axis=-1)
+
+
+
+def fit_aspect(extents, aspect):
+	"""
+		Returns new extents grown around their centers in width or height (never shrunk) so that width / height is
+		aspect, as a map frame of that shape would show them
+	:param extents: array of [XMin, YMin, XMax, YMax], or an array of them as rows
+	:param aspect: width divided by height
+	:return: NumPy array of the same shape
+	"""
+	extents = numpy.asarray(extents, dtype=float)
+	centers = (extents[..., :2] + extents[..., 2:]) / 2
+	widths = extents[..., 2] - extents[..., 0]
+	heights = extents[..., 3] - extents[..., 1]
+	half_sizes = numpy.stack((numpy.maximum(widths, heights * aspect), numpy.maximum(heights, widths / aspect)), axis=-1) / 2
+	return numpy.concatenate((centers - half_sizes, centers + half_sizes), axis=-1)
+
+_WGS84 = 4326
+_WEB_MERCATOR = (3857, 102100, 102113, 900913)
+_SEMI_MAJOR_AXIS = 6378137.0
+_FLATTENING = 1 / 298.257223563
+_E2 = _FLATTENING * (2 - _FLATTENING)  # eccentricity squared
+_EP2 = _E2 / (1 - _E2)
+_UTM_SCALE = 0.9996
+_MERCATOR_MAX_LATITUDE = 85.0511287798
+_EDGE_POINTS = 21  # points along each side of an extent when projecting it, since straight edges bend in UTM
+
+
+def _utm_zone(code):
+	"""
+		Returns (zone, southern hemisphere) for WGS 1984 UTM WKIDs, or None
+	"""
+	if 32601 <= code <= 32660:
+		return code - 32600, False
+	if 32701 <= code <= 32760:
+		return code - 32700, True
+	return None
+
+
+def _has_fast_path(code):
+	return code == _WGS84 or code in _WEB_MERCATOR or (isinstance(code, int) and _utm_zone(code) is not None)
+
+
+def _meridian_distance(latitude):
+	e4 = _E2 * _E2
+	e6 = e4 * _E2
+	return _SEMI_MAJOR_AXIS * ((1 - _E2 / 4 - 3 * e4 / 64 - 5 * e6 / 256) * latitude
+								- (3 * _E2 / 8 + 3 * e4 / 32 + 45 * e6 / 1024) * numpy.sin(2 * latitude)
+								+ (15 * e4 / 256 + 45 * e6 / 1024) * numpy.sin(4 * latitude)
+								- (35 * e6 / 3072) * numpy.sin(6 * latitude))
+
+
+def _utm_forward(longitude, latitude, zone, south):
+	"""
+		Transverse Mercator (Snyder's series) from degrees to UTM meters
+	"""
+	latitude = numpy.radians(latitude)
+	central_meridian = numpy.radians(zone * 6 - 183)
+	n = _SEMI_MAJOR_AXIS / numpy.sqrt(1 - _E2 * numpy.sin(latitude) ** 2)
+	t = numpy.tan(latitude) ** 2
+	c = _EP2 * numpy.cos(latitude) ** 2
+	a = numpy.cos(latitude) * (numpy.radians(longitude) - central_meridian)
+
+	x = _UTM_SCALE * n * (a + (1 - t + c) * a ** 3 / 6 + (5 - 18 * t + t ** 2 + 72 * c - 58 * _EP2) * a ** 5 / 120) + 500000
+	y = _UTM_SCALE * (_meridian_distance(latitude) + n * numpy.tan(latitude) * (
+		a ** 2 / 2 + (5 - t + 9 * c + 4 * c ** 2) * a ** 4 / 24 + (61 - 58 * t + t ** 2 + 600 * c - 330 * _EP2) * a ** 6 / 720))
+	if south:
+		y = y + 10000000
+	return x, y
+
+
+def _utm_inverse(x, y, zone, south):
+	"""
+		UTM meters back to degrees
+	"""
+	if south:
+		y = y - 10000000
+	e4 = _E2 * _E2
+	mu = (y / _UTM_SCALE) / (_SEMI_MAJOR_AXIS * (1 - _E2 / 4 - 3 * e4 / 64 - 5 * e4 * _E2 / 256))
+	e1 = (1 - numpy.sqrt(1 - _E2)) / (1 + numpy.sqrt(1 - _E2))
+	footprint = (mu + (3 * e1 / 2 - 27 * e1 ** 3 / 32) * numpy.sin(2 * mu) + (21 * e1 ** 2 / 16 - 55 * e1 ** 4 / 32) * numpy.sin(4 * mu)
+				+ (151 * e1 ** 3 / 96) * numpy.sin(6 * mu) + (1097 * e1 ** 4 / 512) * numpy.sin(8 * mu))
+
+	sin_footprint = numpy.sin(footprint)
+	n = _SEMI_MAJOR_AXIS / numpy.sqrt(1 - _E2 * sin_footprint ** 2)
+	t = numpy.tan(footprint) ** 2
+	c = _EP2 * numpy.cos(footprint) ** 2
+	r = _SEMI_MAJOR_AXIS * (1 - _E2) / (1 - _E2 * sin_footprint ** 2) ** 1.5
+	d = (x - 500000) / (n * _UTM_SCALE)
+
+	latitude = footprint - (n * numpy.tan(footprint) / r) * (
+		d ** 2 / 2 - (5 + 3 * t + 10 * c - 4 * c ** 2 - 9 * _EP2) * d ** 4 / 24
+		+ (61 + 90 * t + 298 * c + 45 * t ** 2 - 252 * _EP2 - 3 * c ** 2) * d ** 6 / 720)
+	longitude = (d - (1 + 2 * t + c) * d ** 3 / 6 + (5 - 2 * c + 28 * t - 3 * c ** 2 + 8 * _EP2 + 24 * t ** 2) * d ** 5 / 120) / numpy.cos(footprint)
+	return numpy.degrees(longitude) + (zone * 6 - 183), numpy.degrees(latitude)
+
+
+def _to_geographic(x, y, code):
+	if code == _WGS84:
+		return x, y
+	if code in _WEB_MERCATOR:
+		return numpy.degrees(x / _SEMI_MAJOR_AXIS), numpy.degrees(2 * numpy.arctan(numpy.exp(y / _SEMI_MAJOR_AXIS)) - numpy.pi / 2)
+	return _utm_inverse(x, y, *_utm_zone(code))
+
+
+def _from_geographic(longitude, latitude, code):
+	if code == _WGS84:
+		return longitude, latitude
+	if code in _WEB_MERCATOR:
+		latitude = numpy.clip(latitude, -_MERCATOR_MAX_LATITUDE, _MERCATOR_MAX_LATITUDE)
+		return _SEMI_MAJOR_AXIS * numpy.radians(longitude), _SEMI_MAJOR_AXIS * numpy.log(numpy.tan(numpy.pi / 4 + numpy.radians(latitude) / 2))
+	return _utm_forward(longitude, latitude, *_utm_zone(code))
+
+
+def _outline(values):
+	"""
+		Points along the four sides of an extent, as arrays of x and y
+	"""
+	x_min, y_min, x_max, y_max = values
+	steps = numpy.linspace(0, 1, _EDGE_POINTS)
+	xs = numpy.concatenate((x_min + (x_max - x_min) * steps, numpy.full(_EDGE_POINTS, x_max), x_max - (x_max - x_min) * steps, numpy.full(_EDGE_POINTS, x_min)))
+	ys = numpy.concatenate((numpy.full(_EDGE_POINTS, y_min), y_min + (y_max - y_min) * steps, numpy.full(_EDGE_POINTS, y_max), y_max - (y_max - y_min) * steps))
+	return xs, ys
+
+
+def _fast_project(values, source_code, target_code):
+	"""
+		Projects an extent between WGS 1984, Web Mercator, and WGS 1984 UTM zones without arcpy, by projecting points
+		along its outline and taking their bounds. Returns None for other spatial references.
+	"""
+	if not (_has_fast_path(source_code) and _has_fast_path(target_code)):
+		return None
+	longitude, latitude = _to_geographic(*_outline(values), code=source_code)
+	xs, ys = _from_geographic(longitude, latitude, target_code)
+	return numpy.array([xs.min(), ys.min(), xs.max(), ys.max()])
+
+
+_projections = cache.LRUCache(max_size=4096)  # (source key, target key, bounds) -> projected array
+
+
+def project(values, source_spatial_reference, target_spatial_reference):
+	"""
+		Projects an extent into another spatial reference. Results are cached, so the same extent projected into the
+		same spatial reference (as when several map frames or pages share an extent) is only worked out once. Extents
+		without a spatial reference, or already in the target one, are returned unchanged.
+	:param values: array of [XMin, YMin, XMax, YMax]
+	:param source_spatial_reference: the arcpy SpatialReference values are in
+	:param target_spatial_reference: the arcpy SpatialReference to project into
+	:return: read only NumPy array of [XMin, YMin, XMax, YMax]
+	"""
+	source_key = spatial_reference_key(source_spatial_reference)
+	target_key = spatial_reference_key(target_spatial_reference)
+	if source_key is None or target_key is None or source_key == target_key:
+		return values
+
+	cache_key = (source_key, target_key, tuple(float(value) for value in values))
+	projected = _projections.get(cache_key)
+	if projected is None:
+		projected = _fast_project(numpy.asarray(values, dtype=float), source_key, target_key)
+		if projected is None:
+			with metrics.timer("projectAs"):
+				projected = extent_array(make_extent(values, source_spatial_reference).projectAs(target_spatial_reference))
+		projected.flags.writeable = False
+		_projections.put(cache_key, projected)
+	return projected
+
+
+class LayerExtentCache(cache.LRUCache):
+	"""
+		An in-process cache of layer extents. Each entry holds the extent read for a data source and the arrays of it
+		projected into each spatial reference that's been asked for. Data whose modification time can't be found from
+		files (enterprise geodatabases and services) is read every time.
+	"""
+
+	def __init__(self, max_size=4096):
+		super(LayerExtentCache, self).__init__(max_size=max_size)
+
+	def extent(self, layer, spatial_reference=None):
+		"""
+			Returns a layer's extent as a read only array of [XMin, YMin, XMax, YMax], projected into spatial_reference
+		:param layer: an amaptor.Layer or arcpy Layer
+		:param spatial_reference: arcpy SpatialReference to project into, or None for the data's own
+		:return: NumPy array
+		"""
+		layer_object = getattr(layer, "layer_object", layer)
+		if not layer_object.supports("DATASOURCE"):
+			raise NotSupportedError("Layer {} doesn't have a data source to get an extent from".format(layer_object.name))
+
+		data_source = layer_object.dataSource
+		modified = _data_source_mtime(data_source, {})
+		key = (_describe_key(data_source), modified)
+		entry = self.get(key) if modified is not None else None
+		if entry is None:
+			entry = (self._read_extent(layer_object, data_source), {})  # the extent read, and spatial reference key -> array
+			if modified is not None:
+				self.put(key, entry)
+
+		extent, projected = entry
+		projection_key = spatial_reference_key(spatial_reference)
+		values = projected.get(projection_key)
+		if values is None:
+			values = project(extent_array(extent), extent.spatialReference, spatial_reference)
+			values.flags.writeable = False  # shared by everyone zooming to this layer
+			projected[projection_key] = values
+		return values
+
+	@staticmethod
+	def _read_extent(layer_object, data_source):
+		if PRO:
+			return describe(data_source).extent
+		else:
+			return layer_object.getExtent()
+
+
+layer_extent_cache = LayerExtentCache()  # used by Map.zoom_to_layers. Resize with layer_extent_cache.resize(n), or call clear()
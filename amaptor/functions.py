@@ -1,47 +1,73 @@
 import os
-import tempfile
+import re
 import warnings
 
 import arcpy
 
 from amaptor.version_check import log, mp, PRO, mapping
+from amaptor import cache, scratch, metrics
 from amaptor.errors import LayerNotFoundError, NotSupportedError
-from amaptor.constants import _PRO_BLANK_TEMPLATE
+from amaptor.constants import _PRO_BLANK_TEMPLATE, _BLANK_FEATURE_LAYER, _BLANK_RASTER_LAYER
 
 
-def _import_mxd_to_new_pro_project(mxd, blank_pro_template=_PRO_BLANK_TEMPLATE, default_gdb="TEMP"):
+def _import_mxd_to_new_pro_project(mxd, blank_pro_template=_PRO_BLANK_TEMPLATE, default_gdb="TEMP", use_cache=True, owner=None):
 	"""
 		Handles importing an ArcMap Document into an ArcGIS Pro Project. Default Geodatabase is "TEMP" by default, indicating
 		a temporary gdb should be created. It can also be "KEEP" to leave it alone, or it can be a path
+
+		Converted projects are kept in amaptor.cache.conversion_cache (unless use_cache is False or that is set to None),
+		keyed on the content of the MXD, the template, and default_gdb, so converting the same document again is a copy.
+		A project copied from the cache with default_gdb="TEMP" still gets its own new temporary geodatabase.
+
+		The new project and its temporary geodatabase come from amaptor.scratch.pool and are owned by owner, so they
+		are deleted when owner is closed (or garbage collected), or at exit.
 	:param mxd:
 	:param blank_pro_template:
 	:param default_gdb:
+	:param use_cache: whether to look for (and store) the converted project in the conversion cache
+	:param owner: the object (usually the amaptor.Project opening the MXD) that the temporary files belong to
 	:return:
 	"""
 
 	log.warning("WARNING: Importing MXD to new Pro Project - if you call .save() it will not save back to original MXD. Use .save_a_copy('new_path') instead.")
 
 	# can safely assume that if this is called, we're running on Pro and that's already been checked
+	new_temp_project = scratch.pool.acquire_path(".aprx", "pro_project_import", owner=owner)
+
+	conversion_cache = cache.conversion_cache if use_cache else None
+	if conversion_cache is not None:
+		cache_key = conversion_cache.key(mxd, blank_pro_template, default_gdb)
+		if conversion_cache.get(cache_key, new_temp_project):
+			if default_gdb == "TEMP":  # copies can't share a temporary geodatabase, so give this one its own
+				project = mp.ArcGISProject(new_temp_project)
+				project.defaultGeodatabase = scratch.pool.acquire_geodatabase(owner=owner)
+				with metrics.timer("save"):
+					project.save()
+			return new_temp_project
 
 	# copy blank project to new location - template is 1.3+
 	blank_project = mp.ArcGISProject(blank_pro_template)
-	new_temp_project = tempfile.mktemp(".aprx", "pro_project_import")
-	blank_project.saveACopy(new_temp_project)
+	with metrics.timer("saveACopy"):
+		blank_project.saveACopy(new_temp_project)
 	del(blank_project)
 
 	# strictly speaking, we don't need to destroy and recreate - should be able to edit original without saving - doing this just to keep things clear
 	project = mp.ArcGISProject(new_temp_project)
-	project.importDocument(mxd, include_layout=True)
+	with metrics.timer("importDocument"):
+		project.importDocument(mxd, include_layout=True)
 
 	if default_gdb != "KEEP":  # if we're supposed to modify it
 		if default_gdb == "TEMP":
-			new_default_gdb = tempfile.mktemp(prefix="amaptor_default_geodatabase", suffix=".gdb")
-			arcpy.CreateFileGDB_management(os.path.split(new_default_gdb)[0], os.path.split(new_default_gdb)[1])
-			project.defaultGeodatabase = new_default_gdb
+			project.defaultGeodatabase = scratch.pool.acquire_geodatabase(owner=owner)
 		else:  # if it's not KEEP or TEMP it must be a path
 			project.defaultGeodatabase = default_gdb
 
-	project.save()
+	with metrics.timer("save"):
+		project.save()
+	del(project)
+
+	if conversion_cache is not None:
+		conversion_cache.put(cache_key, new_temp_project)
 
 	# return the project path, setup will continue from here
 	return new_temp_project
@@ -64,12 +90,8 @@ def make_layer_with_file_symbology(feature_class, layer_file, layer_name=None):
 	#	warnings.warn("make_layer_with_file_symbology is deprecated in ArcGIS - use Layer objects with a template layer instead", DeprecationWarning)
 
 	layer = None
-	if PRO:
-		layer_file = mp.LayerFile(layer_file)
-		for layer in layer_file.listLayers():  # gets the first layer in the layer file
-			break
-	else:
-		layer = mapping.Layer(layer_file)
+	for layer in open_layer_file(layer_file):  # gets the first layer in the layer file
+		break
 
 	if layer is None:
 		raise LayerNotFoundError("No layer available for copying from layer file")
@@ -79,7 +101,7 @@ def make_layer_with_file_symbology(feature_class, layer_file, layer_name=None):
 	if PRO:
 		layer.dataSource = feature_class
 	else:
-		desc = arcpy.Describe(feature_class)
+		desc = describe(feature_class)
 		if desc.extension and desc.extension != "":  # get the name with extension for replacing the data source
 			name = "{}.{}".format(desc.baseName, desc.extension)
 		else:
@@ -91,6 +113,377 @@ def make_layer_with_file_symbology(feature_class, layer_file, layer_name=None):
 	return layer
 
 
+_WORKSPACE_EXTENSIONS = (".gdb", ".sde", ".mdb")
+
+try:
+	_string_types = basestring  # Python 2 (ArcMap) - unicode values should be left as they are
+except NameError:
+	_string_types = str
+
+
+def normalize_data_source(path):
+	"""
+		Normalizes a data source path so that paths written differently but pointing at the same data compare equal.
+		Case is folded, backslashes become forward slashes, repeated and trailing slashes are removed, and for data
+		inside a geodatabase (.gdb, .sde, .mdb) any feature dataset between the workspace and the dataset is dropped,
+		since dataset names are unique within a geodatabase.
+	:param path: the data source path to normalize
+	:return: normalized path string
+	"""
+	parts = [part for part in path.replace("\\", "/").lower().split("/") if part not in ("", ".")]
+	prefix = "//" if path[:2] in ("\\\\", "//") else ("/" if path[:1] in ("\\", "/") else "")  # keep UNC and root markers
+
+	for index, part in enumerate(parts):
+		if part.endswith(_WORKSPACE_EXTENSIONS) and index < len(parts) - 1:
+			parts = parts[:index + 1] + [parts[-1]]
+			break
+
+	return prefix + "/".join(parts)
+
+
+def _data_source_keys(path):
+	"""
+		Gives the keys a data source should be indexed under - its normalized path and, for enterprise geodatabase
+		data, the normalized path with the database and owner qualification removed from the dataset name, so that
+		"connection.sde/fc" finds "connection.sde/db.owner.fc"
+	:param path: the data source path
+	:return: list of normalized keys
+	"""
+	key = normalize_data_source(path)
+	keys = [key]
+	workspace, dataset = key.rpartition("/")[::2]
+	if workspace.endswith(".sde") and "." in dataset:
+		keys.append("{}/{}".format(workspace, dataset.rpartition(".")[2]))
+	return keys
+
+
+def _text_renderer(replacements):
+	"""
+		Compiles a dictionary of {placeholder: value} into a function that substitutes every placeholder in a string in
+		a single pass. Longer placeholders are matched first so that one placeholder that starts with another still wins.
+	:param replacements: dictionary of text to find and the text to replace it with. Values that aren't strings are
+		converted with str().
+	:return: function taking a string and returning the rendered string, or None if there's nothing to replace
+	"""
+	values = dict((text, value if isinstance(value, _string_types) else str(value)) for text, value in replacements.items() if text)
+	if not values:
+		return None
+
+	pattern = re.compile("|".join(re.escape(text) for text in sorted(values, key=len, reverse=True)))
+
+	def render(text):
+		return pattern.sub(lambda match: values[match.group(0)], text)
+
+	return render
+
+
+def _render_text_elements(elements, render):
+	"""
+		Applies a function from _text_renderer to the text of each element, writing the text back only for the
+		elements where it changed, since every read and write is a call into arcpy.
+	:param elements: iterable of arcpy text elements (arcpy.mapping or arcpy.mp)
+	:param render: function from _text_renderer
+	:return: the number of elements whose text was changed
+	"""
+	changed = 0
+	for elm in elements:
+		text = elm.text
+		new_text = render(text)
+		if new_text != text:
+			elm.text = new_text
+			changed += 1
+	return changed
+
+
+def _resolve_export_cache(cache_option):
+	"""
+		Turns the cache argument of the export functions into an ExportCache or None - True means the shared
+		amaptor.cache.export_cache
+	"""
+	if cache_option is True:
+		return cache.export_cache
+	return cache_option or None
+
+
+def _export_with_cache(cache_option, fingerprint, out_path, export):
+	"""
+		Runs an export unless a cached copy of the same export can be used instead.
+	:param cache_option: the cache argument given to the export function - None, False, True, or an ExportCache
+	:param fingerprint: function returning the export's fingerprint (or None if it can't be cached). Only called
+		when a cache is in use
+	:param out_path: the path export writes to
+	:param export: function that writes the export to out_path
+	:return: True if the output came from the cache, False if it was exported
+	"""
+	export_cache = _resolve_export_cache(cache_option)
+	if export_cache is None:
+		export()
+		return False
+
+	key = export_cache.key(fingerprint())
+	if key is not None and export_cache.get(key, out_path):
+		log.debug("Used cached export for {}".format(out_path))
+		return True
+
+	cache.release_output(out_path)
+	export()
+	if key is not None:
+		export_cache.put(key, out_path)
+	return False
+
+
+_ELEMENT_FINGERPRINT_ATTRIBUTES = ("name", "type", "visible", "text", "elementPositionX", "elementPositionY", "elementWidth", "elementHeight")
+_SHAPEFILE_PARTS = (".dbf", ".shx", ".prj")
+# files in a file geodatabase that are rewritten when anything in it changes - timestamps on every edit, and the gdb
+# file and the catalog tables (a00000001 and a00000004) when datasets are added, removed, or altered
+_GEODATABASE_SYSTEM_FILES = ("timestamps", "gdb", "a00000001.gdbtable", "a00000004.gdbtable")
+
+
+def _element_fingerprint(element):
+	"""
+		The values of a layout element that change how it's drawn, for export fingerprints
+	"""
+	return tuple(getattr(element, attribute, None) for attribute in _ELEMENT_FINGERPRINT_ATTRIBUTES)
+
+
+def _data_source_mtime(path, source_times):
+	"""
+		Returns the latest modification time of the files behind a data source, or None when it can't be known from
+		files (enterprise geodatabases and services). Data inside a file geodatabase uses the geodatabase's system
+		files, which are rewritten on every edit, so that a lookup is a few stats no matter how many tables the
+		geodatabase holds. Other folders use the files in them.
+	:param path: the data source path
+	:param source_times: dictionary of results already looked up, shared across one fingerprint
+	:return: float timestamp or None
+	"""
+	normalized = normalize_data_source(path)
+	if ".sde/" in normalized + "/" or "://" in normalized:
+		return None
+
+	existing = path
+	while existing and not os.path.exists(existing):  # walk up from the dataset to the workspace
+		parent = os.path.dirname(existing)
+		existing = parent if parent != existing else None
+	if not existing:
+		return None
+
+	if existing not in source_times:
+		if existing.lower().rstrip("\\/").endswith(".gdb"):
+			files = [os.path.join(existing, file_name) for file_name in _GEODATABASE_SYSTEM_FILES]
+		elif os.path.isdir(existing):
+			files = [os.path.join(existing, file_name) for file_name in os.listdir(existing)]
+		else:
+			stem = os.path.splitext(existing)[0]
+			files = [stem + extension for extension in _SHAPEFILE_PARTS]
+		source_times[existing] = max([os.path.getmtime(existing)] + [os.path.getmtime(file_path) for file_path in files if os.path.exists(file_path)])
+	return source_times[existing]
+
+
+_cim_version = None  # the CIM version Layer.getDefinition takes in this install of Pro, found on first use
+
+
+def _get_cim_version():
+	global _cim_version
+	if _cim_version is None:
+		_cim_version = "V2" if str(arcpy.GetInstallInfo().get("Version", "")).startswith("2.") else "V3"
+	return _cim_version
+
+
+def _cim_values(value):
+	"""
+		Flattens a CIM object from getDefinition into nested tuples of its attribute values, so two definitions compare
+		(and repr) the same when they describe the same layer
+	"""
+	if isinstance(value, (list, tuple)):
+		return tuple(_cim_values(item) for item in value)
+	if isinstance(value, dict):
+		return tuple((key, _cim_values(item)) for key, item in sorted(value.items()))
+	if hasattr(value, "__dict__"):
+		return (type(value).__name__,) + tuple((key, _cim_values(item)) for key, item in sorted(vars(value).items()))
+	return value
+
+
+def _layer_fingerprint(layer_object, source_times):
+	"""
+		The values of a layer that change how it's drawn, including when its data last changed, for export
+		fingerprints. In Pro, this includes the layer's CIM definition, which covers its symbology, labels, and
+		everything else about how it draws, however it was changed. ArcMap has no way to read symbology in full, so
+		only its symbology type is included - see Project._symbology_changed.
+	:param layer_object: arcpy.mp or arcpy.mapping Layer
+	:param source_times: see _data_source_mtime
+	:return: tuple, or None if the layer's data can't be fingerprinted
+	"""
+	values = [layer_object.longName, layer_object.visible]
+	if layer_object.supports("TRANSPARENCY"):
+		values.append(layer_object.transparency)
+	if PRO:
+		if hasattr(layer_object, "getDefinition"):  # Pro 2.4 and later
+			values.append(_cim_values(layer_object.getDefinition(_get_cim_version())))
+	elif layer_object.supports("SYMBOLOGYTYPE"):
+		values.append(layer_object.symbologyType)
+	if layer_object.supports("DATASOURCE"):
+		data_source = layer_object.dataSource
+		modified = _data_source_mtime(data_source, source_times)
+		if modified is None:
+			return None
+		values.extend((data_source, modified))
+	if layer_object.supports("DEFINITIONQUERY"):
+		values.append(layer_object.definitionQuery)
+	return tuple(values)
+
+
+def _extent_fingerprint(extent):
+	return extent.XMin, extent.YMin, extent.XMax, extent.YMax, getattr(extent.spatialReference, "factoryCode", None)
+
+
+def _describe_key(path):
+	"""
+		Normalizes a path for the Describe cache. Unlike normalize_data_source, feature datasets are kept, since
+		Describe reports a different path for data inside one.
+	"""
+	return os.path.normpath(path).replace("\\", "/").lower()
+
+
+class DescribeCache(cache.LRUCache):
+	"""
+		An in-process cache of arcpy.Describe results, keyed on the normalized path. A cached result is only reused
+		while the modification time of the files behind the data is unchanged (see the export cache for how that's
+		found), so edited data is described again. Data whose changes can't be seen in files - enterprise geodatabases
+		and services - isn't cached. The workspace type information get_workspace_type needs is also kept for each
+		workspace, since every dataset in a geodatabase shares it.
+
+		Cached Describe objects are shared between callers, so treat them as read only - copy an extent before changing it.
+	"""
+
+	def __init__(self, max_size=1024):
+		super(DescribeCache, self).__init__(max_size=max_size)
+		self._workspaces = cache.LRUCache(max_size=max_size)  # (normalized workspace path, mtime) -> (workspaceFactoryProgID, workspaceType)
+
+	def describe(self, path):
+		"""
+			Returns arcpy.Describe(path), from the cache when the data hasn't changed since it was cached
+		:param path: path to a dataset, workspace, or layer file
+		:return: arcpy Describe object
+		"""
+		modified = _data_source_mtime(path, {})
+		key = (_describe_key(path), modified)  # results from before the data changed are never looked up again, and age out
+		if modified is not None:
+			description = self.get(key)
+			if description is not None:
+				return description
+
+		with metrics.timer("Describe"):
+			description = arcpy.Describe(path)
+		if modified is not None:
+			self.put(key, description)
+		return description
+
+	def workspace_info(self, workspace):
+		"""
+			Returns (workspaceFactoryProgID, workspaceType) for a workspace, describing it only the first time (and again
+			if the workspace is replaced)
+		"""
+		key = (_describe_key(workspace), _data_source_mtime(workspace, {}))
+		info = self._workspaces.get(key)
+		if info is None:
+			description = self.describe(workspace)
+			info = (description.workspaceFactoryProgID, description.workspaceType)
+			self._workspaces.put(key, info)
+		return info
+
+	def clear(self):
+		with self._lock:
+			super(DescribeCache, self).clear()
+			self._workspaces.clear()
+
+
+describe_cache = DescribeCache()  # shared by amaptor's Describe calls. Resize with describe_cache.resize(n), or call clear()
+
+
+def describe(path):
+	"""
+		arcpy.Describe, through amaptor's shared Describe cache - see DescribeCache
+	:param path: path to describe
+	:return: arcpy Describe object, which shouldn't be modified
+	"""
+	return describe_cache.describe(path)
+
+
+def open_layer_file(path):
+	"""
+		Reads the layers in a layer file from disk. Each call returns new layers that can be changed without affecting
+		any others - see LayerFileCache for read only uses.
+	:param path: path to a .lyr or .lyrx file
+	:return: list of arcpy.mp or arcpy.mapping Layer objects
+	"""
+	with metrics.timer("LayerFile"):
+		if PRO:
+			return mp.LayerFile(path).listLayers()
+		else:
+			return [mapping.Layer(path)]
+
+
+class LayerFileCache(cache.LRUCache):
+	"""
+		An in-process cache of the layers read from layer files used as symbology templates, keyed on the normalized
+		path and the file's modification time, so a layer file is only parsed again after it changes.
+
+		The cached layers are shared and must only be read from (as when copying their symbology onto other layers).
+		arcpy layers can't be copied - copy.copy gives another Python object wrapping the same underlying layer - so
+		code that changes a layer from a layer file, such as setting its data source or name, opens the file with
+		open_layer_file instead. Adding a template to a map adds a copy of it, which is how Map.add_layers_from_sources
+		builds many layers from one read of a template.
+	"""
+
+	def __init__(self, max_size=64, preload=()):
+		"""
+		:param max_size: the number of layer files to keep
+		:param preload: layer file paths to read the first time the cache is used, such as amaptor's blank templates
+		"""
+		super(LayerFileCache, self).__init__(max_size=max_size)
+		self._preload = list(preload)
+
+	def preload(self, paths):
+		"""
+			Reads the layer files at paths into the cache, skipping any that don't exist
+		"""
+		for path in paths:
+			if os.path.exists(path):
+				self.templates(path)
+
+	def templates(self, path):
+		"""
+			Returns the layers in the layer file at path, reading it only if it isn't cached or changed on disk. The
+			layers must not be changed.
+		:param path: path to a .lyr or .lyrx file
+		:return: list of arcpy.mp or arcpy.mapping Layer objects
+		"""
+		if self._preload:
+			preload, self._preload = self._preload, []
+			self.preload(preload)
+
+		if not os.path.exists(path):
+			return open_layer_file(path)  # let arcpy report a missing file in its usual way
+
+		key = (_describe_key(path), os.path.getmtime(path))
+		templates = self.get(key)
+		if templates is None:
+			templates = open_layer_file(path)
+			self.put(key, templates)
+		return templates
+
+
+layer_file_cache = LayerFileCache(preload=(_BLANK_FEATURE_LAYER, _BLANK_RASTER_LAYER))  # templates read by Layer.symbology, Map.apply_symbology, and Map.add_layers_from_sources
+
+
+def _copy_extent(extent):
+	"""
+		Returns a new arcpy Extent with the same bounds and spatial reference, so it can be changed without affecting
+		the original (which may be shared through the Describe cache)
+	"""
+	return arcpy.Extent(extent.XMin, extent.YMin, extent.XMax, extent.YMax, spatial_reference=extent.spatialReference)
+
+
 def reproject_extent(extent, current_extent):
 	"""
 		Changes an extent from its current spatial reference to the spatial reference on another extent object
@@ -161,14 +554,13 @@ def get_workspace_type(dataset_path, factory_type=False):
 		}
 	}
 
-	dataset_desc = arcpy.Describe(dataset_path)
-	workspace = dataset_desc.path
-	workspace_desc = arcpy.Describe(workspace)
+	dataset_desc = describe(dataset_path)
+	workspace_factory_prog_id, workspace_type = describe_cache.workspace_info(dataset_desc.path)
 
-	factory_prog_key = workspace_desc.workspaceFactoryProgID.replace(".1", "")
+	factory_prog_key = workspace_factory_prog_id.replace(".1", "")
 	if factory_prog_key in prog_id_mapping:  # if we have the specific name for it here, return that first
 		return prog_id_mapping[factory_prog_key][attr]
-	elif workspace_desc.workspaceType == "FileSystem":
+	elif workspace_type == "FileSystem":
 		if dataset_desc.extension == "shp":
 			return type_mapping["SHAPEFILE"][attr]
 		elif dataset_desc.extension in ("xls", "xlsx"):
@@ -179,7 +571,7 @@ def get_workspace_type(dataset_path, factory_type=False):
 			return type_mapping["RASTER"][attr]
 	elif dataset_desc.dataType == "Tin":
 		return type_mapping["TIN"][attr]
-	elif workspace_desc.workspaceFactoryProgID == "":
+	elif workspace_factory_prog_id == "":
 		return type_mapping["SHAPEFILE"][attr]  # if we get to here without returning, it's likely a shapefile - there are a few items missing from this conditional - CAD, VPF, etc
 
 
@@ -0,0 +1,282 @@
+"""
+	Call counts and latencies for the arcpy calls amaptor makes - Describe, listing layers and elements, importing
+	documents, exports, saves, and packaging - so it's possible to see where time goes. Recording is on by default and
+	only costs a timer read and a dictionary update per call. Turn it off with amaptor.metrics.registry.enabled = False.
+
+	```
+		amaptor.metrics.write_json("/var/log/amaptor")  # writes /var/log/amaptor/amaptor_<pid>.json
+		amaptor.metrics.write_prometheus("/var/lib/node_exporter/textfile")  # for the node_exporter textfile collector
+	```
+
+	Code using amaptor can record its own operations through the same registry:
+
+	```
+		with amaptor.metrics.timer("render_page"):
+			...
+		amaptor.metrics.increment("pages_rendered")
+	```
+"""
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from timeit import default_timer
+import logging
+log = logging.getLogger("amaptor")
+
+DEFAULT_BUCKETS = (.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120)  # seconds
+
+
+class Histogram(object):
+	"""
+		Counts observations into fixed buckets, Prometheus style - counts[i] is the number of observations no larger
+		than buckets[i] and larger than the bucket before it. Observations larger than the last bucket only count
+		towards count and total.
+	"""
+	__slots__ = ("buckets", "counts", "count", "total")
+
+	def __init__(self, buckets=DEFAULT_BUCKETS):
+		self.buckets = buckets
+		self.counts = [0] * len(buckets)
+		self.count = 0
+		self.total = 0.0
+
+	def observe(self, value):
+		self.count += 1
+		self.total += value
+		index = bisect.bisect_left(self.buckets, value)
+		if index < len(self.counts):
+			self.counts[index] += 1
+
+	def cumulative(self):
+		"""
+			Returns a list of (upper_bound, count of observations no larger than upper_bound), ending with ("+Inf", count)
+		"""
+		running = 0
+		buckets = []
+		for upper_bound, count in zip(self.buckets, self.counts):
+			running += count
+			buckets.append((upper_bound, running))
+		buckets.append(("+Inf", self.count))
+		return buckets
+
+
+class _Timer(object):
+	__slots__ = ("registry", "operation", "start")
+
+	def __init__(self, registry, operation):
+		self.registry = registry
+		self.operation = operation
+
+	def __enter__(self):
+		self.start = default_timer()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.registry.observe(self.operation, default_timer() - self.start, error=exc_type is not None)
+		return False
+
+
+class _NullTimer(object):
+	__slots__ = ()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _escape(value):
+	return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+	if not labels:
+		return ""
+	return "{" + ",".join('{}="{}"'.format(name, _escape(value)) for name, value in labels) + "}"
+
+
+def _write_atomically(path, text):
+	"""
+		Writes text to a temporary file next to path and moves it into place, so readers (like the node_exporter
+		textfile collector) never see a partly written file
+	"""
+	directory = os.path.dirname(os.path.abspath(path))
+	handle, temporary_path = tempfile.mkstemp(prefix=".amaptor_metrics", dir=directory)
+	with os.fdopen(handle, "w") as temporary_file:
+		temporary_file.write(text)
+	try:
+		os.rename(temporary_path, path)
+	except OSError:  # Windows won't rename over an existing file
+		os.remove(path)
+		os.rename(temporary_path, path)
+
+
+def _output_path(path, extension):
+	if os.path.isdir(path):
+		return os.path.join(path, "amaptor_{}{}".format(os.getpid(), extension))
+	return path
+
+
+class Registry(object):
+	"""
+		Holds the metrics for this process - a call count, error count, and latency histogram per operation, plus
+		any counters recorded with increment. Thread safe.
+	"""
+
+	def __init__(self, buckets=DEFAULT_BUCKETS):
+		"""
+		:param buckets: the upper bounds, in seconds, of the latency histogram buckets
+		"""
+		self.enabled = True
+		self.buckets = tuple(buckets)
+		self._operations = {}  # operation -> Histogram
+		self._errors = {}  # operation -> count
+		self._counters = {}  # (name, sorted label items) -> value
+		self._lock = threading.Lock()
+
+	def timer(self, operation):
+		"""
+			Returns a context manager that records how long its block takes under operation, and counts an error if
+			the block raises
+		"""
+		if not self.enabled:
+			return _NULL_TIMER
+		return _Timer(self, operation)
+
+	def timed(self, operation):
+		"""
+			Decorator version of timer
+		"""
+		def decorator(function):
+			def wrapper(*args, **kwargs):
+				with self.timer(operation):
+					return function(*args, **kwargs)
+			wrapper.__name__ = function.__name__
+			wrapper.__doc__ = function.__doc__
+			return wrapper
+		return decorator
+
+	def observe(self, operation, seconds, error=False):
+		"""
+			Records one call of operation that took seconds
+		"""
+		with self._lock:
+			histogram = self._operations.get(operation)
+			if histogram is None:
+				histogram = self._operations[operation] = Histogram(self.buckets)
+			histogram.observe(seconds)
+			if error:
+				self._errors[operation] = self._errors.get(operation, 0) + 1
+
+	def increment(self, name, value=1, **labels):
+		"""
+			Adds value to the counter name with the given labels
+		"""
+		if not self.enabled:
+			return
+		key = (name, tuple(sorted(labels.items())))
+		with self._lock:
+			self._counters[key] = self._counters.get(key, 0) + value
+
+	def reset(self):
+		with self._lock:
+			self._operations = {}
+			self._errors = {}
+			self._counters = {}
+
+	def snapshot(self):
+		"""
+			Returns all metrics as a dictionary that can be serialized to JSON
+		:return: {"pid": ..., "time": ..., "operations": {operation: {"calls", "errors", "seconds", "buckets"}}, "counters": [...]}
+		"""
+		with self._lock:
+			operations = dict((operation, {
+				"calls": histogram.count,
+				"errors": self._errors.get(operation, 0),
+				"seconds": histogram.total,
+				"buckets": [[str(upper_bound), count] for upper_bound, count in histogram.cumulative()],
+			}) for operation, histogram in self._operations.items())
+			counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(self._counters.items())]
+		return {"pid": os.getpid(), "time": time.time(), "operations": operations, "counters": counters}
+
+	def prometheus_text(self):
+		"""
+			Returns all metrics in the Prometheus text exposition format. Operations are reported as
+			amaptor_arcpy_calls_total, amaptor_arcpy_errors_total, and the amaptor_arcpy_call_seconds histogram, each
+			labeled with the operation and the process ID. Counters are reported as amaptor_<name>_total.
+		"""
+		pid = ("pid", os.getpid())
+		snapshot = self.snapshot()
+		operations = sorted(snapshot["operations"].items())
+
+		lines = ["# HELP amaptor_arcpy_calls_total Calls into arcpy made by amaptor", "# TYPE amaptor_arcpy_calls_total counter"]
+		lines.extend("amaptor_arcpy_calls_total{} {}".format(_format_labels((("operation", operation), pid)), values["calls"]) for operation, values in operations)
+		lines.extend(["# HELP amaptor_arcpy_errors_total Calls into arcpy that raised an exception", "# TYPE amaptor_arcpy_errors_total counter"])
+		lines.extend("amaptor_arcpy_errors_total{} {}".format(_format_labels((("operation", operation), pid)), values["errors"]) for operation, values in operations)
+		lines.extend(["# HELP amaptor_arcpy_call_seconds Time spent in calls into arcpy", "# TYPE amaptor_arcpy_call_seconds histogram"])
+		for operation, values in operations:
+			for upper_bound, count in values["buckets"]:
+				lines.append("amaptor_arcpy_call_seconds_bucket{} {}".format(_format_labels((("operation", operation), pid, ("le", upper_bound))), count))
+			lines.append("amaptor_arcpy_call_seconds_sum{} {}".format(_format_labels((("operation", operation), pid)), repr(values["seconds"])))
+			lines.append("amaptor_arcpy_call_seconds_count{} {}".format(_format_labels((("operation", operation), pid)), values["calls"]))
+
+		counter_names = []
+		for counter in snapshot["counters"]:
+			metric = "amaptor_{}_total".format(counter["name"])
+			if metric not in counter_names:
+				counter_names.append(metric)
+				lines.append("# TYPE {} counter".format(metric))
+			lines.append("{}{} {}".format(metric, _format_labels(sorted(counter["labels"].items()) + [pid]), counter["value"]))
+
+		return "\n".join(lines) + "\n"
+
+	def write_prometheus(self, path):
+		"""
+			Writes prometheus_text to path. If path is a folder, writes amaptor_<pid>.prom in it, so each process has its
+			own file. The file is replaced atomically.
+		:return: the path written
+		"""
+		path = _output_path(path, ".prom")
+		_write_atomically(path, self.prometheus_text())
+		return path
+
+	def write_json(self, path):
+		"""
+			Writes snapshot as JSON to path. If path is a folder, writes amaptor_<pid>.json in it. The file is replaced
+			atomically.
+		:return: the path written
+		"""
+		path = _output_path(path, ".json")
+		_write_atomically(path, json.dumps(self.snapshot(), indent=2, sort_keys=True))
+		return path
+
+
+registry = Registry()
+
+
+def timer(operation):
+	return registry.timer(operation)
+
+
+def increment(name, value=1, **labels):
+	registry.increment(name, value, **labels)
+
+
+def snapshot():
+	return registry.snapshot()
+
+
+def write_prometheus(path):
+	return registry.write_prometheus(path)
+
+
+def write_json(path):
+	return registry.write_json(path)
@@ -0,0 +1,210 @@
+"""
+	An opt-in, in-process cache of opened ArcGIS Pro Projects and Map Documents, for code that opens the same templates
+	over and over. Use it through amaptor.open_project:
+
+	```
+		with amaptor.open_project(template_path, cache=True) as project:
+			project.render_text({"{title}": "My Map"})
+			project.maps[0].export_pdf(output_path)
+	```
+
+	Opened documents can only be used by one caller at a time, so a cached document is handed to a single Project and
+	comes back to the cache when that Project is closed - but only if nothing changed it (see Project.mark_modified).
+	Changed documents are released instead, so the next caller always gets the template as it is on disk. Calling save()
+	on a cached project never writes to the template - it saves a temporary copy and the project continues from the copy.
+
+	Only changes made through amaptor are noticed. The raw arcpy objects amaptor hands out (Map.map_object,
+	Layer.layer_object, MapFrame._map_frame_object, and the elements from Layout.find_element, find_elements, and
+	elements) aren't tracked, so code that changes the document through them must call project.mark_modified() before
+	closing the project, or the changed document goes back into the cache and the next caller gets it.
+"""
+
+import os
+import logging
+log = logging.getLogger("amaptor")
+
+from amaptor import scratch, metrics
+from amaptor.cache import LRUCache
+from amaptor.classes.project import Project
+
+
+class _CachedDocument(object):
+	"""
+		What the cache stores for a template - the opened document along with the amaptor objects built on top of it,
+		so that the next Project using it doesn't have to rebuild them.
+	"""
+	def __init__(self, document_path, document):
+		self.document_path = document_path  # the path actually opened - differs from the template when an MXD was converted for Pro
+		self.document = document
+		self.maps = None
+		self.layouts = None
+		self.map_index = None
+		self.layout_index = None
+		self.source_index = None
+		self.frame_graph = None
+
+
+class CachedProject(Project):
+	"""
+		A Project whose document is borrowed from a ProjectCache. Behaves like any other Project, except that save()
+		writes a copy instead of overwriting the template and close() gives the document back to the cache when it is
+		unmodified. Create these with amaptor.open_project or ProjectCache.open rather than directly.
+	"""
+
+	def __init__(self, path, cache, key, cached_document=None, lazy=False):
+		self._cache = cache
+		self._cache_key = key
+		self._cached_document = cached_document
+		self.template_path = path
+		self.detached = False  # becomes True once the project is saved to a copy and no longer matches the template
+
+		if cached_document is None:
+			super(CachedProject, self).__init__(path, lazy=lazy)
+		else:
+			super(CachedProject, self).__init__(cached_document.document_path, lazy=True)  # maps and layouts come from the cache
+			scratch.pool.transfer(cached_document, self)  # a converted MXD's scratch files now belong to this project
+			self.lazy = lazy
+			if lazy or (cached_document.maps is not None and cached_document.layouts is not None):
+				self._adopt(cached_document)
+			else:  # the last user didn't build everything, and this one wants it all up front
+				self._build_graph()
+
+	def _open_document(self):
+		if self._cached_document is not None:
+			return self._cached_document.document
+		return super(CachedProject, self)._open_document()
+
+	def _adopt(self, cached_document):
+		"""
+			Takes over the maps and layouts that the last user of this document built, pointing them at this project.
+			Anything the last user didn't build is left to be built on first access.
+		"""
+		if cached_document.maps is not None:
+			self._maps = cached_document.maps
+			self._map_index = cached_document.map_index
+			self._source_index = cached_document.source_index
+			for l_map in self._maps:
+				l_map.project = self
+		if cached_document.layouts is not None:
+			self._layouts = cached_document.layouts
+			self._layout_index = cached_document.layout_index
+			for layout in self._layouts:
+				layout.project = self
+		if cached_document.maps is not None and cached_document.layouts is not None:
+			self._frame_graph = cached_document.frame_graph
+
+	def save(self):
+		"""
+			Copy-on-save - the template this project was opened from is never overwritten. The first save writes a copy
+			of the project to amaptor's scratch folder and the project's path is changed to point at that copy. Later
+			saves update the copy. The copy is temporary - it's deleted when the project is closed - so use save_a_copy
+			to keep a saved project.
+		:return: None
+		"""
+		if not self.detached:
+			extension = os.path.splitext(self.path)[1]
+			self.path = scratch.pool.acquire_path(extension, "amaptor_cached_project", owner=self)
+			log.warning("Project was opened from the project cache, so it is being saved to a copy at {} instead of over the template".format(self.path))
+			self.detached = True
+			self.mark_modified()
+
+		with metrics.timer("saveACopy"):
+			self.primary_document.saveACopy(self.path)
+
+	def close(self):
+		"""
+			Returns the document to the cache if it wasn't modified, then closes the project. See Project.close
+		:return: None
+		"""
+		if self.primary_document is not None:
+			if self.modified or self.detached:
+				log.debug("Not returning modified project {} to the project cache".format(self.template_path))
+			else:
+				cached_document = _CachedDocument(self.path, self.primary_document)
+				cached_document.maps = self._maps
+				cached_document.layouts = self._layouts
+				cached_document.map_index = self._map_index
+				cached_document.layout_index = self._layout_index
+				cached_document.source_index = self._source_index
+				cached_document.frame_graph = self._frame_graph
+				scratch.pool.transfer(self, cached_document)  # keeps a converted MXD's scratch files while it waits in the cache
+				self._cache._return(self._cache_key, cached_document)
+
+		self._cached_document = None
+		super(CachedProject, self).close()
+
+
+def _release_document(key, cached_document):
+	"""
+		Drops the cache's references to an evicted document so that arcpy can release it (and its file locks)
+	"""
+	log.debug("Releasing cached project {}".format(key[0]))
+	cached_document.maps = None
+	cached_document.layouts = None
+	cached_document.frame_graph = None
+	cached_document.document = None
+	scratch.pool.release_owner(cached_document)
+
+
+class ProjectCache(LRUCache):
+	"""
+		A least recently used cache of opened project documents, keyed on the template's path, modification time, and
+		size, so a template that changes on disk is reopened. Holds at most max_size idle documents - evicted documents
+		are released. hits and misses count how many opens reused a cached document.
+	"""
+
+	def __init__(self, max_size=8):
+		super(ProjectCache, self).__init__(max_size=max_size, on_evict=_release_document)
+
+	@staticmethod
+	def _key(path):
+		if path == "CURRENT":
+			raise ValueError("The CURRENT project can't be cached - open it with amaptor.Project instead")
+		stats = os.stat(path)
+		return os.path.normcase(os.path.abspath(path)), stats.st_mtime, stats.st_size
+
+	def open(self, path, lazy=False):
+		"""
+			Returns a CachedProject for path, reusing an idle cached document if there is one.
+		:param path: path to an ArcGIS Pro Project or an ArcMap Document (or an MXD to be converted, in Pro)
+		:param lazy: passed through to Project - see Project's documentation
+		:return: CachedProject
+		"""
+		key = self._key(path)
+		return CachedProject(path, cache=self, key=key, cached_document=self.take(key), lazy=lazy)
+
+	def _return(self, key, cached_document):
+		"""
+			Called when a CachedProject is closed with an unmodified document. If another document for the same
+			template is already waiting in the cache, this one is released instead.
+		"""
+		with self._lock:
+			if key in self:
+				_release_document(key, cached_document)
+			else:
+				self.put(key, cached_document)
+
+
+project_cache = ProjectCache()  # the cache used by open_project(..., cache=True). Resize with project_cache.resize(n)
+
+
+def open_project(path, cache=False, lazy=False):
+	"""
+		Opens a project. With cache=False, this is the same as amaptor.Project(path). With cache=True, the document is
+		taken from the shared amaptor.project_cache.project_cache when possible (a ProjectCache instance can also be
+		passed to use a different cache) - close the project when done with it (or use it as a context manager) so that
+		the document can be reused. See amaptor.project_cache for the rules about changes to cached projects - in
+		particular, changes made directly through arcpy objects aren't noticed, so call mark_modified on the project
+		after making them.
+	:param path: path to an ArcGIS Pro Project or ArcMap Document
+	:param cache: False, True, or a ProjectCache instance
+	:param lazy: passed through to Project - see Project's documentation
+	:return: amaptor.Project (a CachedProject when cached)
+	"""
+	if cache is False or cache is None:
+		return Project(path, lazy=lazy)
+
+	if cache is True:
+		cache = project_cache
+
+	return cache.open(path, lazy=lazy)
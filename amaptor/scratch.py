@@ -0,0 +1,230 @@
+"""
+	Manages the temporary files amaptor creates - the Pro Projects that MXDs are converted into and the temporary
+	default geodatabases given to them. Everything lives in one scratch folder per process. Each item is tracked
+	against the object that owns it (usually a Project), and is reclaimed when the owner is closed or garbage collected,
+	or when the interpreter exits. Released geodatabases that are still empty are kept and handed out again instead of
+	creating new ones.
+
+	```
+		amaptor.scratch.pool.prefill(4)  # create a few geodatabases up front, before a batch starts
+		print(amaptor.scratch.stats())  # {"live": 2, "idle": 3, "created": 5, "reused": 12, "removed": 1}
+	```
+"""
+
+import atexit
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+import logging
+log = logging.getLogger("amaptor")
+
+import arcpy
+
+_SYSTEM_TABLE = re.compile(r"^a([0-9a-f]{8})\.", re.IGNORECASE)
+_LAST_SYSTEM_TABLE_ID = 8  # new file geodatabases only contain system tables a00000001 through a00000008
+
+
+def _geodatabase_is_empty(path):
+	"""
+		Checks whether a file geodatabase contains only the system tables a new one starts with, by looking at its
+		files instead of calling into arcpy. Any user table or feature class adds a table with a higher ID.
+	"""
+	try:
+		file_names = os.listdir(path)
+	except OSError:
+		return False
+
+	for file_name in file_names:
+		match = _SYSTEM_TABLE.match(file_name)
+		if match and int(match.group(1), 16) > _LAST_SYSTEM_TABLE_ID:
+			return False
+	return True
+
+
+class ScratchPool(object):
+	"""
+		Hands out temporary file geodatabases and file paths in a per-process scratch folder and tracks who owns them.
+		Owners are held weakly, so items belonging to an owner that has been garbage collected are reclaimed on the
+		next acquire. Up to max_idle released, still empty geodatabases are kept for reuse - the rest are deleted.
+	"""
+
+	def __init__(self, directory=None, max_idle=4):
+		"""
+		:param directory: the scratch folder. Defaults to a new folder in the temp folder, created on first use
+		:param max_idle: how many released geodatabases to keep for reuse
+		"""
+		self._directory = directory
+		self.max_idle = max_idle
+		self.created = 0
+		self.reused = 0
+		self.removed = 0
+		self._idle = []  # geodatabase paths ready to be handed out again
+		self._owned = {}  # path -> weakref to the owner, or None for items with no owner
+		self._pending_removal = []  # paths that couldn't be deleted yet (usually still locked by arcpy)
+		self._folders = set()  # the private folders acquire_path creates, removed along with their item
+		self._lock = threading.RLock()
+
+	@property
+	def directory(self):
+		if self._directory is None:
+			self._directory = tempfile.mkdtemp(prefix="amaptor_scratch")
+		elif not os.path.isdir(self._directory):
+			os.makedirs(self._directory)
+		return self._directory
+
+	def _track(self, path, owner):
+		self._owned[path] = weakref.ref(owner) if owner is not None else None
+
+	def acquire_geodatabase(self, owner=None):
+		"""
+			Returns the path to an empty file geodatabase, reusing an idle one when possible
+		:param owner: the object whose lifetime the geodatabase is tied to. When it is released (see release_owner) or
+			garbage collected, the geodatabase is reclaimed.
+		:return: path to the geodatabase
+		"""
+		with self._lock:
+			self.reclaim()
+			if self._idle:
+				path = self._idle.pop()
+				self.reused += 1
+			else:
+				path = self._create_geodatabase()
+			self._track(path, owner)
+			return path
+
+	def acquire_path(self, suffix, prefix="amaptor_scratch", owner=None):
+		"""
+			Returns a new, unused file path in the scratch folder. The path is inside a folder of its own, created with
+			tempfile.mkdtemp so that no other caller or process can be handed the same path, but the file itself isn't
+			created - the caller writes it.
+		:param suffix: the file extension, including the "."
+		:param prefix: the start of the file name
+		:param owner: see acquire_geodatabase
+		:return: path string
+		"""
+		with self._lock:
+			self.reclaim()
+			folder = tempfile.mkdtemp(prefix=prefix, dir=self.directory)
+			self._folders.add(folder)
+			path = os.path.join(folder, prefix + suffix)
+			self._track(path, owner)
+			return path
+
+	def prefill(self, count):
+		"""
+			Creates idle geodatabases until there are at least count of them (up to max_idle), so that they don't need
+			to be created while work is underway
+		"""
+		with self._lock:
+			while len(self._idle) < min(count, self.max_idle):
+				self._idle.append(self._create_geodatabase())
+
+	def _create_geodatabase(self):
+		name = "amaptor_scratch_{}.gdb".format(uuid.uuid4().hex[:12])
+		arcpy.CreateFileGDB_management(self.directory, name)
+		self.created += 1
+		return os.path.join(self.directory, name)
+
+	def release(self, path):
+		"""
+			Gives an item back to the pool. Geodatabases that are still empty are kept for reuse if there's room,
+			everything else is deleted.
+		"""
+		with self._lock:
+			self._owned.pop(path, None)
+			if path.endswith(".gdb") and len(self._idle) < self.max_idle and _geodatabase_is_empty(path):
+				self._idle.append(path)
+			else:
+				self._remove(path)
+
+	def release_owner(self, owner):
+		"""
+			Releases every item owned by owner
+		"""
+		with self._lock:
+			for path, owner_ref in list(self._owned.items()):
+				if owner_ref is not None and owner_ref() is owner:
+					self.release(path)
+
+	def transfer(self, owner, new_owner):
+		"""
+			Moves every item owned by owner to new_owner
+		"""
+		with self._lock:
+			for path, owner_ref in list(self._owned.items()):
+				if owner_ref is not None and owner_ref() is owner:
+					self._track(path, new_owner)
+
+	def reclaim(self):
+		"""
+			Releases items whose owners have been garbage collected and retries deleting items that were locked before
+		"""
+		with self._lock:
+			for path, owner_ref in list(self._owned.items()):
+				if owner_ref is not None and owner_ref() is None:
+					self.release(path)
+
+			pending, self._pending_removal = self._pending_removal, []
+			for path in pending:
+				self._remove(path)
+
+	def _remove(self, path):
+		if os.path.exists(path):
+			try:
+				if os.path.isdir(path):
+					shutil.rmtree(path)
+				else:
+					os.remove(path)
+				self.removed += 1
+			except OSError:
+				log.debug("Couldn't remove scratch item {} yet - will try again later".format(path))
+				self._pending_removal.append(path)
+				return
+
+		folder = os.path.dirname(path)
+		if folder in self._folders:
+			self._folders.discard(folder)
+			shutil.rmtree(folder, ignore_errors=True)
+
+	def stats(self):
+		"""
+			Returns counts for the pool - live (handed out and not yet released), idle (waiting for reuse), and the total
+			number created, reused, and removed
+		"""
+		with self._lock:
+			return {
+				"live": len(self._owned),
+				"idle": len(self._idle),
+				"created": self.created,
+				"reused": self.reused,
+				"removed": self.removed,
+			}
+
+	def cleanup(self):
+		"""
+			Deletes everything in the pool, live or not, along with the scratch folder. Registered to run at exit.
+		"""
+		with self._lock:
+			for path in list(self._owned) + self._idle + self._pending_removal:
+				self._owned.pop(path, None)
+				self._remove(path)
+			self._idle = []
+			self._pending_removal = []
+			self._folders = set()
+			if self._directory is not None:
+				shutil.rmtree(self._directory, ignore_errors=True)
+
+
+pool = ScratchPool()
+atexit.register(pool.cleanup)
+
+
+def stats():
+	"""
+		Shortcut for amaptor.scratch.pool.stats()
+	"""
+	return pool.stats()
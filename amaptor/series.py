@@ -0,0 +1,356 @@
+"""
+	Map series production - renders many pages from one template, spreading the pages across worker processes. arcpy
+	isn't thread safe, so each worker is a separate process that opens the template once and keeps it open for all of
+	the pages it's given.
+
+	```
+		def make_page(project, row):
+			project.render_text({"{species}": row["name"]})
+			l_map = project.find_map("Main Map")
+			l_map.find_layer(name="Range").definitionQuery = "species_id = '{}'".format(row["id"])
+			return l_map.export_pdf(os.path.join(output_folder, "{}.pdf".format(row["id"])))
+
+		results = amaptor.series.render(template_path, rows, make_page, workers=4)
+		failed = [result for result in results if not result.ok]
+	```
+
+	page_fn is called as page_fn(project, row) for each row and whatever it returns is the page's value. It has to be
+	defined at the top level of a module so it can be sent to the worker processes, and rows need to be picklable. The
+	text of every text element is put back the way it was in the template before each page (see restore_text), but
+	anything else page_fn changes - data sources, definition queries, extents, visibility - carries over to the next
+	page the same worker renders, so page_fn should set each of those on every page rather than relying on the template.
+
+	When the script runs in ArcGIS Pro or ArcMap on Windows, call render from inside an `if __name__ == "__main__":`
+	block, since worker processes import the main script.
+
+	For series with a page per feature (per watershed, county, or site), extents_from_features works out every page's
+	extent in one pass over the feature class, so pages don't need to select and zoom to their feature:
+
+	```
+		page_extents = amaptor.series.extents_from_features(watersheds, "huc_12", aspect=frame)
+		...
+		l_map.set_extent(page_extents[row["huc_12"]], add_buffer=False)
+	```
+"""
+
+import collections
+import math
+import multiprocessing
+import numbers
+import os
+import sys
+import time
+import traceback
+import logging
+log = logging.getLogger("amaptor")
+
+import numpy
+import arcpy
+
+from amaptor.version_check import ARCMAP
+from amaptor import extents
+from amaptor.functions import describe
+from amaptor.classes.project import Project
+from amaptor.classes.map_frame import MapFrame
+
+
+class PageResult(collections.namedtuple("PageResult", ["index", "value", "error", "seconds"])):
+	"""
+		The outcome of one page - index is the row's position in rows, value is what page_fn returned, and error is None
+		or the formatted traceback of the exception page_fn raised. seconds is how long the page took.
+	"""
+	__slots__ = ()
+
+	@property
+	def ok(self):
+		return self.error is None
+
+
+_worker = {}  # per process state in worker processes - the open template and what's needed to render pages with it
+
+
+def _text_snapshot(project):
+	"""
+		Records the text of every text element in the project so it can be restored between pages
+	"""
+	if ARCMAP:
+		elements = arcpy.mapping.ListLayoutElements(project.primary_document, "TEXT_ELEMENT")
+	else:
+		elements = [element for layout in project.layouts for element in layout._layout_object.listElements("TEXT_ELEMENT")]
+	return [(element, element.text) for element in elements]
+
+
+def _restore_text(snapshot):
+	for element, text in snapshot:
+		if element.text != text:
+			element.text = text
+
+
+def _open_template(template, page_fn, lazy, restore_text):
+	"""
+		Opens the template and returns the state needed to render pages with it - the open project, page_fn, and the
+		text snapshot
+	"""
+	project = Project(template, lazy=lazy)
+	return {"project": project, "page_fn": page_fn, "text": _text_snapshot(project) if restore_text else None}
+
+
+def _init_worker(template, page_fn, lazy, restore_text):
+	"""
+		The worker pool's initializer - opens the template for this process and keeps it for every page the process
+		renders. Rendering in the current process keeps its own state instead, so renders can be nested there (as when
+		page_fn exports with parallel set).
+	"""
+	_worker.update(_open_template(template, page_fn, lazy, restore_text))
+
+
+def _render_page(state, index, row):
+	if state["text"] is not None:
+		_restore_text(state["text"])
+
+	start = time.time()
+	try:
+		value = state["page_fn"](state["project"], row)
+		error = None
+	except Exception:
+		value = None
+		error = traceback.format_exc()
+		log.error("Page {} failed:\n{}".format(index, error))
+	return PageResult(index, value, error, time.time() - start)
+
+
+def _render_chunk(chunk, state=None):
+	"""
+		Renders a chunk of (index, row) pairs with state from _open_template - by default, the worker process' state
+	"""
+	if state is None:
+		state = _worker
+	return [_render_page(state, index, row) for index, row in chunk]
+
+
+def _chunks(items, size):
+	for start in range(0, len(items), size):
+		yield items[start:start + size]
+
+
+def _python_executable():
+	"""
+		Inside the ArcGIS Pro or ArcMap applications, sys.executable is the application rather than Python, so worker
+		processes need to be pointed at the Python that comes with it
+	"""
+	if os.path.basename(sys.executable).lower().startswith("python"):
+		return None
+	for name in ("pythonw.exe", "python.exe"):
+		candidate = os.path.join(sys.exec_prefix, name)
+		if os.path.exists(candidate):
+			return candidate
+	return None
+
+
+def _iter_chunks(template, rows, page_fn, workers, chunk_size, lazy, restore_text):
+	"""
+		Renders rows (a list) and yields the list of PageResults for each chunk as it finishes. See render for the arguments.
+	"""
+	total = len(rows)
+	if workers is None:
+		workers = multiprocessing.cpu_count()
+	workers = max(1, min(workers, total or 1))
+	if chunk_size is None:
+		chunk_size = max(1, int(math.ceil(total / float(workers * 4))))
+
+	chunks = list(_chunks(list(enumerate(rows)), chunk_size))
+
+	if workers == 1:
+		state = _open_template(template, page_fn, lazy, restore_text)
+		try:
+			for chunk in chunks:
+				yield _render_chunk(chunk, state)
+		finally:
+			state["project"].close()
+		return
+
+	executable = _python_executable()
+	if executable is not None:
+		multiprocessing.set_executable(executable)
+
+	pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(template, page_fn, lazy, restore_text))
+	try:
+		for chunk_results in pool.imap_unordered(_render_chunk, chunks):
+			yield chunk_results
+		pool.close()
+	except BaseException:  # including the caller abandoning the generator
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+
+
+def iter_render(template, rows, page_fn, workers=None, chunk_size=None, lazy=True, restore_text=True):
+	"""
+		Like render, but yields each PageResult as soon as its page is done instead of returning them all at the end.
+		With more than one worker, results come in the order pages finish rather than the order of rows - use each
+		result's index to match it to its row. Stopping early (breaking out of the loop) stops the workers.
+	:return: generator of PageResult
+	"""
+	for chunk_results in _iter_chunks(template, list(rows), page_fn, workers, chunk_size, lazy, restore_text):
+		for result in chunk_results:
+			yield result
+
+
+def render(template, rows, page_fn, workers=None, chunk_size=None, lazy=True, restore_text=True, progress=None):
+	"""
+		Renders a page for each row, using worker processes that each open the template once. See the module
+		documentation for an example and for the requirements on page_fn.
+	:param template: path to the ArcGIS Pro Project or ArcMap Document to render pages from
+	:param rows: an iterable of values to pass to page_fn, one per page
+	:param page_fn: function called as page_fn(project, row) in a worker process. Its return value becomes the page's value
+	:param workers: number of worker processes. Defaults to the number of CPUs. With 1, pages are rendered in this
+		process without starting any workers
+	:param chunk_size: number of pages to send to a worker at a time. Defaults to splitting the rows into about four
+		chunks per worker, so that fast workers pick up more chunks
+	:param lazy: passed to Project when each worker opens the template. Defaults to True since pages usually only
+		touch part of the template
+	:param restore_text: when True, each text element's text is put back to the template's before every page, so
+		page_fn can use render_text on placeholders every time
+	:param progress: optional function called as progress(pages_done, total_pages) each time a chunk finishes. Progress
+		is also logged at the INFO level
+	:return: list of PageResult, in the same order as rows
+	"""
+	rows = list(rows)
+	total = len(rows)
+	results = [None] * total
+	done = 0
+
+	for chunk_results in _iter_chunks(template, rows, page_fn, workers, chunk_size, lazy, restore_text):
+		for result in chunk_results:
+			results[result.index] = result
+		done += len(chunk_results)
+		log.info("Rendered {} of {} pages".format(done, total))
+		if progress is not None:
+			progress(done, total)
+
+	return results
+
+
+class PageExtents(object):
+	"""
+		The extents of the pages of a map series, as returned by extents_from_features. Index it with a feature's key
+		to get that page's arcpy Extent, ready for Map.set_extent(page_extents[key], add_buffer=False) - the buffer is
+		already applied. keys lists the keys in the order they were first read, and bounds holds the matching
+		[XMin, YMin, XMax, YMax] rows as a read only NumPy array, all in spatial_reference.
+	"""
+
+	def __init__(self, keys, bounds, spatial_reference):
+		self.keys = keys
+		self.bounds = bounds
+		self.bounds.flags.writeable = False
+		self.spatial_reference = spatial_reference
+		self._positions = dict((key, position) for position, key in enumerate(keys))
+
+	def __len__(self):
+		return len(self.keys)
+
+	def __iter__(self):
+		return iter(self.keys)
+
+	def __contains__(self, key):
+		return key in self._positions
+
+	def __getitem__(self, key):
+		return extents.make_extent(self.bounds[self._positions[key]], self.spatial_reference)
+
+	def items(self):
+		"""
+			Returns (key, arcpy Extent) pairs for every page
+		"""
+		return [(key, self[key]) for key in self.keys]
+
+
+def _aspect_ratio(aspect):
+	if isinstance(aspect, MapFrame):
+		aspect = aspect._map_frame_object
+	if isinstance(aspect, numbers.Number):
+		return float(aspect)
+	return float(aspect.elementWidth) / aspect.elementHeight
+
+
+def _frame_spatial_reference(frame):
+	if isinstance(frame, MapFrame):
+		frame = frame._map_frame_object
+	if isinstance(frame, numbers.Number):
+		return None
+	if ARCMAP:
+		return frame.spatialReference  # an arcpy.mapping DataFrame
+	return frame.camera.getExtent().spatialReference
+
+
+def extents_from_features(feature_class, key_field, buffer_factor=.05, aspect=None, where_clause=None, spatial_reference=None, min_size=None):
+	"""
+		Works out the extent of every page of a map series with a page per feature, reading the feature class once
+		with a single arcpy.da.SearchCursor and then buffering and fitting all of the extents to the frame's shape
+		together. Features that share a key (such as the parts of a watershed stored as separate rows) become one page
+		covering all of them. Rows with no shape are skipped.
+	:param feature_class: path to the feature class that drives the series
+	:param key_field: field identifying each page - its values become the keys of the returned PageExtents
+	:param buffer_factor: fraction of each feature's width and height to add around it, as in Map.set_extent
+	:param aspect: an amaptor.MapFrame, an arcpy map frame (or ArcMap data frame), or a width / height ratio. Each
+		extent is grown in width or height to match it, so the frame shows the whole feature without distortion. When
+		it's a frame, extents are also returned in the frame's spatial reference
+	:param where_clause: optional where clause limiting which features get pages
+	:param spatial_reference: spatial reference for the extents. Defaults to the frame's when aspect is a frame, and
+		otherwise the feature class's
+	:param min_size: the smallest width and height of a page before it's buffered, in the units of the spatial
+		reference - a number, or a (width, height) pair. Pages are grown around their centers to this size, which
+		gives pages for points (and anything else with no width or height) an extent to show. Without it, a
+		warning is logged when any page has no width or height
+	:return: PageExtents
+	"""
+	if spatial_reference is None and aspect is not None:
+		spatial_reference = _frame_spatial_reference(aspect)
+	cursor_spatial_reference = spatial_reference
+	if spatial_reference is None:
+		spatial_reference = describe(feature_class).spatialReference
+
+	keys = []
+	positions = {}  # key -> position in keys
+	rows = []  # position of each feature's key
+	bounds = []
+	skipped = 0
+	with arcpy.da.SearchCursor(feature_class, [key_field, "SHAPE@"], where_clause, cursor_spatial_reference) as cursor:
+		for key, shape in cursor:
+			if shape is None:
+				skipped += 1
+				continue
+			if key not in positions:
+				positions[key] = len(keys)
+				keys.append(key)
+			rows.append(positions[key])
+			extent = shape.extent
+			bounds.append((extent.XMin, extent.YMin, extent.XMax, extent.YMax))
+
+	if skipped:
+		log.warning("Skipped {} features in {} without a shape".format(skipped, feature_class))
+
+	rows = numpy.array(rows, dtype=int)
+	bounds = numpy.array(bounds, dtype=float).reshape(-1, 4)
+	page_bounds = numpy.full((len(keys), 4), numpy.nan)
+	numpy.fmin.at(page_bounds[:, 0], rows, bounds[:, 0])  # fmin and fmax ignore the starting NaN
+	numpy.fmin.at(page_bounds[:, 1], rows, bounds[:, 1])
+	numpy.fmax.at(page_bounds[:, 2], rows, bounds[:, 2])
+	numpy.fmax.at(page_bounds[:, 3], rows, bounds[:, 3])
+
+	if min_size is not None:
+		if isinstance(min_size, numbers.Number):
+			min_size = (min_size, min_size)
+		page_bounds = extents.grow(page_bounds, *min_size)
+	else:
+		empty = numpy.count_nonzero(numpy.any(page_bounds[:, 2:] <= page_bounds[:, :2], axis=1))
+		if empty:
+			log.warning("{} pages from {} have no width or height (points, or a single coordinate) - pass min_size to give them one".format(empty, feature_class))
+
+	if buffer_factor:
+		page_bounds = extents.buffer(page_bounds, buffer_factor)
+	if aspect is not None:
+		page_bounds = extents.fit_aspect(page_bounds, _aspect_ratio(aspect))
+
+	return PageExtents(keys, page_bounds, spatial_reference)
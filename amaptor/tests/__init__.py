@@ -0,0 +1,41 @@
+"""
+	Most of these tests run against the stand-in arcpy in benchmarks/fake_arcpy.py, which the conftest.py at the root
+	of the repository installs when arcpy isn't available. Those tests derive from FakeArcpyTestCase and are skipped
+	when the real arcpy is installed.
+"""
+
+import shutil
+import tempfile
+import unittest
+
+import arcpy
+
+USING_FAKE_ARCPY = getattr(arcpy, "__fake__", False)
+
+
+@unittest.skipUnless(USING_FAKE_ARCPY, "needs the stand-in arcpy from benchmarks/fake_arcpy.py")
+class FakeArcpyTestCase(unittest.TestCase):
+	"""
+		Base class for tests against the stand-in arcpy. self.fake_arcpy is the fake_arcpy module. When template and
+		synthetic_project (keyword arguments for fake_arcpy.synthetic_project) are set on the subclass, that project is
+		registered at template before each test - otherwise use register_project with a builder of your own.
+	"""
+	template = None
+	synthetic_project = None
+
+	def setUp(self):
+		import fake_arcpy
+		self.fake_arcpy = fake_arcpy
+		if self.template is not None and self.synthetic_project is not None:
+			self.register_project(fake_arcpy.synthetic_project(**self.synthetic_project))
+
+	def register_project(self, builder):
+		self.fake_arcpy.register_project(self.template, builder)
+
+	def temporary_folder(self):
+		"""
+			Creates a folder that's deleted when the test finishes
+		"""
+		folder = tempfile.mkdtemp(prefix="amaptor_test")
+		self.addCleanup(shutil.rmtree, folder, True)
+		return folder
@@ -0,0 +1,104 @@
+"""
+	Tests for parallel and cached exports
+"""
+
+import os
+import unittest
+
+import amaptor
+from amaptor.cache import ExportCache
+from amaptor.tests import FakeArcpyTestCase
+
+TEMPLATE = "/fake/test_export.aprx"
+
+
+class TestParallelExport(FakeArcpyTestCase):
+	template = TEMPLATE
+	synthetic_project = dict(maps=1, layers=1, layouts=5)
+
+	def setUp(self):
+		super(TestParallelExport, self).setUp()
+		self.folder = self.temporary_folder()
+
+	def test_matches_serial_order(self):
+		l_map = amaptor.Project(TEMPLATE).maps[0]
+		serial = l_map.export_pdf(os.path.join(self.folder, "serial.pdf"))
+		parallel = l_map.export_pdf(os.path.join(self.folder, "parallel.pdf"), parallel=3)
+		self.assertEqual([path.replace("parallel", "serial") for path in parallel], serial)
+		self.assertEqual(len(parallel), 5)
+		for path in parallel:
+			self.assertTrue(os.path.exists(path))
+
+
+	def test_iter_export_keeps_earlier_files_after_a_failure(self):
+		project = amaptor.Project(TEMPLATE)
+		project.layouts[3]._layout_object.exportToPDF = None  # the fourth layout can't be exported
+		results = []
+		with self.assertRaises(TypeError):
+			for result in project.iter_export(os.path.join(self.folder, "project.pdf")):
+				results.append(result)
+		self.assertEqual([result.layout for result in results], ["Layout 0", "Layout 1", "Layout 2"])
+		for result in results:
+			self.assertEqual(result.bytes, os.path.getsize(result.path))
+			self.assertFalse(result.cached)
+
+
+class TestExportCache(FakeArcpyTestCase):
+	def setUp(self):
+		super(TestExportCache, self).setUp()
+		fake_arcpy = self.fake_arcpy
+		self.folder = self.temporary_folder()
+		self.project_path = os.path.join(self.folder, "cached.aprx")
+		with open(self.project_path, "w") as project_file:
+			project_file.write("project")
+		self.gdb = os.path.join(self.folder, "data", "map_0.gdb")
+		os.makedirs(self.gdb)
+		fake_arcpy.register_project(self.project_path, fake_arcpy.synthetic_project(maps=1, layers=2, layouts=2,
+																					data_folder=os.path.join(self.folder, "data")))
+		self.cache = ExportCache(os.path.join(self.folder, "cache"))
+
+	def _export(self, l_map):
+		self.fake_arcpy.reset_calls()
+		l_map.export_pdf(os.path.join(self.folder, "out.pdf"), cache=self.cache)
+		return self.fake_arcpy.CALLS["Layout.exportToPDF"]
+
+	def test_unchanged_layouts_are_not_exported_again(self):
+		l_map = amaptor.Project(self.project_path).maps[0]
+		self.assertEqual(self._export(l_map), 2)
+		self.assertEqual(self._export(l_map), 0)
+
+		l_map.project.layouts[0].render_text({"{title}": "New Title"})
+		self.assertEqual(self._export(l_map), 1)
+
+		os.utime(self.gdb, (1000000000, 1000000000))  # the data changed
+		self.assertEqual(self._export(l_map), 2)
+
+	def test_layer_drawing_changes_are_exported(self):
+		l_map = amaptor.Project(self.project_path).maps[0]
+		self.assertEqual(self._export(l_map), 2)
+
+		arcpy_layer = l_map.map_object.listLayers()[0]
+		arcpy_layer.visible = False  # set through arcpy, not amaptor
+		self.assertEqual(self._export(l_map), 2)
+		arcpy_layer.transparency = 50
+		self.assertEqual(self._export(l_map), 2)
+
+		symbology = arcpy_layer.symbology
+		symbology.updateRenderer("GraduatedColorsRenderer")
+		l_map.layers[1].symbology = symbology
+		self.assertEqual(self._export(l_map), 2)
+		self.assertEqual(self._export(l_map), 0)
+
+	def test_outputs_are_copies(self):
+		l_map = amaptor.Project(self.project_path).maps[0]
+		self._export(l_map)
+		paths = l_map.export_pdf(os.path.join(self.folder, "out.pdf"), cache=self.cache)
+		with open(paths[0], "a") as output:  # stamped after export
+			output.write("stamp")
+		for cached in l_map.export_pdf(os.path.join(self.folder, "again.pdf"), cache=self.cache):
+			with open(cached) as output:
+				self.assertNotIn("stamp", output.read())
+
+
+if __name__ == "__main__":
+	unittest.main()
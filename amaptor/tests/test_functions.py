@@ -0,0 +1,162 @@
+"""
+	Tests for data source normalization, MXD conversion, and the Describe and layer file caches in amaptor.functions
+"""
+
+import os
+import time
+import unittest
+
+import amaptor
+from amaptor import scratch, cache as amaptor_cache
+from amaptor.functions import normalize_data_source, DescribeCache, LayerFileCache, get_workspace_type, describe_cache, layer_file_cache
+from amaptor.constants import _BLANK_FEATURE_LAYER
+from amaptor.tests import FakeArcpyTestCase
+
+
+class TestNormalizeDataSource(unittest.TestCase):
+
+	def test_equivalent_paths(self):
+		expected = "c:/data/hydro.gdb/streams"
+		for path in (r"C:\Data\Hydro.gdb\Streams", "c:/data/hydro.gdb/streams/", "C:\\Data\\\\Hydro.gdb\\.\\Streams\\",
+					 r"C:\Data\Hydro.gdb\Rivers\Streams", "C:/DATA/hydro.GDB/network/streams"):
+			self.assertEqual(normalize_data_source(path), expected, path)
+
+	def test_roots_and_folders(self):
+		self.assertEqual(normalize_data_source(r"\\Server\Share\Data.gdb\Streams"), "//server/share/data.gdb/streams")
+		self.assertEqual(normalize_data_source("/Data/Shapes/"), "/data/shapes")
+		self.assertEqual(normalize_data_source(r"C:\Data\Shapes\wells.shp"), "c:/data/shapes/wells.shp")
+		self.assertEqual(normalize_data_source("C:/Data/Hydro.gdb"), "c:/data/hydro.gdb")  # a workspace on its own
+		self.assertEqual(normalize_data_source("C:/Data/Folder/Sub/wells.shp"), "c:/data/folder/sub/wells.shp")  # folders are kept
+
+
+class TestConversionCache(FakeArcpyTestCase):
+	def setUp(self):
+		super(TestConversionCache, self).setUp()
+		folder = self.temporary_folder()
+		self.mxd = os.path.join(folder, "template.mxd")
+		self._write_mxd("map document")
+		self.conversion_cache = amaptor_cache.ConversionCache(os.path.join(folder, "conversions"))
+		self.addCleanup(setattr, amaptor_cache, "conversion_cache", amaptor_cache.conversion_cache)
+		amaptor_cache.conversion_cache = self.conversion_cache
+
+	def _write_mxd(self, content, modified=None):
+		with open(self.mxd, "w") as mxd:
+			mxd.write(content)
+		if modified is not None:
+			os.utime(self.mxd, (modified, modified))
+
+	def _convert(self):
+		project = amaptor.Project(self.mxd)
+		self.addCleanup(project.close)
+		return project
+
+	def _scratch_items(self, owner):
+		return sorted((path for path, owner_ref in scratch.pool._owned.items() if owner_ref is not None and owner_ref() is owner),
+					  key=lambda path: os.path.splitext(path)[1])
+
+	def test_hits_and_misses(self):
+		self.fake_arcpy.reset_calls()
+		first = self._convert()
+		second = self._convert()
+		self.assertEqual(self.fake_arcpy.CALLS["ArcGISProject.importDocument"], 1)
+		self.assertEqual((self.conversion_cache.hits, self.conversion_cache.misses), (1, 1))
+		self.assertEqual(self.conversion_cache.stats()["entries"], 1)
+
+		first_items, second_items = self._scratch_items(first), self._scratch_items(second)
+		self.assertEqual([os.path.splitext(path)[1] for path in first_items], [".aprx", ".gdb"])
+		self.assertFalse(set(first_items) & set(second_items))  # each project gets its own copy and geodatabase
+
+	def test_changed_mxd_is_converted_again(self):
+		modified = time.time() - 100
+		self._write_mxd("map document", modified)
+		self._convert()
+
+		self._write_mxd("map_document", modified + 10)  # same size, new content and modification time
+		self._convert()
+		self.assertEqual(self.conversion_cache.misses, 2)
+
+		self._write_mxd("map_document", modified + 20)  # only the modification time changed - the content is the key
+		self._convert()
+		self.assertEqual(self.conversion_cache.hits, 1)
+		self.assertEqual(self.conversion_cache.stats()["entries"], 2)
+
+	def test_disabled(self):
+		amaptor_cache.conversion_cache = None
+		self.fake_arcpy.reset_calls()
+		self._convert()
+		self._convert()
+		self.assertEqual(self.fake_arcpy.CALLS["ArcGISProject.importDocument"], 2)
+		self.assertEqual(self.conversion_cache.stats()["entries"], 0)
+
+
+class TestDescribeCache(FakeArcpyTestCase):
+	def setUp(self):
+		super(TestDescribeCache, self).setUp()
+		self.folder = self.temporary_folder()
+		self.geodatabase = os.path.join(self.folder, "data.gdb")
+		os.mkdir(self.geodatabase)
+		self.timestamps = os.path.join(self.geodatabase, "timestamps")  # rewritten by ArcGIS on every edit
+		open(self.timestamps, "w").close()
+		self.edited = time.time() + 100  # later than the folder's own modification time
+		os.utime(self.timestamps, (self.edited, self.edited))
+
+	def tearDown(self):
+		describe_cache.clear()
+
+	def test_reuses_results_until_data_changes(self):
+		cache = DescribeCache()
+		feature_class = os.path.join(self.geodatabase, "streams")
+		first = cache.describe(feature_class)
+		self.assertIs(cache.describe(feature_class.upper() if os.name == "nt" else feature_class + "/"), first)
+
+		open(os.path.join(self.geodatabase, "a00000009.gdbtable"), "w").close()  # only the system files are checked
+		self.assertIs(cache.describe(feature_class), first)
+
+		os.utime(self.timestamps, (self.edited + 10, self.edited + 10))
+		self.assertIsNot(cache.describe(feature_class), first)
+		self.assertEqual(cache.stats()["hits"], 2)
+
+	def test_workspace_type_is_described_once_per_workspace(self):
+		self.fake_arcpy.reset_calls()
+		for name in ("streams", "roads", "rail"):
+			self.assertEqual(get_workspace_type(os.path.join(self.geodatabase, name)), "FILEGDB_WORKSPACE")
+		self.assertEqual(self.fake_arcpy.CALLS["Describe"], 4)  # three feature classes and the geodatabase once
+
+		os.utime(self.timestamps, (self.edited + 10, self.edited + 10))  # the geodatabase changed, so it's described again
+		get_workspace_type(os.path.join(self.geodatabase, "streams"))
+		self.assertEqual(self.fake_arcpy.CALLS["Describe"], 6)
+		self.assertEqual(len(describe_cache._workspaces), 2)  # the old entry ages out of the LRU cache
+
+	def test_enterprise_data_is_not_cached(self):
+		cache = DescribeCache()
+		cache.describe("/connections/prod.sde/db.owner.roads")
+		cache.describe("/connections/prod.sde/db.owner.roads")
+		self.assertEqual(len(cache), 0)
+
+
+class TestLayerFileCache(FakeArcpyTestCase):
+	def setUp(self):
+		super(TestLayerFileCache, self).setUp()
+		self.layer_file = os.path.join(self.temporary_folder(), "streams.lyrx")
+		open(self.layer_file, "w").close()
+
+	def test_templates_are_parsed_once_until_changed(self):
+		cache = LayerFileCache()
+		self.fake_arcpy.reset_calls()
+		first = cache.templates(self.layer_file)
+		self.assertIs(cache.templates(self.layer_file), first)
+		self.assertEqual(self.fake_arcpy.CALLS["LayerFile"], 1)
+
+		os.utime(self.layer_file, (time.time() + 100, time.time() + 100))
+		self.assertIsNot(cache.templates(self.layer_file), first)
+		self.assertEqual(self.fake_arcpy.CALLS["LayerFile"], 2)
+
+	def test_layers_from_data_sources_are_independent(self):
+		template = layer_file_cache.templates(_BLANK_FEATURE_LAYER)[0]
+		template_source = template.dataSource
+		self.fake_arcpy.reset_calls()
+		layers = [amaptor.Layer("/data/hydro.gdb/fc_{}".format(index)) for index in range(5)]
+		self.assertEqual(self.fake_arcpy.CALLS["LayerFile"], 5)  # changed layers never come from the shared cache
+		self.assertEqual(len(set(id(layer.layer_object) for layer in layers)), 5)
+		self.assertEqual(len(set(layer.data_source for layer in layers)), 5)
+		self.assertEqual(template.dataSource, template_source)
@@ -2,6 +2,7 @@ import unittest
 
 import amaptor
 import arcpy
+from amaptor.tests import FakeArcpyTestCase
 
 class TestLayer(unittest.TestCase):
 	def _test_set_data_source_pro(self, new_source):
@@ -29,3 +30,45 @@ class TestLayer(unittest.TestCase):
 		self._test_set_data_source_pro(new_source = r"C:\Users\dsx\Code\nitrates-2015-mapping\templates\nitrates_template\nitrates_template.gdb\NatmLosses13")
 
 
+
+
+class TestLayerProperties(FakeArcpyTestCase):
+	def setUp(self):
+		super(TestLayerProperties, self).setUp()
+		self.arcpy_layer = self.fake_arcpy.Layer("Rivers", data_source="/data/hydro.gdb/rivers")
+
+	def test_passthrough(self):
+		layer = amaptor.Layer(self.arcpy_layer)
+		self.assertEqual(layer.dataSource, "/data/hydro.gdb/rivers")
+		self.assertTrue(layer.isFeatureLayer)
+
+		layer.definitionQuery = "FLOW > 10"
+		self.assertEqual(self.arcpy_layer.definitionQuery, "FLOW > 10")
+		self.assertNotIn("definitionQuery", layer.__dict__)
+		with self.assertRaises(AttributeError):
+			layer.not_a_layer_property
+		with self.assertRaises(AttributeError):  # misspelled, so it would never reach arcpy
+			layer.definition_query = "FLOW > 20"
+		self.assertEqual(self.arcpy_layer.definitionQuery, "FLOW > 10")
+
+	def test_cached_properties(self):
+		layer = amaptor.Layer(self.arcpy_layer, cache_properties=True)
+		self.fake_arcpy.reset_calls()
+		for _ in range(10):
+			self.assertEqual(layer.name, "Rivers")
+			self.assertTrue(layer.supports("DATASOURCE"))
+			self.assertEqual(layer.data_source, "/data/hydro.gdb/rivers")
+		self.assertEqual(self.fake_arcpy.total_calls(), 3)
+
+		layer.name = "Streams"  # changes through amaptor clear the cache
+		self.assertEqual(layer.name, "Streams")
+
+		self.assertEqual(layer.visible, True)
+		self.arcpy_layer.visible = False  # changes behind amaptor's back need a refresh
+		self.assertEqual(layer.visible, True)
+		layer.refresh()
+		self.assertEqual(layer.visible, False)
+		self.arcpy_layer.visible = True
+		self.assertEqual(layer.visible, False)
+		layer.refresh()
+		self.assertEqual(layer.visible, True)
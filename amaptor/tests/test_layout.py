@@ -0,0 +1,96 @@
+"""
+	Tests for amaptor.Layout's element lookups and text rendering
+"""
+
+import unittest
+
+import amaptor
+from amaptor.tests import FakeArcpyTestCase
+
+TEMPLATE = "/fake/test_layout.aprx"
+
+
+class TestFindElements(FakeArcpyTestCase):
+	template = TEMPLATE
+	synthetic_project = dict(maps=1, layers=1, layouts=2, frames_per_layout=1, text_elements=3, other_elements=2)
+
+	def setUp(self):
+		super(TestFindElements, self).setUp()
+		self.project = amaptor.Project(TEMPLATE)
+		self.layout = self.project.find_layout("Layout 0")
+
+	def _names(self, elements):
+		return [element._name for element in elements]
+
+	def test_by_type_and_name(self):
+		self.fake_arcpy.reset_calls()
+		self.assertEqual(self._names(self.layout.find_elements(type="TEXT")), ["Text 0", "Text 1", "Text 2"])
+		self.assertEqual(self._names(self.layout.find_elements(type="graphic_element", name_glob="*1")), ["Graphic 1"])
+		self.assertEqual(self._names(self.layout.find_elements(name_glob="Map*")), ["Map Frame 0"])
+		self.assertEqual(self.layout.find_element("Text 1")._name, "Text 1")
+		self.assertEqual(self.fake_arcpy.CALLS["Layout.listElements"], 0)  # elements were listed when the project opened
+
+		self.assertEqual(len(self.project.find_elements(type="TEXT", name_glob="Text 2")), 2)  # one on each layout
+
+	def test_index_follows_changes(self):
+		element = self.layout.find_element("Text 0")
+		element.name = "Footnote"  # renamed directly through arcpy
+		self.assertEqual(self.layout.find_elements(name_glob="Text*"), self.layout.find_elements(name_glob="Text [12]"))
+		self.assertIs(self.layout.find_element("Footnote"), element)
+		with self.assertRaises(amaptor.ElementNotFoundError):
+			self.layout.find_element("Text 0")
+
+		self.layout._layout_object._elements.append(self.fake_arcpy.TextElement("Added"))
+		self.layout.toggle_element("Added", visibility=False)
+		self.assertFalse(self.layout.find_elements(type="TEXT")[-1].visible)
+
+		self.layout.frames[0].name = "Overview"
+		self.assertEqual(self._names(self.layout.find_elements(type="MAPFRAME")), ["Overview"])
+
+		self.layout.toggle_element(element)  # an element object rather than a name
+		self.assertFalse(element.visible)
+
+
+class TestRenderText(FakeArcpyTestCase):
+	template = TEMPLATE
+
+	def setUp(self):
+		super(TestRenderText, self).setUp()
+		fake_arcpy = self.fake_arcpy
+
+		def builder():
+			return [], [
+				fake_arcpy.Layout("Layout 0", [fake_arcpy.TextElement("Title", "SPECIES in SPECIES_REGION"),
+												fake_arcpy.TextElement("Credits", "Center for Watershed Sciences")]),
+				fake_arcpy.Layout("Layout 1", [fake_arcpy.TextElement("Date", "{date} ({year})")]),
+			]
+		self.register_project(builder)
+		self.project = amaptor.Project(TEMPLATE)
+
+	def _text(self, layout_name, element_name):
+		return self.project.find_layout(layout_name).find_element(element_name).text
+
+	def test_overlapping_placeholders(self):
+		replacements = {"SPECIES": "Chinook Salmon", "SPECIES_REGION": "Sacramento River",  # one starts with the other
+						"{year}": 2017, "{date}": "{year}-06-01"}
+		self.assertEqual(self.project.render_text(replacements), 2)
+		self.assertEqual(self._text("Layout 0", "Title"), "Chinook Salmon in Sacramento River")
+		self.assertEqual(self._text("Layout 1", "Date"), "{year}-06-01 (2017)")  # replacements aren't rendered again
+
+	def test_only_changed_elements_are_written(self):
+		self.fake_arcpy.reset_calls()
+		self.assertEqual(self.project.find_layout("Layout 0").render_text({"SPECIES": "Coho", "{missing}": "x"}), 1)
+		self.assertEqual(self.fake_arcpy.CALLS["TextElement.text="], 1)
+		self.assertEqual(self.fake_arcpy.CALLS["TextElement.text"], 2)  # each element is read once
+		self.assertTrue(self.project.modified)
+
+	def test_nothing_to_replace(self):
+		self.fake_arcpy.reset_calls()
+		self.assertEqual(self.project.render_text({"{missing}": "x"}), 0)
+		self.assertEqual(self.project.render_text({}), 0)
+		self.assertEqual(self.fake_arcpy.CALLS["TextElement.text="], 0)
+		self.assertFalse(self.project.modified)
+
+
+if __name__ == "__main__":
+	unittest.main()
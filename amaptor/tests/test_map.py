@@ -0,0 +1,262 @@
+"""
+	Tests for amaptor.Map's layers and extents
+"""
+
+import os
+import unittest
+
+import arcpy
+import amaptor
+from amaptor.functions import layer_file_cache
+from amaptor.constants import _BLANK_FEATURE_LAYER
+from amaptor.tests import FakeArcpyTestCase
+
+TEMPLATE = "/fake/test_map.aprx"
+
+
+class TestAddLayers(FakeArcpyTestCase):
+	template = TEMPLATE
+	synthetic_project = dict(maps=2, layers=3)
+
+	def setUp(self):
+		super(TestAddLayers, self).setUp()
+		self.new_layers = [self.fake_arcpy.Layer("New {}".format(index), data_source="/data/new.gdb/fc_{}".format(index)) for index in range(4)]
+
+	def _names(self, l_map):
+		return [layer.name for layer in l_map.layers]
+
+	def test_add_layers_matches_add_layer(self):
+		one_at_a_time = amaptor.Project(TEMPLATE).maps[0]
+		for layer in self.new_layers:
+			one_at_a_time.add_layer(layer, "TOP")
+
+		l_map = amaptor.Project(TEMPLATE).maps[0]
+		original_layers = list(l_map.layers)
+		self.fake_arcpy.reset_calls()
+		l_map.add_layers([amaptor.Layer(layer) for layer in self.new_layers], "TOP")
+
+		self.assertEqual(self.fake_arcpy.CALLS["Map.listLayers"], 1)
+		self.assertEqual(self._names(l_map), self._names(one_at_a_time))
+		self.assertEqual(l_map.layers[4:], original_layers)  # existing wrappers are kept
+		self.assertTrue(all(layer.map is l_map for layer in l_map.layers))
+		self.assertTrue(l_map.project.modified)
+
+	def test_existing_layers_keep_their_records(self):
+		l_map = amaptor.Project(TEMPLATE, cache_layer_properties=True).maps[0]
+		original_layers = list(l_map.layers)
+		l_map.query_layers(name="Layer 0-1")  # builds the query index
+		l_map.add_layers(self.new_layers[:2], "BOTTOM")  # arcpy lists new objects for the layers already in the map
+
+		self.fake_arcpy.reset_calls()
+		l_map.add_layers([self.new_layers[0]], "TOP")  # the same layer again, so two layers share a name and source
+		self.assertEqual(self.fake_arcpy.CALLS["Layer.name"], 1)  # only the added layer is read for the query index
+		self.assertEqual(self.fake_arcpy.CALLS["Layer.longName"], 6)  # the new listing, to match layers up
+		self.assertEqual(l_map.layers[1:4], original_layers)
+		self.assertEqual(self._names(l_map), ["New 0", "Layer 0-0", "Layer 0-1", "Layer 0-2", "New 0", "New 1"])
+		self.assertEqual([layer.name for layer in l_map.query_layers(name="New 0")], ["New 0", "New 0"])
+
+		l_map.layers[2].visible = False  # the kept objects change the layers in the map
+		self.assertFalse(l_map.map_object.listLayers()[2].visible)
+
+	def test_insert_layers(self):
+		l_map = amaptor.Project(TEMPLATE).maps[0]
+		reference = l_map.layers[1]
+		l_map.insert_layers(reference, self.new_layers[:2])
+		self.assertEqual(self._names(l_map), ["Layer 0-0", "New 0", "New 1", "Layer 0-1", "Layer 0-2"])
+		self.assertEqual(l_map.find_layer(path="/data/new.gdb/fc_1").name, "New 1")
+
+	def test_add_layers_from_sources(self):
+		sources = ["/data/new.gdb/fc_{}".format(index) for index in range(5)]
+		one_at_a_time = amaptor.Project(TEMPLATE).maps[0]
+		one_at_a_time.add_layers([amaptor.Layer(source) for source in sources], "BOTTOM")
+
+		l_map = amaptor.Project(TEMPLATE).maps[0]
+		template = layer_file_cache.templates(_BLANK_FEATURE_LAYER)[0]
+		template_source = template.dataSource
+		self.fake_arcpy.reset_calls()
+		l_map.add_layers_from_sources(sources, add_position="BOTTOM")
+		self.assertEqual(self.fake_arcpy.CALLS["LayerFile"], 0)  # the cached blank template is only copied into the map
+		self.assertEqual(self.fake_arcpy.CALLS["Map.listLayers"], 1)
+
+		self.assertEqual(self._names(l_map), self._names(one_at_a_time))
+		self.assertEqual([layer.data_source for layer in l_map.layers[3:]], sources)
+		self.assertEqual(template.dataSource, template_source)
+		self.assertTrue(all(layer.map is l_map for layer in l_map.layers))
+
+
+class TestQueryLayers(FakeArcpyTestCase):
+	template = TEMPLATE
+
+	def setUp(self):
+		super(TestQueryLayers, self).setUp()
+		fake_arcpy = self.fake_arcpy
+
+		def builder():
+			layers = [
+				fake_arcpy.Layer("Streams", data_source="/data/hydro.gdb/network/streams"),
+				fake_arcpy.Layer("Streams Labels", data_source="/data/hydro.gdb/streams", visible=False),
+				fake_arcpy.Layer("Roads", data_source="/data/transport.gdb/roads"),
+				fake_arcpy.Layer("Elevation", data_source="/data/rasters/dem.tif", is_raster=True),
+				fake_arcpy.Layer("Basins"),
+			]
+			return [fake_arcpy.Map("Map", layers)], []
+		self.register_project(builder)
+		self.map = amaptor.Project(TEMPLATE).maps[0]
+
+	def _query(self, **kwargs):
+		return [layer.name for layer in self.map.query_layers(**kwargs)]
+
+	def test_predicates_are_combined(self):
+		self.assertEqual(self._query(workspace="/DATA/hydro.gdb"), ["Streams", "Streams Labels"])
+		self.assertEqual(self._query(workspace="/data/hydro.gdb", visible=True), ["Streams"])
+		self.assertEqual(self._query(source="/data/hydro.gdb/streams"), ["Streams", "Streams Labels"])
+		self.assertEqual(self._query(name_glob="*s", dataset_type="feature", visible=True), ["Streams", "Roads", "Basins"])
+		self.assertEqual(self._query(name_regex="^E", dataset_type="RASTER"), ["Elevation"])
+		self.assertEqual(self._query(name="Basins"), ["Basins"])
+		self.assertEqual(len(self._query()), 5)
+
+	def test_index_is_reused_and_kept_current(self):
+		self._query(name="Roads")
+		self.fake_arcpy.reset_calls()
+		roads = self.map.query_layers(name="Roads", visible=True)
+		self.assertEqual(self.fake_arcpy.total_calls(), 0)
+		self.assertEqual(len(roads), 1)
+
+		self.map.query_layers(name="Roads")[0].name = "Highways"
+		self.map.find_layer(name="Elevation").visible = False
+		self.map.add_layer(self.fake_arcpy.Layer("Rail", data_source="/data/transport.gdb/rail"), "BOTTOM")
+		self.assertEqual(self._query(name="Roads"), [])
+		self.assertEqual(self._query(workspace="/data/transport.gdb"), ["Highways", "Rail"])
+		self.assertEqual(self._query(visible=False), ["Streams Labels", "Elevation"])
+
+
+class TestApplySymbology(FakeArcpyTestCase):
+	template = TEMPLATE
+	synthetic_project = dict(maps=1, layers=6)
+
+	def setUp(self):
+		super(TestApplySymbology, self).setUp()
+		self.folder = self.temporary_folder()
+		self.style = os.path.join(self.folder, "water.lyrx")
+		open(self.style, "w").close()
+		self.map = amaptor.Project(TEMPLATE).maps[0]
+
+	def test_sources_are_resolved_once_and_failures_reported(self):
+		self.fake_arcpy.reset_calls()
+		results = self.map.apply_symbology([
+			({"name_glob": "Layer 0-*"}, self.style),
+			("Layer 0-1", os.path.join(self.folder, "missing.lyrx")),
+			("No Such Layer", self.style),
+		])
+		statuses = [result.status for result in results]
+		self.assertEqual(statuses, ["applied"] * 6 + ["failed", "failed"])
+		self.assertEqual(self.fake_arcpy.CALLS["LayerFile"], 1)
+		self.assertEqual(self.fake_arcpy.CALLS["Layer.symbology="], 6)
+
+		again = self.map.apply_symbology({"Layer 0-2": self.style, self.map.layers[3]: self.map.layers[0]})
+		self.assertEqual([result.status for result in again], ["skipped", "applied"])
+
+	def test_skips_survive_new_layer_objects(self):
+		self.map.apply_symbology({"Layer 0-1": self.style, "Layer 0-2": self.style, "Layer 0-3": self.style})
+		self.map.list_layers()  # every layer gets a new amaptor.Layer, and arcpy lists new layer objects
+		self.map.layers[2].symbology = self.style  # styled directly, so apply_symbology can't know what it looks like
+
+		self.fake_arcpy.reset_calls()
+		arcpy_layer = self.map.map_object.listLayers()[1]  # an arcpy object amaptor has never seen
+		results = self.map.apply_symbology([(arcpy_layer, self.style), ("Layer 0-2", self.style)])
+		self.assertEqual([result.status for result in results], ["skipped", "applied"])
+		self.assertEqual(self.fake_arcpy.CALLS["Layer.symbology="], 1)
+
+		self.map.map_object.removeLayer(self.map.layers[3].layer_object)
+		self.map.list_layers()
+		self.map.apply_symbology({})
+		self.assertEqual(len(self.map._symbology_sources), 2)  # the removed layer is forgotten
+
+
+class TestZoomToLayers(FakeArcpyTestCase):
+	template = TEMPLATE
+
+	def setUp(self):
+		super(TestZoomToLayers, self).setUp()
+		fake_arcpy = self.fake_arcpy
+		geodatabase = os.path.join(self.temporary_folder(), "hydro.gdb")
+		os.mkdir(geodatabase)
+		bounds = {"streams": (0, 0, 10, 10), "lakes": (5, -10, 20, 5), "wells": (float("nan"),) * 4}
+		for name, (x_min, y_min, x_max, y_max) in bounds.items():
+			fake_arcpy.register_dataset(os.path.join(geodatabase, name), extent=fake_arcpy.Extent(x_min, y_min, x_max, y_max))
+
+		def builder():
+			layers = [fake_arcpy.Layer(name.title(), data_source=os.path.join(geodatabase, name)) for name in sorted(bounds)]
+			l_map = fake_arcpy.Map("Map", layers)
+			return [l_map], [fake_arcpy.Layout("Layout", [fake_arcpy.MapFrame("Frame", l_map)])]
+		self.register_project(builder)
+		self.map = amaptor.Project(TEMPLATE).maps[0]
+
+	def test_union_with_buffer_and_cached_extents(self):
+		self.map.zoom_to_layers(["Streams", "Lakes", "Wells"], buffer_factor=.1)
+		extent = self.map.frames[0].get_extent()
+		self.assertEqual((extent.XMin, extent.YMin, extent.XMax, extent.YMax), (-2, -12, 22, 12))
+
+		self.fake_arcpy.reset_calls()
+		self.map.zoom_to_layers(self.map.layers, add_buffer=False)
+		self.assertEqual(self.fake_arcpy.CALLS["Describe"], 0)
+		extent = self.map.frames[0].get_extent()
+		self.assertEqual((extent.XMin, extent.YMin, extent.XMax, extent.YMax), (0, -10, 20, 10))
+
+
+class TestSetExtent(FakeArcpyTestCase):
+	template = TEMPLATE
+
+	def setUp(self):
+		super(TestSetExtent, self).setUp()
+		fake_arcpy = self.fake_arcpy
+		frame_codes = [3857, 3857, 32610, 2227, 2227]
+
+		def builder():
+			l_map = fake_arcpy.Map("Map", [fake_arcpy.Layer("Streams")], spatial_reference=fake_arcpy.SpatialReference(3857))
+			frames = []
+			for index, code in enumerate(frame_codes):
+				frame = fake_arcpy.MapFrame("Frame {}".format(index), l_map)
+				frame.camera = fake_arcpy.Camera(fake_arcpy.Extent(spatial_reference=fake_arcpy.SpatialReference(code)))
+				frames.append(frame)
+			return [l_map, fake_arcpy.Map("Unplaced")], [fake_arcpy.Layout("Layout", frames)]
+		self.register_project(builder)
+		self.map = amaptor.Project(TEMPLATE).maps[0]
+
+	def _bounds(self, extent):
+		return extent.XMin, extent.YMin, extent.XMax, extent.YMax
+
+	def test_projects_once_per_spatial_reference(self):
+		extent = arcpy.Extent(-122.0, 37.0, -121.0, 38.0, spatial_reference=arcpy.SpatialReference(4326))
+		self.fake_arcpy.reset_calls()
+		self.map.set_extent(extent)
+		self.assertEqual(self._bounds(extent), (-122.0, 37.0, -121.0, 38.0))  # the caller's extent isn't buffered in place
+		self.assertEqual(self.fake_arcpy.CALLS["Extent.projectAs"], 1)  # only the frames in 2227 need arcpy
+
+		frame_extents = [frame.get_extent() for frame in self.map.frames]
+		self.assertEqual(self._bounds(frame_extents[0]), self._bounds(frame_extents[1]))
+		x_min, y_min, x_max, y_max = self._bounds(frame_extents[0])
+		self.assertAlmostEqual(x_min, -13586543.9, places=0)  # -122.05 degrees
+		self.assertAlmostEqual(y_max, 4586491.5, places=0)  # 38.05 degrees
+		x_min, y_min, x_max, y_max = self._bounds(frame_extents[2])
+		self.assertTrue(580000 < x_min < 590000 and 4085000 < y_min < 4095000)
+
+		camera = self.map.map_object.defaultCamera.getExtent()  # in the map's spatial reference, not the last frame's
+		self.assertEqual(self._bounds(camera), self._bounds(frame_extents[0]))
+
+	def test_map_without_frames_keeps_its_default_camera(self):
+		l_map = self.map.project.find_map("Unplaced")
+		default = self._bounds(l_map.map_object.defaultCamera.getExtent())
+		l_map.set_extent(arcpy.Extent(0, 0, 10, 10, spatial_reference=arcpy.SpatialReference(3857)))
+		self.assertEqual(self._bounds(l_map.map_object.defaultCamera.getExtent()), default)
+
+	def test_round_trip(self):
+		from amaptor import extents
+		values = [-13580000.0, 4400000.0, -13500000.0, 4500000.0]
+		geographic = extents.project(values, arcpy.SpatialReference(3857), arcpy.SpatialReference(4326))
+		self.assertTrue(all(abs(a - b) < 1e-3 for a, b in zip(extents.project(geographic, arcpy.SpatialReference(4326), arcpy.SpatialReference(3857)), values)))
+
+		utm = extents.project([500000.0, 4000000.0, 500000.0, 4000000.0], arcpy.SpatialReference(32611), arcpy.SpatialReference(4326))
+		self.assertAlmostEqual(utm[0], -117.0, places=6)  # zone 11's central meridian
+		self.assertTrue(extents.project(geographic, arcpy.SpatialReference(4326), arcpy.SpatialReference(3857)) is
+						extents.project(geographic, arcpy.SpatialReference(4326), arcpy.SpatialReference(3857)))  # cached
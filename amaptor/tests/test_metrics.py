@@ -0,0 +1,56 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from amaptor.metrics import Registry
+
+
+class TestMetrics(unittest.TestCase):
+	def setUp(self):
+		self.registry = Registry(buckets=(0.1, 1))
+
+	def test_timer_records_calls_and_errors(self):
+		with self.registry.timer("Describe"):
+			pass
+		with self.assertRaises(ValueError):
+			with self.registry.timer("Describe"):
+				raise ValueError()
+
+		describe = self.registry.snapshot()["operations"]["Describe"]
+		self.assertEqual(describe["calls"], 2)
+		self.assertEqual(describe["errors"], 1)
+		self.assertEqual(describe["buckets"], [["0.1", 2], ["1", 2], ["+Inf", 2]])
+
+	def test_disabled(self):
+		self.registry.enabled = False
+		with self.registry.timer("Describe"):
+			pass
+		self.registry.increment("pages")
+		self.assertEqual(self.registry.snapshot()["operations"], {})
+		self.assertEqual(self.registry.snapshot()["counters"], [])
+
+	def test_outputs(self):
+		self.registry.observe("exportToPDF", 0.5)
+		self.registry.increment("pages", 3, series="test")
+
+		text = self.registry.prometheus_text()
+		pid = os.getpid()
+		self.assertIn('amaptor_arcpy_call_seconds_bucket{{operation="exportToPDF",pid="{}",le="0.1"}} 0'.format(pid), text)
+		self.assertIn('amaptor_arcpy_call_seconds_bucket{{operation="exportToPDF",pid="{}",le="1"}} 1'.format(pid), text)
+		self.assertIn('amaptor_pages_total{{series="test",pid="{}"}} 3'.format(pid), text)
+
+		folder = tempfile.mkdtemp()
+		try:
+			json_path = self.registry.write_json(folder)
+			self.assertEqual(os.path.basename(json_path), "amaptor_{}.json".format(pid))
+			with open(json_path) as json_file:
+				self.assertEqual(json.load(json_file)["operations"]["exportToPDF"]["calls"], 1)
+			self.assertTrue(os.path.exists(self.registry.write_prometheus(folder)))
+		finally:
+			shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,214 @@
+"""
+	Tests for amaptor.Project
+"""
+
+import unittest
+
+import amaptor
+from amaptor.tests import FakeArcpyTestCase
+
+TEMPLATE = "/fake/test_project.aprx"
+
+
+class TestLazyLoading(FakeArcpyTestCase):
+	template = TEMPLATE
+	synthetic_project = dict(maps=3, layers=4, layouts=2, frames_per_layout=1, text_elements=2, other_elements=1)
+
+	def test_built_on_first_access(self):
+		self.fake_arcpy.reset_calls()
+		project = amaptor.Project(TEMPLATE, lazy=True)
+		self.assertEqual(self.fake_arcpy.total_calls(), 1)  # only the document was opened
+
+		l_map = project.find_map("Map 1")
+		self.assertEqual(self.fake_arcpy.CALLS["ArcGISProject.listMaps"], 1)
+		self.assertEqual(self.fake_arcpy.CALLS["Map.listLayers"], 0)
+		self.assertEqual(self.fake_arcpy.CALLS["ArcGISProject.listLayouts"], 0)
+
+		self.assertEqual(len(l_map.layers), 4)
+		self.assertEqual(self.fake_arcpy.CALLS["Map.listLayers"], 1)  # just the map that was used
+
+		layout = project.find_layout("Layout 1")
+		self.assertEqual(self.fake_arcpy.CALLS["Layout.listElements"], 0)
+		self.assertIs(layout.frames[0].map, l_map)
+		self.assertEqual(len(project.layouts), 2)
+		self.assertEqual(self.fake_arcpy.CALLS["ArcGISProject.listLayouts"], 1)
+		self.assertEqual(self.fake_arcpy.CALLS["ArcGISProject.listMaps"], 1)
+
+	def test_same_graph_as_eager(self):
+		eager, lazy = amaptor.Project(TEMPLATE), amaptor.Project(TEMPLATE, lazy=True)
+		for project in (lazy, eager):
+			self.assertEqual([l_map.name for l_map in project.maps], ["Map 0", "Map 1", "Map 2"])
+			self.assertEqual([[layer.name for layer in l_map.layers] for l_map in project.maps][1],
+							["Layer 1-0", "Layer 1-1", "Layer 1-2", "Layer 1-3"])
+			self.assertEqual([frame.map.name for layout in project.layouts for frame in layout.frames], ["Map 0", "Map 1"])
+			self.assertEqual([layout.name for layout in project.find_map("Map 0").layouts], ["Layout 0"])
+			self.assertEqual(project.find_map("Map 2").layouts, [])
+
+
+class TestNameIndexes(FakeArcpyTestCase):
+	template = TEMPLATE
+	synthetic_project = dict(maps=2, layers=1, layouts=2, frames_per_layout=2, text_elements=0, other_elements=0)
+
+	def test_kept_current(self):
+		project = amaptor.Project(TEMPLATE)
+		map_0 = project.find_map("Map 0")
+		self.fake_arcpy.reset_calls()
+		self.assertIs(project.find_map("Map 1"), project.maps[1])
+		self.assertEqual(self.fake_arcpy.CALLS["Map.name"], 0)  # names are read once, when the index is built
+
+		new_map = project.new_map("Streams")
+		self.assertIs(project.find_map("Streams"), new_map)
+		with self.assertRaises(amaptor.MapExists):
+			project.new_map("Streams")
+
+		map_0.name = "Rivers"
+		self.assertIs(project.find_map("Rivers"), map_0)
+		with self.assertRaises(amaptor.MapNotFoundError):
+			project.find_map("Map 0")
+		new_map.name = "Map 0"  # the old name can be reused
+		self.assertIs(project.find_map("Map 0"), new_map)
+
+		template_map = "/fake/streams_template.mxd"
+		self.fake_arcpy.register_project(template_map, lambda: ([self.fake_arcpy.Map("_rename_template_amaptor", [self.fake_arcpy.Layer("Streams", data_source="/data/hydro.gdb/streams")])], []))
+		lazy_project = amaptor.Project(TEMPLATE, lazy=True)  # so the new map's layers aren't listed when it's wrapped
+		self.assertEqual(lazy_project.find_layers_by_sources(["/data/hydro.gdb/streams"])["/data/hydro.gdb/streams"], [])  # builds the source index
+		streams_map = lazy_project.new_map("Hydrology", template_map=template_map)
+		self.assertEqual([layer.name for layer in lazy_project.find_layer("/data/hydro.gdb/streams")], ["Streams"])
+		self.assertIs(lazy_project.find_layer("/data/hydro.gdb/streams", find_all=False), streams_map.layers[0])
+
+		new_layout = project.new_layout("Overview")
+		self.assertIs(project.find_layout("Overview"), new_layout)
+		project.find_layout("Layout 0").name = "Detail"
+		self.assertEqual(project.find_layout("Detail").name, "Detail")
+		with self.assertRaises(amaptor.LayoutNotFoundError):
+			project.find_layout("Layout 0")
+
+		layout = project.find_layout("Layout 1")
+		frame = layout.find_map_frame("Map Frame 1")
+		frame.name = "Inset"
+		self.assertIs(layout.find_map_frame("Inset"), frame)
+		with self.assertRaises(amaptor.MapFrameNotFoundError):
+			layout.find_map_frame("Map Frame 1")
+
+
+class TestRepoint(FakeArcpyTestCase):
+	template = TEMPLATE
+
+	def setUp(self):
+		super(TestRepoint, self).setUp()
+		fake_arcpy = self.fake_arcpy
+
+		def builder():
+			return [
+				fake_arcpy.Map("Streams", [fake_arcpy.Layer("Streams", data_source="/data/2017/hydro.gdb/streams"),
+											fake_arcpy.Layer("Roads", data_source="/data/base.gdb/roads")]),
+				fake_arcpy.Map("Lakes", [fake_arcpy.Layer("Lakes", data_source="/data/2017/hydro.gdb/lakes"),
+										fake_arcpy.Layer("Wells", data_source="/data/2017/wells.shp")]),
+			], []
+		self.register_project(builder)
+		self.project = amaptor.Project(TEMPLATE)
+
+	def test_repoints_whole_project_in_one_call(self):
+		self.fake_arcpy.reset_calls()
+		report = self.project.repoint("/data/2017", "/data/2018")
+
+		self.assertEqual(self.fake_arcpy.CALLS["ArcGISProject.updateConnectionProperties"], 1)
+		self.assertEqual(self.fake_arcpy.CALLS["Exists"], 2)  # hydro.gdb and the folder holding the shapefile
+		self.assertEqual(sorted(new for layer, old, new in report.changed),
+						["/data/2018/hydro.gdb/lakes", "/data/2018/hydro.gdb/streams", "/data/2018/wells.shp"])
+		self.assertEqual(self.project.find_layer("/data/2018/hydro.gdb/lakes")[0].name, "Lakes")
+		self.assertEqual(self.project.maps[0].query_layers(workspace="/data/base.gdb")[0].dataSource, "/data/base.gdb/roads")
+		self.assertTrue(self.project.modified)
+
+	def test_keeps_case_and_separators(self):
+		fake_arcpy = self.fake_arcpy
+
+		def builder():
+			return [fake_arcpy.Map("Windows", [fake_arcpy.Layer("Streams", data_source=r"C:\Data\2017\Hydro.gdb\Network\Streams"),
+											  fake_arcpy.Layer("Roads", data_source="C:/Data/2017/Base.gdb/roads")])], []
+		self.register_project(builder)
+		project = amaptor.Project(TEMPLATE)
+		fake_arcpy.register_missing(r"D:\Snapshots\2018\Hydro.gdb")
+
+		fake_arcpy.reset_calls()
+		report = project.repoint("c:/DATA/2017/", "D:\\Snapshots\\2018\\")
+		self.assertEqual(report.missing_workspaces, [r"D:\Snapshots\2018\Hydro.gdb"])  # not d:\snapshots\2018/hydro.gdb
+		self.assertEqual(fake_arcpy.CALLS["Exists"], 2)  # the other target, D:\Snapshots\2018/Base.gdb, exists
+
+	def test_limited_to_maps(self):
+		report = self.project.repoint("/data/2017/hydro.gdb", "/data/2018/hydro.gdb", maps=["Lakes"])
+		self.assertEqual([old for layer, old, new in report.changed], ["/data/2017/hydro.gdb/lakes"])
+		self.assertEqual(self.project.find_map("Streams").layers[0].dataSource, "/data/2017/hydro.gdb/streams")
+
+
+class TestFindLayersBySources(FakeArcpyTestCase):
+	template = TEMPLATE
+
+	def setUp(self):
+		super(TestFindLayersBySources, self).setUp()
+		fake_arcpy = self.fake_arcpy
+
+		def builder():
+			return [
+				fake_arcpy.Map("Streams", [fake_arcpy.Layer("Streams", data_source=r"C:\Data\Hydro.gdb\Network\Streams"),
+											fake_arcpy.Layer("Wells", data_source=r"C:\Data\wells.shp")]),
+				fake_arcpy.Map("Overview", [fake_arcpy.Layer("All Streams", data_source="c:/data/hydro.gdb/streams"),
+											fake_arcpy.Layer("Parcels", data_source="C:/Data/county.sde/county.gis.parcels")]),
+			], []
+		self.register_project(builder)
+		self.project = amaptor.Project(TEMPLATE)
+
+	def _names(self, layers):
+		return [layer.name for layer in layers]
+
+	def test_normalized_lookups(self):
+		paths = ["C:/DATA/HYDRO.GDB/STREAMS/", r"c:\data\wells.shp", "C:/Data/county.sde/parcels", "C:/Data/missing.shp"]
+		self.fake_arcpy.reset_calls()
+		found = self.project.find_layers_by_sources(paths)
+		self.assertEqual(sorted(found), sorted(paths))
+		self.assertEqual(self._names(found[paths[0]]), ["Streams", "All Streams"])
+		self.assertEqual(self._names(found[paths[1]]), ["Wells"])
+		self.assertEqual(self._names(found[paths[2]]), ["Parcels"])  # without the database and owner
+		self.assertEqual(found[paths[3]], [])
+		self.assertEqual(self.fake_arcpy.CALLS["Layer.dataSource"], 4)  # each layer's source is read once
+
+		self.assertEqual(self.project.find_layer(r"C:\Data\Hydro.gdb\Streams", find_all=False).name, "Streams")
+		with self.assertRaises(amaptor.LayerNotFoundError):
+			self.project.find_layer("C:/Data/missing.shp")
+
+	def test_follows_data_source_changes(self):
+		self.assertEqual(len(self.project.find_layer("C:/Data/Hydro.gdb/Streams")), 2)
+		self.project.find_map("Overview").layers[0].dataSource = "C:/Data/Hydro2.gdb/Streams"
+		self.assertEqual(self._names(self.project.find_layer("C:/Data/Hydro.gdb/Streams")), ["Streams"])
+		self.assertEqual(self._names(self.project.find_layer("c:/data/hydro2.gdb/streams")), ["All Streams"])
+
+
+class TestFrameGraph(FakeArcpyTestCase):
+	template = TEMPLATE
+	synthetic_project = dict(maps=2, layers=1, layouts=3, frames_per_layout=2)
+
+	def _frame_names(self, l_map):
+		return [(frame.layout.name, frame.name) for frame in l_map.frames]
+
+	def test_built_once_and_kept_current(self):
+		self.fake_arcpy.reset_calls()
+		project = amaptor.Project(TEMPLATE)
+		self.assertEqual(self.fake_arcpy.CALLS["MapFrame.map"], 6)  # each frame's map is read once when the project opens
+		map_0, map_1 = project.maps
+
+		self.fake_arcpy.reset_calls()
+		self.assertEqual(self._frame_names(map_0), [("Layout 0", "Map Frame 0"), ("Layout 1", "Map Frame 0"), ("Layout 2", "Map Frame 0")])
+		self.assertEqual([layout.name for layout in map_1.layouts], ["Layout 0", "Layout 1", "Layout 2"])
+		map_0.name = "Renamed"
+		self.assertEqual(len(map_0.frames), 3)
+
+		frame = project.find_layout("Layout 0").frames[1]  # showed map 1
+		frame.map = map_0
+		self.assertEqual(self.fake_arcpy.CALLS["MapFrame.map"], 0)
+		self.assertEqual(self._frame_names(map_0)[:2], [("Layout 0", "Map Frame 0"), ("Layout 0", "Map Frame 1")])
+		self.assertEqual([layout.name for layout in map_1.layouts], ["Layout 1", "Layout 2"])
+
+	def test_lazy(self):
+		project = amaptor.Project(TEMPLATE, lazy=True)
+		self.assertEqual(len(project.find_map("Map 1").frames), 3)
+		self.assertEqual(len(project.find_map("Map 0").layouts), 3)
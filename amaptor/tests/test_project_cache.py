@@ -0,0 +1,138 @@
+"""
+	Tests for amaptor.open_project and amaptor.project_cache
+"""
+
+import os
+import unittest
+
+import amaptor
+from amaptor import cache, scratch
+from amaptor.project_cache import ProjectCache
+from amaptor.tests import FakeArcpyTestCase
+
+
+def _scratch_items(owner):
+	return sorted(path for path, owner_ref in scratch.pool._owned.items() if owner_ref is not None and owner_ref() is owner)
+
+
+class TestProjectCache(FakeArcpyTestCase):
+
+	def setUp(self):
+		super(TestProjectCache, self).setUp()
+		folder = self.temporary_folder()
+		self.templates = []
+		for index in range(3):
+			template = os.path.join(folder, "template_{}.aprx".format(index))
+			with open(template, "w") as project_file:
+				project_file.write("template")
+			self.fake_arcpy.register_project(template, self.fake_arcpy.synthetic_project(maps=1, layers=2, text_elements=2, other_elements=0))
+			self.templates.append(template)
+		self.project_cache = ProjectCache(max_size=2)
+		self.addCleanup(self.project_cache.clear)
+
+	def test_hits_and_misses(self):
+		with amaptor.open_project(self.templates[0], cache=self.project_cache) as project:
+			document = project.primary_document
+			l_map = project.maps[0]
+		self.assertEqual((self.project_cache.hits, self.project_cache.misses), (0, 1))
+
+		self.fake_arcpy.reset_calls()
+		with amaptor.open_project(self.templates[0], cache=self.project_cache) as project:
+			self.assertIs(project.primary_document, document)
+			self.assertIs(project.maps[0], l_map)
+			self.assertIs(l_map.project, project)
+		self.assertEqual(self.fake_arcpy.CALLS["ArcGISProject"], 0)
+		self.assertEqual((self.project_cache.hits, self.project_cache.misses), (1, 1))
+
+		with amaptor.open_project(self.templates[0], cache=self.project_cache) as first:
+			with amaptor.open_project(self.templates[0], cache=self.project_cache) as second:  # the document is in use
+				self.assertIsNot(second.primary_document, first.primary_document)
+		self.assertEqual(len(self.project_cache), 1)  # the second document to come back was released
+
+		with self.assertRaises(ValueError):
+			amaptor.open_project("CURRENT", cache=self.project_cache)
+
+	def test_eviction(self):
+		for template in self.templates:
+			amaptor.open_project(template, cache=self.project_cache).close()
+		self.assertEqual(len(self.project_cache), 2)
+		self.assertEqual(self.project_cache.evictions, 1)
+
+		with amaptor.open_project(self.templates[0], cache=self.project_cache):  # the least recently used was evicted
+			pass
+		self.assertEqual(self.project_cache.hits, 0)
+
+	def test_changed_template_is_reopened(self):
+		with amaptor.open_project(self.templates[0], cache=self.project_cache) as project:
+			document = project.primary_document
+		with open(self.templates[0], "w") as project_file:
+			project_file.write("changed template")
+		with amaptor.open_project(self.templates[0], cache=self.project_cache) as project:
+			self.assertIsNot(project.primary_document, document)
+
+	def test_modified_documents_are_not_returned(self):
+		with amaptor.open_project(self.templates[0], cache=self.project_cache) as project:
+			self.assertEqual(project.render_text({"{title}": "Chinook Salmon"}), 2)
+		self.assertEqual(len(self.project_cache), 0)
+
+		with amaptor.open_project(self.templates[0], cache=self.project_cache) as project:
+			self.assertEqual(project.layouts[0].find_element("Text 0").text, "{title} 0")
+			project.layouts[0].find_element("Text 0").text = "changed through arcpy"
+			project.mark_modified()
+		self.assertEqual(len(self.project_cache), 0)
+
+	def test_copy_on_save(self):
+		project = amaptor.open_project(self.templates[0], cache=self.project_cache)
+		project.save()
+		copy_path = project.path
+		self.assertNotEqual(copy_path, self.templates[0])
+		self.assertTrue(os.path.exists(copy_path))
+		with open(self.templates[0]) as project_file:
+			self.assertEqual(project_file.read(), "template")
+
+		project.save()  # later saves update the same copy
+		self.assertEqual(project.path, copy_path)
+
+		project.close()
+		self.assertFalse(os.path.exists(copy_path))  # the copy was temporary
+		self.assertEqual(len(self.project_cache), 0)
+
+
+class TestConvertedDocuments(FakeArcpyTestCase):
+
+	def setUp(self):
+		super(TestConvertedDocuments, self).setUp()
+		folder = self.temporary_folder()
+		self.mxd = os.path.join(folder, "template.mxd")
+		with open(self.mxd, "w") as mxd:
+			mxd.write("map document")
+
+		self._conversion_cache = cache.conversion_cache
+		cache.conversion_cache = cache.ConversionCache(os.path.join(folder, "conversions"))
+		self.addCleanup(setattr, cache, "conversion_cache", self._conversion_cache)
+		self.project_cache = ProjectCache()
+		self.addCleanup(self.project_cache.clear)
+
+	def test_scratch_files_survive_in_the_cache(self):
+		project = amaptor.open_project(self.mxd, cache=self.project_cache)
+		converted_path = project.path
+		items = _scratch_items(project)
+		self.assertIn(converted_path, items)
+		self.assertEqual(len(items), 2)  # the converted project and its temporary geodatabase
+		project.close()
+
+		for path in items:
+			self.assertTrue(os.path.exists(path), path)
+
+		project = amaptor.open_project(self.mxd, cache=self.project_cache)
+		self.assertEqual(project.path, converted_path)
+		self.assertEqual(_scratch_items(project), items)
+		project.close()
+
+		self.project_cache.clear()  # evicting the document releases its files
+		self.assertFalse(os.path.exists(converted_path))
+		self.assertFalse(set(items) & set(scratch.pool._owned))  # the empty geodatabase may be kept for reuse
+
+
+if __name__ == "__main__":
+	unittest.main()
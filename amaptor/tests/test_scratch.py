@@ -0,0 +1,110 @@
+"""
+	Tests for amaptor.scratch.ScratchPool
+"""
+
+import gc
+import os
+import unittest
+
+from amaptor import scratch
+from amaptor.tests import FakeArcpyTestCase
+
+
+class _Owner(object):
+	pass
+
+
+class TestScratchPool(FakeArcpyTestCase):
+
+	def setUp(self):
+		super(TestScratchPool, self).setUp()
+		self.folder = os.path.join(self.temporary_folder(), "scratch")
+		self.pool = scratch.ScratchPool(self.folder, max_idle=1)
+
+	def _write(self, path):
+		with open(path, "w") as scratch_file:
+			scratch_file.write("scratch")
+
+	def test_acquire(self):
+		owner = _Owner()
+		geodatabase = self.pool.acquire_geodatabase(owner=owner)
+		self.assertTrue(os.path.isdir(geodatabase))
+		self.assertEqual(os.path.dirname(geodatabase), self.folder)
+
+		first = self.pool.acquire_path(".aprx", "converted", owner=owner)
+		second = self.pool.acquire_path(".aprx", "converted", owner=owner)
+		self.assertNotEqual(first, second)
+		self.assertTrue(first.endswith(".aprx"))
+		self.assertFalse(os.path.exists(first))  # the caller writes the file
+		self.assertEqual(self.pool.stats()["live"], 3)
+
+	def test_release_owner(self):
+		owner, other_owner = _Owner(), _Owner()
+		geodatabases = [self.pool.acquire_geodatabase(owner=owner) for index in range(2)]
+		path = self.pool.acquire_path(".aprx", owner=owner)
+		self._write(path)
+		other_path = self.pool.acquire_path(".aprx", owner=other_owner)
+		self._write(other_path)
+
+		self.pool.release_owner(owner)
+		self.assertFalse(os.path.exists(path))
+		self.assertFalse(os.path.exists(os.path.dirname(path)))  # along with the folder it was given
+		self.assertTrue(os.path.exists(other_path))
+		self.assertEqual([os.path.exists(geodatabase) for geodatabase in geodatabases].count(True), 1)  # one is kept for reuse
+		self.assertEqual(self.pool.stats()["idle"], 1)
+
+		self.assertIn(self.pool.acquire_geodatabase(owner=other_owner), geodatabases)
+		self.assertEqual(self.pool.stats()["reused"], 1)
+
+	def test_geodatabases_with_data_are_not_reused(self):
+		geodatabase = self.pool.acquire_geodatabase()
+		self._write(os.path.join(geodatabase, "a00000009.gdbtable"))  # a user table
+		self.pool.release(geodatabase)
+		self.assertFalse(os.path.exists(geodatabase))
+		self.assertEqual(self.pool.stats()["idle"], 0)
+
+	def test_transfer(self):
+		project, cache_entry = _Owner(), _Owner()
+		path = self.pool.acquire_path(".aprx", owner=project)
+		self._write(path)
+
+		self.pool.transfer(project, cache_entry)  # the project gives its files to the cache
+		self.pool.release_owner(project)
+		self.assertTrue(os.path.exists(path))
+
+		next_project = _Owner()
+		self.pool.transfer(cache_entry, next_project)  # and the cache hands them to the next project
+		self.pool.release_owner(cache_entry)
+		self.assertTrue(os.path.exists(path))
+
+		self.pool.release_owner(next_project)
+		self.assertFalse(os.path.exists(path))
+
+	def test_reclaim_after_garbage_collection(self):
+		owner = _Owner()
+		path = self.pool.acquire_path(".aprx", owner=owner)
+		self._write(path)
+		unowned = self.pool.acquire_path(".aprx")  # items without an owner stay until they're released
+		self._write(unowned)
+
+		del owner
+		gc.collect()
+		self.pool.reclaim()
+		self.assertFalse(os.path.exists(path))
+		self.assertTrue(os.path.exists(unowned))
+		self.assertEqual(self.pool.stats()["live"], 1)
+
+	def test_cleanup(self):
+		owner = _Owner()
+		self._write(self.pool.acquire_path(".aprx", owner=owner))
+		self.pool.acquire_geodatabase(owner=owner)
+		self.pool.prefill(1)
+
+		self.pool.cleanup()
+		self.assertFalse(os.path.exists(self.folder))
+		self.assertEqual(self.pool.stats()["live"], 0)
+		self.assertEqual(self.pool.stats()["idle"], 0)
+
+
+if __name__ == "__main__":
+	unittest.main()
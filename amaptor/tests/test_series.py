@@ -0,0 +1,114 @@
+"""
+	Tests for amaptor.series
+"""
+
+import os
+import unittest
+
+import amaptor
+from amaptor.tests import FakeArcpyTestCase
+
+TEMPLATE = "/fake/test_series.aprx"
+
+
+def title_page(project, row):
+	if row == "fail":
+		raise ValueError("bad row")
+	project.render_text({"{title}": row})
+	return [element.text for element in project.layouts[0]._layout_object.listElements("TEXT_ELEMENT")], os.getpid()
+
+
+def nested_page(project, row):
+	inner = amaptor.series.render(TEMPLATE, ["inner " + row], title_page, workers=1)  # as a page exporting with parallel=1 would
+	if not inner[0].ok:
+		raise RuntimeError(inner[0].error)
+	return title_page(project, row)
+
+
+class TestSeries(FakeArcpyTestCase):
+	template = TEMPLATE
+	synthetic_project = dict(maps=1, layers=2, layouts=1, text_elements=2)
+
+	def setUp(self):
+		super(TestSeries, self).setUp()
+		self.rows = ["page {}".format(index) for index in range(12)]
+
+	def _check(self, results, rows):
+		self.assertEqual([result.index for result in results], list(range(len(rows))))
+		for result, row in zip(results, rows):
+			self.assertTrue(result.ok, result.error)
+			self.assertEqual(result.value[0], ["{} 0".format(row), "{} 1".format(row)])  # text restored before each page
+
+	def test_in_process(self):
+		progress = []
+		results = amaptor.series.render(TEMPLATE, self.rows, title_page, workers=1, chunk_size=5,
+										progress=lambda done, total: progress.append((done, total)))
+		self._check(results, self.rows)
+		self.assertEqual(progress, [(5, 12), (10, 12), (12, 12)])
+
+	def test_nested_in_process(self):
+		results = amaptor.series.render(TEMPLATE, self.rows[:3], nested_page, workers=1)
+		self._check(results, self.rows[:3])
+
+	def test_workers(self):
+		results = amaptor.series.render(TEMPLATE, self.rows, title_page, workers=3, chunk_size=2)
+		self._check(results, self.rows)
+		self.assertNotIn(os.getpid(), set(result.value[1] for result in results))
+
+	def test_failures_are_per_page(self):
+		rows = ["page 0", "fail", "page 2"]
+		results = amaptor.series.render(TEMPLATE, rows, title_page, workers=2, chunk_size=1)
+		self.assertEqual([result.ok for result in results], [True, False, True])
+		self.assertIn("ValueError: bad row", results[1].error)
+		self.assertIsNone(results[1].value)
+
+
+class TestExtentsFromFeatures(FakeArcpyTestCase):
+	def setUp(self):
+		super(TestExtentsFromFeatures, self).setUp()
+		fake_arcpy = self.fake_arcpy
+		self.feature_class = "/data/series.gdb/watersheds"
+		fake_arcpy.register_features(self.feature_class, [
+			({"huc": "a"}, fake_arcpy.Extent(0, 0, 10, 10)),
+			({"huc": "b"}, fake_arcpy.Extent(100, 0, 140, 10)),
+			({"huc": "a"}, fake_arcpy.Extent(10, 0, 20, 10)),  # second part of "a"
+			({"huc": "c"}, None),
+		])
+
+	def test_one_cursor_pass(self):
+		self.fake_arcpy.reset_calls()
+		page_extents = amaptor.series.extents_from_features(self.feature_class, "huc", buffer_factor=.1, aspect=4 / 3.0)
+		self.assertEqual(self.fake_arcpy.CALLS["da.SearchCursor"], 1)
+		self.assertEqual(self.fake_arcpy.CALLS["Describe"], 1)  # for the spatial reference, since none was given
+		self.assertEqual(list(page_extents), ["a", "b"])
+		self.assertNotIn("c", page_extents)
+
+		extent = page_extents["a"]  # 0-20 by 0-10, buffered to -2-22 by -1-11, then made taller to fit 4:3
+		self.assertEqual((extent.XMin, extent.XMax, extent.YMin, extent.YMax), (-2, 22, -4, 14))
+		extent = page_extents["b"]  # 100-140 by 0-10, buffered to 96-144 by -1-11, then made taller
+		self.assertEqual((extent.XMin, extent.XMax, extent.YMin, extent.YMax), (96, 144, -13, 23))
+
+	def test_frame_aspect(self):
+		frame = self.fake_arcpy.MapFrame("Frame", self.fake_arcpy.Map(), width=4, height=8)
+		page_extents = amaptor.series.extents_from_features(self.feature_class, "huc", buffer_factor=0, aspect=frame)
+		self.assertEqual(page_extents.bounds.tolist(), [[0, -15, 20, 25], [100, -35, 140, 45]])
+
+	def test_points(self):
+		sites = "/data/series.gdb/sites"
+		self.fake_arcpy.register_features(sites, [
+			({"site": "well"}, self.fake_arcpy.Extent(5, 5, 5, 5)),
+			({"site": "gauge"}, self.fake_arcpy.Extent(50, 20, 50, 20)),
+			({"site": "road"}, self.fake_arcpy.Extent(0, 0, 200, 0)),  # a straight line, with no height
+		])
+		with self.assertLogs("amaptor", "WARNING"):
+			amaptor.series.extents_from_features(sites, "site", aspect=2)
+
+		page_extents = amaptor.series.extents_from_features(sites, "site", buffer_factor=.1, aspect=2, min_size=100)
+		extent = page_extents["well"]  # grown to -45-55 by -45-55, buffered to -55-65 by -55-65, then made wider
+		self.assertEqual((extent.XMin, extent.XMax, extent.YMin, extent.YMax), (-115, 125, -55, 65))
+		self.assertEqual(page_extents.bounds[1].tolist(), [-70, -40, 170, 80])
+		self.assertEqual(page_extents.bounds[2].tolist(), [-20, -60, 220, 60])  # only its height was grown
+
+
+if __name__ == "__main__":
+	unittest.main()
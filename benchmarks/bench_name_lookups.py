@@ -0,0 +1,88 @@
+"""
+	Micro-benchmark for name lookups (Project.find_map, Project.find_layout, Project.check_map_name,
+	Layout.find_map_frame) against a stand-in arcpy where every .name read sleeps, to simulate the cost of crossing into
+	arcpy. The "scan" column is the linear scan amaptor used before name indexes, reading .name from each object.
+
+		python benchmarks/bench_name_lookups.py --maps 40 --layouts 20 --lookups 1000 --latency 0.00005
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_arcpy
+fake_arcpy.install()
+
+import amaptor
+
+PROJECT_PATH = "/fake/bench_name_lookups.aprx"
+
+
+def scan(items, name):
+	for item in items:
+		if item.name == name:
+			return item
+
+
+def timed(function, names):
+	fake_arcpy.reset_calls()
+	start = time.time()
+	for name in names:
+		function(name)
+	return time.time() - start, fake_arcpy.total_calls()
+
+
+def check_map_name(project, name):
+	try:
+		project.check_map_name(name)
+	except amaptor.MapExists:
+		pass
+
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--maps", type=int, default=40)
+	parser.add_argument("--layouts", type=int, default=20)
+	parser.add_argument("--frames", type=int, default=4, help="map frames per layout")
+	parser.add_argument("--lookups", type=int, default=1000)
+	parser.add_argument("--latency", type=float, default=0.00005, help="seconds each arcpy call sleeps")
+	options = parser.parse_args(args)
+
+	fake_arcpy.register_project(PROJECT_PATH, fake_arcpy.synthetic_project(
+		maps=options.maps, layers=1, layouts=options.layouts, frames_per_layout=options.frames))
+	project = amaptor.Project(PROJECT_PATH)
+	layout = project.layouts[-1]
+
+	map_names = ["Map {}".format(index % options.maps) for index in range(options.lookups)]
+	layout_names = ["Layout {}".format(index % options.layouts) for index in range(options.lookups)]
+	frame_names = ["Map Frame {}".format(index % options.frames) for index in range(options.lookups)]
+
+	cases = (
+		("find_map", project.find_map, lambda name: scan(project.maps, name), map_names),
+		("find_layout", project.find_layout, lambda name: scan(project.layouts, name), layout_names),
+		("check_map_name", lambda name: check_map_name(project, name), lambda name: scan(project.maps, name), map_names),
+		("find_map_frame", layout.find_map_frame, lambda name: scan(layout.frames, name), frame_names),
+	)
+
+	fake_arcpy.LATENCY = options.latency
+	print("{} lookups, {}s per arcpy call".format(options.lookups, options.latency))
+	print("{:>16} {:>12} {:>10} {:>12} {:>10}".format("lookup", "scan (s)", "calls", "index (s)", "calls"))
+	results = {}
+	try:
+		for label, indexed, linear, names in cases:
+			scan_time, scan_calls = timed(linear, names)
+			index_time, index_calls = timed(indexed, names)
+			results[label] = {"scan": scan_time, "index": index_time}
+			print("{:>16} {:>12.4f} {:>10} {:>12.4f} {:>10}".format(label, scan_time, scan_calls, index_time, index_calls))
+	finally:
+		fake_arcpy.LATENCY = 0.0
+
+	return results
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,66 @@
+"""
+	Counts the arcpy calls made when opening a large project and touching a small part of it (replacing text on one
+	layout and exporting it), with and without Project(lazy=True). Runs against the fake_arcpy stand-in, so it works
+	without ArcGIS installed:
+
+		python benchmarks/bench_project_open.py --maps 40 --layers 50 --layouts 10
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_arcpy
+fake_arcpy.install()
+
+import amaptor
+
+PROJECT_PATH = "/fake/bench_project_open.aprx"
+
+
+def open_and_export(lazy, out_folder):
+	project = amaptor.Project(PROJECT_PATH, lazy=lazy)
+	layout = project.find_layout("Layout 0")
+	layout.replace_text("{title}", "Benchmark")
+	layout.export_to_pdf(os.path.join(out_folder, "layout_0.pdf"))
+	return project
+
+
+def measure(lazy, out_folder):
+	fake_arcpy.reset_calls()
+	start = time.time()
+	open_and_export(lazy, out_folder)
+	elapsed = time.time() - start
+	return fake_arcpy.total_calls(), elapsed
+
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--maps", type=int, default=40)
+	parser.add_argument("--layers", type=int, default=50)
+	parser.add_argument("--layouts", type=int, default=10)
+	parser.add_argument("--frames", type=int, default=2, help="map frames per layout")
+	options = parser.parse_args(args)
+
+	fake_arcpy.register_project(PROJECT_PATH, fake_arcpy.synthetic_project(
+		maps=options.maps, layers=options.layers, layouts=options.layouts, frames_per_layout=options.frames))
+
+	out_folder = tempfile.mkdtemp(prefix="amaptor_bench")
+	print("Project: {} maps x {} layers, {} layouts x {} frames".format(options.maps, options.layers, options.layouts, options.frames))
+	results = {}
+	for label, lazy in (("eager", False), ("lazy", True)):
+		calls, elapsed = measure(lazy, out_folder)
+		results[label] = calls
+		print("{:>6}: {:>8} arcpy calls  {:.4f}s".format(label, calls, elapsed))
+
+	print("lazy mode makes {:.1%} of the eager arcpy calls".format(float(results["lazy"]) / results["eager"]))
+	return results
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,635 @@
+"""
+	A stand-in for arcpy/arcpy.mp so that amaptor can be imported and exercised on machines without ArcGIS installed.
+
+	It is NOT a faithful copy of arcpy - it implements only the parts of the arcpy.mp API that amaptor touches, and it
+	records every call that crosses the (pretend) arcpy boundary in CALLS so that benchmarks can count round trips.
+	Each call can also sleep for LATENCY seconds (or a per-call time from LATENCIES - see set_latency) to approximate
+	the cost of a real arcpy call.
+
+	Usage (before importing amaptor):
+
+	```
+		import fake_arcpy
+		fake_arcpy.install()
+		fake_arcpy.register_project("/fake/project.aprx", fake_arcpy.synthetic_project(maps=40, layers=20, layouts=5))
+		import amaptor
+	```
+"""
+
+import collections
+import copy
+import os
+import ntpath
+import posixpath
+import sys
+import time
+import types
+
+CALLS = collections.Counter()
+LATENCY = 0.0
+LATENCIES = {}  # overrides LATENCY for a call ("Layout.exportToPDF") or every call on a class ("Layout")
+
+_PROJECTS = {}  # path -> callable returning a fresh ArcGISProject state (list of maps, list of layouts)
+_LAYER_FILES = {}  # path -> callable returning a list of Layers
+_DATASETS = {}  # path -> dict of Describe properties that override the defaults
+_FEATURES = {}  # path -> list of (dict of attributes, Geometry or None) rows read by da.SearchCursor
+_MISSING = set()  # paths Exists reports as missing
+
+
+def _call(name):
+	CALLS[name] += 1
+	latency = LATENCY
+	if LATENCIES:
+		latency = LATENCIES.get(name, LATENCIES.get(name.split(".")[0], LATENCY))
+	if latency:
+		time.sleep(latency)
+
+
+def set_latency(default=0.0, overrides=None):
+	"""
+		Sets how long each call sleeps - default for every call, and overrides as a dictionary of call name (as counted
+		in CALLS, such as "Layout.exportToPDF" or "Describe") or class name ("Layout") to seconds
+	"""
+	global LATENCY
+	LATENCY = default
+	LATENCIES.clear()
+	LATENCIES.update(overrides or {})
+
+
+def reset_calls():
+	CALLS.clear()
+
+
+def total_calls():
+	return sum(CALLS.values())
+
+
+def _counted_property(attribute, label):
+	"""
+		Builds a property that stores its value on attribute and counts every read and write as an arcpy call
+	"""
+	def getter(self):
+		_call("{}.{}".format(label, attribute.lstrip("_")))
+		return getattr(self, attribute)
+
+	def setter(self, value):
+		_call("{}.{}=".format(label, attribute.lstrip("_")))
+		setattr(self, attribute, value)
+
+	return property(getter, setter)
+
+
+def _path_module(path):
+	return ntpath if "\\" in path else posixpath
+
+
+class ExecuteError(Exception):
+	pass
+
+
+class SpatialReference(object):
+	def __init__(self, factory_code=4326, name=None):
+		self.factoryCode = factory_code
+		self.name = name or "SR_{}".format(factory_code)
+
+	def __eq__(self, other):
+		return isinstance(other, SpatialReference) and other.factoryCode == self.factoryCode
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def __hash__(self):
+		return hash(self.factoryCode)
+
+
+class Extent(object):
+	def __init__(self, XMin=0.0, YMin=0.0, XMax=1.0, YMax=1.0, ZMin=None, ZMax=None, MMin=None, MMax=None, spatial_reference=None):
+		self.XMin = XMin
+		self.YMin = YMin
+		self.XMax = XMax
+		self.YMax = YMax
+		self.spatialReference = spatial_reference or SpatialReference()
+
+	@property
+	def width(self):
+		return self.XMax - self.XMin
+
+	@property
+	def height(self):
+		return self.YMax - self.YMin
+
+	def projectAs(self, spatial_reference, transformation_name=None):
+		_call("Extent.projectAs")
+		return Extent(self.XMin, self.YMin, self.XMax, self.YMax, spatial_reference=spatial_reference)
+
+	def __repr__(self):
+		return "Extent({}, {}, {}, {}, {})".format(self.XMin, self.YMin, self.XMax, self.YMax, self.spatialReference.factoryCode)
+
+
+class Camera(object):
+	def __init__(self, extent=None):
+		self._extent = extent or Extent()
+
+	def getExtent(self):
+		_call("Camera.getExtent")
+		return copy.copy(self._extent)
+
+	def setExtent(self, extent):
+		_call("Camera.setExtent")
+		self._extent = copy.copy(extent)
+
+
+class Symbology(object):
+	def __init__(self, renderer_type="SimpleRenderer"):
+		self.renderer = types.SimpleNamespace(type=renderer_type)
+
+	def updateRenderer(self, renderer_type):
+		_call("Symbology.updateRenderer")
+		self.renderer = types.SimpleNamespace(type=renderer_type)
+
+
+class Layer(object):
+	def __init__(self, name="layer", data_source=None, is_group=False, is_raster=False, visible=True, definition_query=""):
+		self._name = name
+		self._dataSource = data_source
+		self._visible = visible
+		self._isGroupLayer = is_group
+		self._isRasterLayer = is_raster
+		self._isFeatureLayer = not is_group and not is_raster
+		self._definitionQuery = definition_query
+		self._transparency = 0
+		self._symbology = Symbology("RasterStretchColorizer" if is_raster else "SimpleRenderer")
+
+	name = _counted_property("_name", "Layer")
+	dataSource = _counted_property("_dataSource", "Layer")
+	visible = _counted_property("_visible", "Layer")
+	isGroupLayer = _counted_property("_isGroupLayer", "Layer")
+	isFeatureLayer = _counted_property("_isFeatureLayer", "Layer")
+	isRasterLayer = _counted_property("_isRasterLayer", "Layer")
+	definitionQuery = _counted_property("_definitionQuery", "Layer")
+	transparency = _counted_property("_transparency", "Layer")
+
+	@property
+	def longName(self):
+		_call("Layer.longName")
+		return self._name
+
+	@property
+	def symbology(self):
+		_call("Layer.symbology")
+		return copy.deepcopy(self._symbology)
+
+	@symbology.setter
+	def symbology(self, value):
+		_call("Layer.symbology=")
+		self._symbology = copy.deepcopy(value)
+
+	def getDefinition(self, cim_version):
+		_call("Layer.getDefinition")
+		return types.SimpleNamespace(name=self._name, visibility=self._visible, transparency=self._transparency,
+									 renderer=types.SimpleNamespace(**vars(self._symbology.renderer)))
+
+	def supports(self, property_name):
+		_call("Layer.supports")
+		if property_name == "DATASOURCE":
+			return self._dataSource is not None
+		return True
+
+	@property
+	def connectionProperties(self):
+		_call("Layer.connectionProperties")
+		if self._dataSource is None:
+			return None
+		module = _path_module(self._dataSource)
+		return {
+			"dataset": module.basename(self._dataSource),
+			"connection_info": {"database": module.dirname(self._dataSource)},
+			"workspace_factory": "File Geodatabase",
+		}
+
+	def updateConnectionProperties(self, current_connection_info, new_connection_info, auto_update_joins_and_relates=True, validate=True):
+		_call("Layer.updateConnectionProperties")
+		if isinstance(new_connection_info, dict):
+			database = new_connection_info["connection_info"]["database"]
+			self._dataSource = _path_module(database).join(database, new_connection_info["dataset"])
+		elif self._dataSource and self._dataSource.startswith(current_connection_info):
+			self._dataSource = new_connection_info + self._dataSource[len(current_connection_info):]
+
+
+def _proxy(layer):
+	"""
+		Returns a new Layer object for the same layer, as arcpy does every time layers are listed. Both objects share
+		their state, so a change made through either is seen by the other, but they aren't the same object.
+	"""
+	proxy = Layer.__new__(Layer)
+	proxy.__dict__ = layer.__dict__
+	return proxy
+
+
+def _position(layers, layer):
+	"""
+		Finds a layer in a list by the state it shares with its proxies, the way arcpy matches layer objects
+	"""
+	for index, candidate in enumerate(layers):
+		if candidate.__dict__ is layer.__dict__:
+			return index
+	raise ValueError("Layer {} isn't in the list".format(layer._name))
+
+
+class LayerFile(object):
+	def __init__(self, path):
+		_call("LayerFile")
+		self.filePath = path
+		if path in _LAYER_FILES:
+			self._layers = _LAYER_FILES[path]()
+		else:
+			is_raster = "raster" in os.path.basename(path)
+			self._layers = [Layer(os.path.splitext(os.path.basename(path))[0], data_source=os.path.join(os.path.dirname(path), "template.gdb", "template"), is_raster=is_raster)]
+
+	def listLayers(self, wildcard=None):
+		_call("LayerFile.listLayers")
+		return [_proxy(layer) for layer in self._layers]
+
+	@property
+	def symbology(self):
+		_call("LayerFile.symbology")
+		return self._layers[0].symbology
+
+
+class Map(object):
+	def __init__(self, name="Map", layers=None, spatial_reference=None):
+		self._name = name
+		self._layers = list(layers or [])
+		self.defaultCamera = Camera()
+		self.spatialReference = spatial_reference or SpatialReference()
+
+	name = _counted_property("_name", "Map")
+
+	def listLayers(self, wildcard=None):
+		_call("Map.listLayers")
+		return [_proxy(layer) for layer in self._layers]
+
+	def addLayer(self, add_layer_or_layerfile, add_position="AUTO_ARRANGE"):
+		_call("Map.addLayer")
+		if isinstance(add_layer_or_layerfile, LayerFile):
+			new_layers = [copy.copy(layer) for layer in add_layer_or_layerfile._layers]
+		else:
+			new_layers = [copy.copy(add_layer_or_layerfile)]
+
+		if add_position == "BOTTOM":
+			self._layers.extend(new_layers)
+		else:
+			self._layers[0:0] = new_layers
+		return new_layers
+
+	def insertLayer(self, reference_layer, insert_layer_or_layerfile, insert_position="BEFORE"):
+		_call("Map.insertLayer")
+		new_layer = copy.copy(insert_layer_or_layerfile)
+		index = _position(self._layers, reference_layer)
+		if insert_position == "AFTER":
+			index += 1
+		self._layers.insert(index, new_layer)
+		return new_layer
+
+	def removeLayer(self, remove_layer):
+		_call("Map.removeLayer")
+		del self._layers[_position(self._layers, remove_layer)]
+
+	def updateConnectionProperties(self, current_connection_info, new_connection_info, auto_update_joins_and_relates=True, validate=True):
+		_call("Map.updateConnectionProperties")
+		for layer in self._layers:
+			if layer._dataSource and layer._dataSource.startswith(current_connection_info):
+				layer._dataSource = new_connection_info + layer._dataSource[len(current_connection_info):]
+
+
+class _Element(object):
+	type = None
+
+	def __init__(self, name="element", visible=True):
+		self._name = name
+		self._visible = visible
+
+	name = _counted_property("_name", "Element")
+	visible = _counted_property("_visible", "Element")
+
+
+class TextElement(_Element):
+	type = "TEXT_ELEMENT"
+
+	def __init__(self, name="text", text="", visible=True):
+		super(TextElement, self).__init__(name, visible)
+		self._text = text
+
+	text = _counted_property("_text", "TextElement")
+
+
+class GraphicElement(_Element):
+	type = "GRAPHIC_ELEMENT"
+
+
+class PictureElement(_Element):
+	type = "PICTURE_ELEMENT"
+
+
+class LegendElement(_Element):
+	type = "LEGEND_ELEMENT"
+
+
+class MapFrame(_Element):
+	type = "MAPFRAME_ELEMENT"
+
+	def __init__(self, name="Map Frame", map=None, visible=True, width=8.0, height=6.0):
+		super(MapFrame, self).__init__(name, visible)
+		self._map = map
+		self.elementWidth = width
+		self.elementHeight = height
+		self.camera = Camera(Extent(spatial_reference=map.spatialReference if map is not None else None))
+
+	map = _counted_property("_map", "MapFrame")
+
+
+class Layout(object):
+	def __init__(self, name="Layout", elements=None):
+		self._name = name
+		self._elements = list(elements or [])
+
+	name = _counted_property("_name", "Layout")
+
+	def listElements(self, element_type=None, wildcard=None):
+		_call("Layout.listElements")
+		return [element for element in self._elements if element_type is None or element.type == element_type]
+
+	def _export(self, label, out_path):
+		_call(label)
+		with open(out_path, "wb") as output:
+			output.write("{}:{}".format(label, self._name).encode("utf-8"))
+
+	def exportToPDF(self, out_path, *args, **kwargs):
+		self._export("Layout.exportToPDF", out_path)
+
+	def exportToPNG(self, out_path, *args, **kwargs):
+		self._export("Layout.exportToPNG", out_path)
+
+
+class ArcGISProject(object):
+	def __init__(self, path):
+		_call("ArcGISProject")
+		self.filePath = path
+		self.defaultGeodatabase = os.path.join(os.path.dirname(path), "Default.gdb")
+		builder = _PROJECTS.get(path)
+		if builder is None and os.path.exists(path):
+			with open(path, "rb") as project_file:
+				builder = _PROJECTS.get(project_file.read().decode("utf-8", "ignore").strip())
+		self._maps, self._layouts = builder() if builder else ([], [])
+
+	def listMaps(self, wildcard=None):
+		_call("ArcGISProject.listMaps")
+		return list(self._maps)
+
+	def listLayouts(self, wildcard=None):
+		_call("ArcGISProject.listLayouts")
+		return list(self._layouts)
+
+	def importDocument(self, document_path, include_layout=True, reuse_existing_maps=True):
+		_call("ArcGISProject.importDocument")
+		if document_path.endswith("pagx"):
+			self._layouts.append(Layout("_pro_blank_layout_template"))
+		elif document_path in _PROJECTS:  # a registered document's maps (and layouts, if included) are added
+			maps, layouts = _PROJECTS[document_path]()
+			self._maps.extend(maps)
+			if include_layout:
+				self._layouts.extend(layouts)
+		else:
+			self._maps.append(Map("_rename_template_amaptor"))
+
+	def updateConnectionProperties(self, current_connection_info, new_connection_info, auto_update_joins_and_relates=True, validate=True):
+		_call("ArcGISProject.updateConnectionProperties")
+		for l_map in self._maps:
+			l_map.updateConnectionProperties(current_connection_info, new_connection_info, auto_update_joins_and_relates, validate)
+
+	def save(self):
+		_call("ArcGISProject.save")
+		self._write(self.filePath)
+
+	def saveACopy(self, file_name):
+		_call("ArcGISProject.saveACopy")
+		self._write(file_name)
+
+	def _write(self, file_name):
+		"""
+			Writes a marker file that reopens to the same synthetic project, so copies behave like the original
+		"""
+		key = self.filePath
+		while key not in _PROJECTS and os.path.exists(key):
+			with open(key, "rb") as project_file:
+				key = project_file.read().decode("utf-8", "ignore").strip()
+		if file_name != key and os.path.isdir(os.path.dirname(file_name) or "."):
+			with open(file_name, "wb") as project_file:
+				project_file.write(key.encode("utf-8"))
+
+
+class _Describe(object):
+	def __init__(self, path):
+		module = _path_module(path)
+		self.catalogPath = path
+		self.path = module.dirname(path)
+		self.name = module.basename(path)
+		self.baseName, extension = module.splitext(self.name)
+		self.extension = extension.lstrip(".")
+		self.spatialReference = SpatialReference()
+		self.extent = Extent(spatial_reference=self.spatialReference)
+		self.workspaceFactoryProgID = ""
+		self.workspaceType = "FileSystem"
+		if self.extension == "gdb":
+			self.dataType = "Workspace"
+			self.workspaceFactoryProgID = "esriDataSourcesGDB.FileGDBWorkspaceFactory.1"
+			self.workspaceType = "LocalDatabase"
+		elif self.extension == "sde":
+			self.dataType = "Workspace"
+			self.workspaceFactoryProgID = "esriDataSourcesGDB.SdeWorkspaceFactory.1"
+			self.workspaceType = "RemoteDatabase"
+		elif self.extension == "shp":
+			self.dataType = "ShapeFile"
+		elif self.extension in ("tif", "img"):
+			self.dataType = "RasterDataset"
+		elif self.extension == "" and "." not in self.path[-4:] and not self.path.endswith((".gdb", ".sde")):
+			self.dataType = "Folder"
+		else:
+			self.dataType = "FeatureClass"
+
+		for key, value in _DATASETS.get(path, {}).items():
+			setattr(self, key, value)
+
+
+class Geometry(object):
+	def __init__(self, extent):
+		self.extent = extent
+		self.spatialReference = extent.spatialReference
+
+
+class SearchCursor(object):
+	"""
+		arcpy.da.SearchCursor over rows registered with register_features. The where clause is ignored. Opening the
+		cursor and reading each row are counted separately.
+	"""
+	def __init__(self, in_table, field_names, where_clause=None, spatial_reference=None):
+		_call("da.SearchCursor")
+		self._rows = iter(_FEATURES.get(in_table, []))
+		self._fields = field_names
+		self._spatial_reference = spatial_reference
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		attributes, geometry = next(self._rows)
+		_call("da.SearchCursor.next")
+		return tuple(self._value(field, attributes, geometry) for field in self._fields)
+
+	next = __next__
+
+	def _value(self, field, attributes, geometry):
+		if field == "SHAPE@":
+			if geometry is not None and self._spatial_reference is not None:  # projected as part of reading the row
+				extent = geometry.extent
+				geometry = Geometry(Extent(extent.XMin, extent.YMin, extent.XMax, extent.YMax, spatial_reference=self._spatial_reference))
+			return geometry
+		return attributes[field]
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		return False
+
+
+def GetInstallInfo():
+	return {"ProductName": "ArcGISPro", "Version": "3.1"}
+
+
+def Describe(path):
+	_call("Describe")
+	return _Describe(path)
+
+
+def Exists(path):
+	_call("Exists")
+	return path not in _MISSING
+
+
+def CreateFileGDB_management(out_folder_path, out_name, out_version=None):
+	_call("CreateFileGDB_management")
+	path = os.path.join(out_folder_path, out_name)
+	if not path.endswith(".gdb"):
+		path += ".gdb"
+	if os.path.isdir(out_folder_path) and not os.path.exists(path):
+		os.mkdir(path)
+	return path
+
+
+def PackageProject_management(*args, **kwargs):
+	_call("PackageProject_management")
+
+
+def PackageMap_management(*args, **kwargs):
+	_call("PackageMap_management")
+
+
+def RefreshActiveView():
+	_call("RefreshActiveView")
+
+
+def register_project(path, builder):
+	"""
+		Registers a callable that returns a fresh (maps, layouts) tuple each time ArcGISProject(path) is opened
+	"""
+	_PROJECTS[path] = builder
+
+
+def register_layer_file(path, builder):
+	_LAYER_FILES[path] = builder
+
+
+def register_dataset(path, **properties):
+	_DATASETS[path] = properties
+
+
+def register_missing(path):
+	"""
+		Makes Exists(path) return False - everything else exists
+	"""
+	_MISSING.add(path)
+
+
+def register_features(path, rows):
+	"""
+		Registers the rows da.SearchCursor returns for path - a list of (dict of attributes, Extent) pairs, where the
+		Extent stands in for the row's shape (None for a null shape)
+	"""
+	_FEATURES[path] = [(attributes, Geometry(extent) if extent is not None else None) for attributes, extent in rows]
+
+
+def synthetic_project(maps=1, layers=10, layouts=1, frames_per_layout=1, text_elements=5, other_elements=5, data_folder="/data"):
+	"""
+		Returns a builder for a synthetic project with the given shape. Every layout gets frames_per_layout map frames,
+		assigned to maps round-robin, along with text_elements text elements and other_elements graphic elements.
+	"""
+	def builder():
+		project_maps = []
+		for map_index in range(maps):
+			map_layers = [
+				Layer("Layer {}-{}".format(map_index, layer_index),
+					  data_source=os.path.join(data_folder, "map_{}.gdb".format(map_index), "fc_{}".format(layer_index)))
+				for layer_index in range(layers)
+			]
+			project_maps.append(Map("Map {}".format(map_index), map_layers))
+
+		project_layouts = []
+		frame_count = 0
+		for layout_index in range(layouts):
+			elements = []
+			for frame_index in range(frames_per_layout):
+				l_map = project_maps[frame_count % len(project_maps)] if project_maps else None
+				elements.append(MapFrame("Map Frame {}".format(frame_index), l_map))
+				frame_count += 1
+			for text_index in range(text_elements):
+				elements.append(TextElement("Text {}".format(text_index), "{{title}} {}".format(text_index)))
+			for other_index in range(other_elements):
+				elements.append(GraphicElement("Graphic {}".format(other_index)))
+			project_layouts.append(Layout("Layout {}".format(layout_index), elements))
+
+		return project_maps, project_layouts
+
+	return builder
+
+
+def install():
+	"""
+		Registers the stand-in as arcpy, arcpy.mp, arcpy._mp and arcpy.da in sys.modules. arcpy.mapping is deliberately
+		absent so that amaptor detects ArcGIS Pro.
+	"""
+	this_module = sys.modules[__name__]
+
+	mp = types.ModuleType("arcpy.mp")
+	for name in ("ArcGISProject", "Map", "Layer", "LayerFile", "Layout", "MapFrame", "TextElement", "GraphicElement",
+				 "PictureElement", "LegendElement", "Symbology", "Camera"):
+		setattr(mp, name, getattr(this_module, name))
+
+	da = types.ModuleType("arcpy.da")
+	da.SearchCursor = SearchCursor
+
+	arcpy = types.ModuleType("arcpy")
+	arcpy.__fake__ = True
+	arcpy.mp = mp
+	arcpy.da = da
+	arcpy._mp = mp
+	arcpy.env = types.SimpleNamespace(workspace=None, scratchFolder=None, overwriteOutput=False)
+	for name in ("Describe", "Exists", "GetInstallInfo", "Extent", "SpatialReference", "Geometry", "ExecuteError", "CreateFileGDB_management",
+				 "PackageProject_management", "PackageMap_management", "RefreshActiveView"):
+		setattr(arcpy, name, getattr(this_module, name))
+
+	sys.modules["arcpy"] = arcpy
+	sys.modules["arcpy.mp"] = mp
+	sys.modules["arcpy._mp"] = mp
+	sys.modules["arcpy.da"] = da
+	return arcpy
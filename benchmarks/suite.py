@@ -0,0 +1,311 @@
+"""
+	Benchmark suite for amaptor that runs on any machine - amaptor is run against the fake_arcpy stand-in, with every
+	arcpy call sleeping for a configurable time, on synthetic projects of a configurable size. Results are saved as
+	JSON along with the git commit they were run on, so runs can be compared between commits:
+
+		python benchmarks/suite.py --output before.json
+		git checkout my-branch
+		python benchmarks/suite.py --output after.json --compare before.json
+
+	Each scenario reports the best and median wall time over --repeat runs, and the number of arcpy calls per run.
+	Setup (such as opening the project for scenarios that aren't about opening it) isn't timed.
+
+	Latency is --latency seconds per arcpy call, and --latency-profile takes a JSON file of overrides for specific calls
+	or classes, such as {"Layout.exportToPDF": 0.5, "Describe": 0.01, "Map.listLayers": 0.002}. The call names are the
+	ones fake_arcpy counts, and are listed in the results.
+"""
+
+import argparse
+import collections
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_arcpy
+fake_arcpy.install()
+
+import amaptor
+
+PROJECT_PATH = "/fake/bench_suite.aprx"
+
+Scenario = collections.namedtuple("Scenario", ["name", "description", "setup"])
+SCENARIOS = []
+
+
+def scenario(description):
+	"""
+		Registers a scenario. The decorated function is the setup - it receives the options and returns the function
+		to time, which is called with no arguments.
+	"""
+	def decorator(setup):
+		SCENARIOS.append(Scenario(setup.__name__, description, setup))
+		return setup
+	return decorator
+
+
+def _project(lazy=False, cache_layer_properties=False):
+	return amaptor.Project(PROJECT_PATH, lazy=lazy, cache_layer_properties=cache_layer_properties)
+
+
+@scenario("open the project and wrap every map, layer, layout, and frame")
+def open_project(options):
+	return lambda: _project()
+
+
+@scenario("open the project with lazy=True and export one layout after replacing its text")
+def open_lazy_and_export_one(options):
+	out_path = os.path.join(options.out_folder, "open_lazy.pdf")
+
+	def run():
+		layout = _project(lazy=True).find_layout("Layout 0")
+		layout.render_text({"{title}": "Benchmark"})
+		layout.export_to_pdf(out_path)
+	return run
+
+
+@scenario("find_map for every map name, --lookups times in total")
+def find_map(options):
+	project = _project()
+	names = ["Map {}".format(index % options.maps) for index in range(options.lookups)]
+
+	def run():
+		for name in names:
+			project.find_map(name)
+	return run
+
+
+@scenario("Project.find_layer by data source path, --lookups times in total")
+def find_layer(options):
+	project = _project()
+	paths = ["/data/map_{}.gdb/fc_{}".format(index % options.maps, index % options.layers) for index in range(options.lookups)]
+
+	def run():
+		for path in paths:
+			project.find_layer(path, find_all=False)
+	return run
+
+
+@scenario("Map.find_layer by name for every layer in a map")
+def map_find_layer(options):
+	l_map = _project().maps[0]
+	names = ["Layer 0-{}".format(index) for index in range(options.layers)]
+
+	def run():
+		for name in names:
+			l_map.find_layer(name=name)
+	return run
+
+
+@scenario("map_find_layer with cache_layer_properties=True")
+def map_find_layer_cached(options):
+	l_map = _project(cache_layer_properties=True).maps[0]
+	names = ["Layer 0-{}".format(index) for index in range(options.layers)]
+
+	def run():
+		for name in names:
+			l_map.find_layer(name=name)
+	return run
+
+
+@scenario("Map.query_layers by workspace and by name pattern, --lookups queries in total")
+def query_layers(options):
+	l_map = _project().maps[0]
+	l_map.query_layers()  # the index is built once per map - time the queries themselves
+
+	def run():
+		for index in range(options.lookups // 2):
+			l_map.query_layers(workspace="/data/map_0.gdb", visible=True)
+			l_map.query_layers(name_glob="Layer 0-{}*".format(index % 10), dataset_type="FEATURE")
+	return run
+
+
+@scenario("Project.replace_text once for each of --placeholders placeholders")
+def replace_text(options):
+	project = _project()
+	placeholders = ["{{field_{}}}".format(index) for index in range(options.placeholders - 1)] + ["{title}"]
+
+	def run():
+		for placeholder in placeholders:
+			project.replace_text(placeholder, "value")
+	return run
+
+
+@scenario("Project.render_text with --placeholders placeholders at once")
+def render_text(options):
+	project = _project()
+	replacements = dict(("{{field_{}}}".format(index), "value") for index in range(options.placeholders - 1))
+	replacements["{title}"] = "value"
+	return lambda: project.render_text(replacements)
+
+
+@scenario("Map.add_layer in a loop, --adds layers")
+def add_layer_loop(options):
+	l_map = _project().maps[0]
+	layers = [fake_arcpy.Layer("Added {}".format(index), data_source="/data/added.gdb/fc_{}".format(index)) for index in range(options.adds)]
+
+	def run():
+		for layer in layers:
+			l_map.add_layer(layer)
+	return run
+
+
+@scenario("Map.add_layers with --adds layers at once")
+def add_layers_bulk(options):
+	l_map = _project().maps[0]
+	layers = [fake_arcpy.Layer("Added {}".format(index), data_source="/data/added.gdb/fc_{}".format(index)) for index in range(options.adds)]
+	return lambda: l_map.add_layers(layers)
+
+
+@scenario("Map.set_extent on the frames showing a map, --extents times")
+def set_extent(options):
+	l_map = _project().maps[0]
+	extents = [fake_arcpy.Extent(index, index, index + 10, index + 10) for index in range(options.extents)]
+
+	def run():
+		for extent in extents:
+			l_map.set_extent(extent)
+	return run
+
+
+@scenario("series.extents_from_features for --pages features, then Map.set_extent on each page")
+def page_extents(options):
+	l_map = _project().maps[0]
+	frame = l_map.frames[0]
+	feature_class = "/data/series.gdb/pages"
+	fake_arcpy.register_features(feature_class, [({"key": index}, fake_arcpy.Extent(index, index, index + 10, index + 5))
+												 for index in range(options.pages)])
+
+	def run():
+		extents = amaptor.series.extents_from_features(feature_class, "key", aspect=frame)
+		for key in extents:
+			l_map.set_extent(extents[key], set_frame=frame, add_buffer=False)
+	return run
+
+
+@scenario("Map.export_pdf with layout=\"ALL\" - export dispatch overhead")
+def export_all_layouts(options):
+	l_map = _project().maps[0]
+	out_path = os.path.join(options.out_folder, "export_all.pdf")
+	return lambda: l_map.export_pdf(out_path)
+
+
+def _median(values):
+	values = sorted(values)
+	middle = len(values) // 2
+	if len(values) % 2:
+		return values[middle]
+	return (values[middle - 1] + values[middle]) / 2.0
+
+
+def run_scenario(scenario, options):
+	times = []
+	calls = None
+	for repeat in range(options.repeat):
+		fake_arcpy.set_latency(0.0)  # setup runs at full speed
+		run = scenario.setup(options)
+		fake_arcpy.set_latency(options.latency, options.latency_profile)
+		fake_arcpy.reset_calls()
+		start = time.time()
+		run()
+		times.append(time.time() - start)
+		calls = dict(fake_arcpy.CALLS)
+	fake_arcpy.set_latency(0.0)
+
+	return {
+		"description": scenario.description,
+		"seconds_min": min(times),
+		"seconds_median": _median(times),
+		"arcpy_calls": sum(calls.values()),
+		"arcpy_calls_by_name": calls,
+	}
+
+
+def git_commit():
+	try:
+		return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+										stderr=subprocess.STDOUT).decode("utf-8").strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def compare(results, baseline_path):
+	with open(baseline_path) as baseline_file:
+		baseline = json.load(baseline_file)
+
+	print("\nCompared to {} ({})".format(baseline_path, baseline.get("commit")))
+	print("{:>26} {:>12} {:>12} {:>8} {:>10} {:>10}".format("scenario", "before (s)", "after (s)", "ratio", "calls", "before"))
+	for name, result in results["scenarios"].items():
+		before = baseline["scenarios"].get(name)
+		if before is None:
+			continue
+		ratio = result["seconds_median"] / before["seconds_median"] if before["seconds_median"] else float("nan")
+		print("{:>26} {:>12.4f} {:>12.4f} {:>7.2f}x {:>10} {:>10}".format(
+			name, before["seconds_median"], result["seconds_median"], ratio, result["arcpy_calls"], before["arcpy_calls"]))
+
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--maps", type=int, default=20)
+	parser.add_argument("--layers", type=int, default=30, help="layers per map")
+	parser.add_argument("--layouts", type=int, default=10)
+	parser.add_argument("--frames", type=int, default=2, help="map frames per layout")
+	parser.add_argument("--text-elements", type=int, default=10, help="text elements per layout")
+	parser.add_argument("--lookups", type=int, default=500)
+	parser.add_argument("--placeholders", type=int, default=10)
+	parser.add_argument("--adds", type=int, default=20)
+	parser.add_argument("--extents", type=int, default=20)
+	parser.add_argument("--pages", type=int, default=200, help="features for the page_extents scenario")
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--latency", type=float, default=0.00002, help="seconds each arcpy call sleeps")
+	parser.add_argument("--latency-profile", help="JSON file of per-call latency overrides")
+	parser.add_argument("--scenario", action="append", help="only run these scenarios (can be repeated)")
+	parser.add_argument("--output", help="write results to this JSON file")
+	parser.add_argument("--compare", help="JSON results from an earlier run to compare against")
+	options = parser.parse_args(args)
+
+	if options.latency_profile:
+		with open(options.latency_profile) as profile_file:
+			options.latency_profile = json.load(profile_file)
+
+	fake_arcpy.register_project(PROJECT_PATH, fake_arcpy.synthetic_project(
+		maps=options.maps, layers=options.layers, layouts=options.layouts, frames_per_layout=options.frames,
+		text_elements=options.text_elements))
+	options.out_folder = tempfile.mkdtemp(prefix="amaptor_bench")
+
+	scenarios = [item for item in SCENARIOS if not options.scenario or item.name in options.scenario]
+	config = dict((key, value) for key, value in vars(options).items() if key not in ("output", "compare", "scenario", "out_folder"))
+	results = {
+		"commit": git_commit(),
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"config": config,
+		"scenarios": collections.OrderedDict(),
+	}
+
+	print("{:>26} {:>12} {:>12} {:>10}".format("scenario", "min (s)", "median (s)", "calls"))
+	for item in scenarios:
+		result = run_scenario(item, options)
+		results["scenarios"][item.name] = result
+		print("{:>26} {:>12.4f} {:>12.4f} {:>10}".format(item.name, result["seconds_min"], result["seconds_median"], result["arcpy_calls"]))
+
+	if options.output:
+		with open(options.output, "w") as output_file:
+			json.dump(results, output_file, indent=2)
+		print("Saved results to {}".format(options.output))
+
+	if options.compare:
+		compare(results, options.compare)
+
+	return results
+
+
+if __name__ == "__main__":
+	main()
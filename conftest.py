@@ -0,0 +1,14 @@
+"""
+	When arcpy isn't installed, pytest runs against the stand-in in benchmarks/fake_arcpy.py so that tests written for
+	it (like amaptor/tests/test_series.py) can run anywhere. Tests that need real ArcGIS documents still need arcpy.
+"""
+
+import os
+import sys
+
+try:
+	import arcpy
+except ImportError:
+	sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+	import fake_arcpy
+	fake_arcpy.install()